@@ -1,43 +1,154 @@
-from datetime import datetime
-from flask import Flask, json, jsonify, request
+from datetime import datetime, timedelta
+from flask import Blueprint, Flask, Response, g, json, jsonify, request, stream_with_context
 from urllib.parse import unquote
-import requests
 from flask_cors import CORS
 from repos.securecopy.SecureCopy import DatabaseManager, DeviceConfig, SSHManager, SCPManager
+from repos.securecopy.SecureCopy import get_ssh_algorithms, resolve_ssh_algorithms, set_ssh_algorithms, supported_ssh_algorithms
+from repos.securecopy.Bandwidth import check_limit, host_bandwidth
+from repos.securecopy.FanOut import FanOutTransfer
+from repos.securecopy.FileIndex import FileIndexStore
+from repos.securecopy.Mirror import DirectoryMirror
+from repos.securecopy.TransferJobs import JOB_STATES, QueueFullError, TransferJob, TransferJobQueue
+from repos.api.JsonResponse import FastJSONProvider, compress_response, json_response
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+import importlib
 import subprocess
+import threading
+import time
 
-app = Flask(__name__)
+# Routes live on a blueprint so create_app() can build the app; app at the bottom is the default instance
+api = Blueprint("api", __name__)
 
-CORS(app, origins=["http://10.42.0.1:4200", "http://10.0.0.1:4200", "http://localhost:4200", "http://10.0.0.243:3000", "http://10.42.0.243:3000", "http://10.42.0.1:3000", "http://localhost:3000", "http://10.0.0.1:3000"])
+CORS_ORIGINS = ["http://10.42.0.1:4200", "http://10.0.0.1:4200", "http://localhost:4200", "http://10.0.0.243:3000", "http://10.42.0.243:3000", "http://10.42.0.1:3000", "http://localhost:3000", "http://10.0.0.1:3000"]
 
 
 from repos.SystemSecurityMonitor import SystemSecurityMonitor
 from repos.databases.OracleDbHandler import OracleDBHandler
+from repos.databases.AuditHistory import HISTORY_TABLES, HistoryStore
+from repos.monitoring.ResourceTimeSeries import ResourceTimeSeries
+from repos.monitoring.ReportDelta import ReportDeltaEncoder
+from repos.monitoring.MonitorEventHub import EVENT_TYPES, MonitorEventHub
+from repos.monitoring.RemoteCollector import RemoteMonitorCollector
+from repos.monitoring.Metrics import metrics
+from repos.api.Readiness import WarmUp
 
-@app.route("/system_security_monitor", methods=["GET"])
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    "http_request_seconds", "Time to build each API response (streamed bodies count until the first byte)",
+    ("method", "endpoint", "status"))
+
+# Shared across monitor instances so resource history outlives a single request
+resource_series = ResourceTimeSeries()
+# Keeps recent reports so each ?delta=true client is answered against the sequence it holds
+report_delta_encoder = ReportDeltaEncoder()
+
+# One background scan loop feeds every live stream client
+MONITOR_INTERVAL = 60
+monitor_events = MonitorEventHub()
+background_monitor = None
+background_monitor_lock = threading.Lock()
+
+# Serves /system_security_monitor; kept between requests so anomalies open once and then update or close
+request_monitor = None
+request_monitor_lock = threading.Lock()
+
+# Shared by every /system_security_monitor request instead of one handler (and connection) each
+security_db_handler = None
+security_db_handler_lock = threading.Lock()
+
+# Imported by the warm-up rather than by the first request that needs them
+HEAVY_MODULES = ("paramiko", "oracledb", "psutil")
+startup = WarmUp()
+
+# Keeps per-device baselines and anomaly state between remote collections
+remote_collector = RemoteMonitorCollector()
+remote_collector_lock = threading.Lock()
+
+# Background transfers run here instead of inside the request, each worker in its own process
+transfer_jobs = TransferJobQueue(worker_processes=True)
+TRANSFER_OPTIONS = ("compression", "route", "direct_host", "checksum", "rate_limit")
+
+# Listings with more paths than this are streamed instead of encoded in one piece
+LISTING_STREAM_ENTRIES = 50000
+
+# Per-device listings kept between requests and searched without contacting the device
+file_index = FileIndexStore()
+
+
+@api.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@api.after_app_request
+def record_request_time(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        # The route pattern rather than the URL keeps job ids and hosts out of the label values
+        endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method,
+                                     endpoint=endpoint, status=response.status_code)
+    startup.request_served()
+    return response
+
+
+def get_security_db_handler() -> OracleDBHandler:
+    """Attach the Oracle handler to SecurityLogger once; it connects when the first record is written"""
+    global security_db_handler
+    with security_db_handler_lock:
+        if security_db_handler is None:
+            handler = OracleDBHandler(user="sys", password="oracle", dsn="10.42.0.243:1521/FREE")
+            handler.setLevel(logging.INFO)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            security_logger = logging.getLogger("SecurityLogger")
+            security_logger.setLevel(logging.INFO)
+            security_logger.addHandler(handler)
+            security_db_handler = handler
+    return security_db_handler
+
+def get_remote_db_handler() -> OracleDBHandler:
+    """Give the remote collector its database handler once; it connects when the first report is stored"""
+    with remote_collector_lock:
+        if remote_collector.db_handler is None:
+            remote_collector.db_handler = OracleDBHandler(user="sys", password="oracle", dsn="10.42.0.243:1521/FREE")
+    return remote_collector.db_handler
+
+def get_background_monitor() -> SystemSecurityMonitor:
+    """Start the shared background monitor on first use"""
+    global background_monitor
+    with background_monitor_lock:
+        if background_monitor is None:
+            monitor = SystemSecurityMonitor(insert_state="false", resource_series=resource_series, event_hub=monitor_events)
+            monitor.start_monitoring(interval=MONITOR_INTERVAL)
+            background_monitor = monitor
+    return background_monitor
+
+def get_request_monitor() -> SystemSecurityMonitor:
+    """Create the monitor behind /system_security_monitor on first use"""
+    global request_monitor
+    with request_monitor_lock:
+        if request_monitor is None:
+            monitor = SystemSecurityMonitor(insert_state="false", resource_series=resource_series)
+            get_security_db_handler()
+            monitor.logger = logging.getLogger("SecurityLogger")  # Override logger with DB-aware one
+            request_monitor = monitor
+    return request_monitor
+
+@api.route("/system_security_monitor", methods=["GET"])
 def system_security_monitor():
     try:
-        # Setup custom Oracle DB handler
-        db_handler = OracleDBHandler(user="sys", password="oracle", dsn="10.42.0.243:1521/FREE")
-        db_handler.setLevel(logging.INFO)
-        db_handler.setFormatter(logging.Formatter('%(message)s'))
-
-        # Setup logger
-        security_logger = logging.getLogger("SecurityLogger")
-        security_logger.setLevel(logging.INFO)
-        security_logger.addHandler(db_handler)
-
-        monitor = SystemSecurityMonitor(insert_state="false")
-        monitor.logger = security_logger  # Override logger with DB-aware one
-        report = monitor.generate_security_report()
+        monitor = get_request_monitor()
+        # One scan at a time, so each is reconciled against the anomalies of the one before
+        with request_monitor_lock:
+            report = monitor.generate_security_report()
         if isinstance(report, dict):
-            return jsonify(report), 200
+            # Delta clients pass the sequence they hold and receive a keyframe if it is stale
+            if request.args.get("delta", "false").lower() == "true":
+                report = report_delta_encoder.encode(report, base_sequence=request.args.get("base", -1, type=int))
+            return json_response(report), 200
         else:
             endpoint: str = "/system_security_monitor"
             logger.warning(f"Data structure doesn't match | endpoint: {endpoint} | at {datetime.now().isoformat()}")
@@ -48,6 +159,117 @@ def system_security_monitor():
         return jsonify({"status": "error", "message": f"Error: {e} | endpoint: {endpoint} | at {datetime.now().isoformat()}"}), 500
 
 
+@api.route("/system_security_monitor/metrics", methods=["GET"])
+def system_security_monitor_metrics():
+    """Query recent resource metrics from the in-memory time series"""
+    try:
+        start = request.args.get("start", type=float)
+        end = request.args.get("end", type=float)
+        resolution = request.args.get("resolution", "auto")
+        metrics = request.args.get("metrics")
+        series = resource_series.query(
+            start=start,
+            end=end,
+            resolution=resolution,
+            metrics=metrics.split(",") if metrics else None
+        )
+        return jsonify({
+            "status": "success",
+            "timestamp": datetime.now().isoformat(),
+            "data": series
+        }), 200
+    except ValueError as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 400
+    except Exception as e:
+        logger.error(f"Metrics query failed: {e}")
+        return jsonify({
+            "status": "error",
+            "message": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 500
+
+
+@api.route("/system_security_monitor/stream", methods=["GET"])
+def system_security_monitor_stream():
+    """Stream live monitor events as Server-Sent Events"""
+    def list_arg(name):
+        value = request.args.get(name)
+        return [item.strip() for item in value.split(",") if item.strip()] if value else None
+
+    types = list_arg("types")
+    unknown = [t for t in (types or []) if t not in EVENT_TYPES]
+    if unknown:
+        return jsonify({
+            "status": "error",
+            "message": f"Unknown event types: {', '.join(unknown)}",
+            "timestamp": datetime.now().isoformat()
+        }), 400
+
+    try:
+        get_background_monitor()
+    except Exception as e:
+        logger.error(f"Background monitor failed to start: {e}")
+        return jsonify({
+            "status": "error",
+            "message": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 500
+
+    subscription = monitor_events.subscribe(
+        types=types,
+        metrics=list_arg("metrics"),
+        anomaly_types=list_arg("anomaly_types"),
+        max_buffer=request.args.get("buffer", 100, type=int)
+    )
+
+    def generate():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                event = subscription.get(timeout=15)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            subscription.close()
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+
+@api.route("/system_security_monitor/remote", methods=["POST"])
+def system_security_monitor_remote():
+    """Collect security reports from managed devices over SSH"""
+    try:
+        data = request.get_json()
+        device_configs = parse_device_list(data["devices"])
+        store = bool(data.get("store", True))
+        if store:
+            get_remote_db_handler()
+
+        results = {}
+        for result in remote_collector.collect_many(device_configs, int(data.get("max_concurrency", 16)), store):
+            results[result.pop("device")] = result
+
+        failed = [name for name, result in results.items() if result["status"] != "success"]
+        return jsonify({
+            "status": "success" if not failed else "partial" if len(failed) < len(results) else "error",
+            "timestamp": datetime.now().isoformat(),
+            "data": results
+        }), 200 if len(failed) < len(results) or not results else 500
+    except Exception as e:
+        endpoint: str = "/system_security_monitor/remote"
+        logger.error(f"Error: {e} | endpoint: {endpoint} | at {datetime.now().isoformat()}")
+        return jsonify({"status": "error", "message": f"Error: {e} | endpoint: {endpoint} | at {datetime.now().isoformat()}"}), 500
+
+
 DB_CONFIG = {
     "dsn": "10.42.0.243:1521/FREE",
     "username": "SYS",
@@ -57,6 +279,10 @@ DB_CONFIG = {
 from functools import wraps
 db_manager = DatabaseManager(**DB_CONFIG)
 
+# Audit and monitor history older than this is dropped a day-partition at a time
+HISTORY_RETENTION_DAYS = 30
+history_store = HistoryStore(db_manager.get_connection)
+
 def log_api_call(operation_type: str):
     """Decorator to log API calls to database"""
     def decorator(f):
@@ -70,10 +296,14 @@ def log_api_call(operation_type: str):
 
             try:
                 response = f(*args, **kwargs)
-                status = "success" if response[1] == 200 else "error"
+                status = "success" if 200 <= response[1] < 300 else "error"
+                # json_response keeps the payload, which saves parsing large bodies back
+                response_data = getattr(response[0], "json_payload", None)
+                if response_data is None:
+                    response_data = response[0].get_json()
 
                 db_manager.log_operation(
-                    operation_type, device_info, request_data, response[0].get_json(), status
+                    operation_type, device_info, request_data, response_data, status
                 )
 
                 return response
@@ -86,7 +316,7 @@ def log_api_call(operation_type: str):
         return decorated_function
     return decorator
 
-@app.route("/api/list-files", methods=["POST"])
+@api.route("/api/list-files", methods=["POST"])
 @log_api_call("list_files")
 def list_files():
     """List files and directories on both devices"""
@@ -98,41 +328,45 @@ def list_files():
         device2_config = DeviceConfig(**data["device2"])
 
         result = {"device1": [], "device2": []}
+        compress = bool(data.get("compress", False))
 
-        # List files on device1
-        try:
-            client1 = SSHManager.create_ssh_client(device1_config)
-            command1 = f"find {device1_config.directory}"
-            stdout1, stderr1, exit_code1 = SSHManager.execute_command(client1, command1)
-            client1.close()
+        # Bulk transfers on these hosts yield bandwidth while the listing runs
+        with host_bandwidth.interactive(device1_config.host, device2_config.host):
+            # List files on device1
+            try:
+                client1 = SSHManager.create_ssh_client(device1_config, compress=compress)
+                command1 = f"find {device1_config.directory}"
+                stdout1, stderr1, exit_code1 = SSHManager.execute_command(client1, command1)
+                client1.close()
 
-            if exit_code1 == 0:
-                result["device1"] = [path.strip() for path in stdout1.split("\n") if path.strip()]
-            else:
-                result["device1"] = [f"Error: {stderr1}"]
-        except Exception as e:
-            result["device1"] = [f"Connection error: {str(e)}"]
+                if exit_code1 == 0:
+                    result["device1"] = [path.strip() for path in stdout1.split("\n") if path.strip()]
+                else:
+                    result["device1"] = [f"Error: {stderr1}"]
+            except Exception as e:
+                result["device1"] = [f"Connection error: {str(e)}"]
 
-        # List files on device2
-        try:
-            client2 = SSHManager.create_ssh_client(device2_config)
-            command2 = f"find {device2_config.directory}"
-            stdout2, stderr2, exit_code2 = SSHManager.execute_command(client2, command2)
-            client1.close()
+            # List files on device2
+            try:
+                client2 = SSHManager.create_ssh_client(device2_config, compress=compress)
+                command2 = f"find {device2_config.directory}"
+                stdout2, stderr2, exit_code2 = SSHManager.execute_command(client2, command2)
+                client2.close()
 
-            if exit_code2 == 0:
-                result["device2"] = [path.strip() for path in stdout2.split("\n") if path.strip()]
-            else:
-                result["device2"] = [f"Error: {stderr2}"]
-        except Exception as e:
-            result["device2"] = [f"Connection error: {str(e)}"]
+                if exit_code2 == 0:
+                    result["device2"] = [path.strip() for path in stdout2.split("\n") if path.strip()]
+                else:
+                    result["device2"] = [f"Error: {stderr2}"]
+            except Exception as e:
+                result["device2"] = [f"Connection error: {str(e)}"]
 
 
-        return jsonify({
+        entries = len(result["device1"]) + len(result["device2"])
+        return json_response({
             "status": "success",
             "timestamp": datetime.now().isoformat(),
             "data": result
-        }), 200
+        }, stream=entries > LISTING_STREAM_ENTRIES), 200
 
     except Exception as e:
         logger.error(f"List files operations failed: {e}")
@@ -142,28 +376,134 @@ def list_files():
             "timestamp": datetime.now().isoformat()
         }), 500
 
-@app.route("/api/transfer-file", methods=["POST"])
+@api.route("/api/index/refresh", methods=["POST"])
+@log_api_call("index_refresh")
+def refresh_file_index():
+    """Build or incrementally update the file index of a directory tree on a device"""
+    try:
+        data = request.get_json()
+        device_name = data.get("device", "device1") # 'device1' or 'device2'
+        device_config = DeviceConfig(**data[device_name])
+
+        with host_bandwidth.interactive(device_config.host):
+            index = file_index.refresh(device_config, root=data.get("root"), full=bool(data.get("full", False)))
+
+        return jsonify({
+            "status": "success",
+            "timestamp": datetime.now().isoformat(),
+            "device": device_name,
+            "index": index
+        }), 200
+    except Exception as e:
+        logger.error(f"File index refresh failed: {e}")
+        return jsonify({
+            "status": "error",
+            "message": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 500
+
+@api.route("/api/index", methods=["GET"])
+def list_file_indexes():
+    """List built file indexes, optionally for one ?host="""
+    return jsonify({
+        "status": "success",
+        "timestamp": datetime.now().isoformat(),
+        "indexes": [index.to_dict() for index in file_index.indexes(request.args.get("host"))]
+    }), 200
+
+@api.route("/api/index", methods=["DELETE"])
+def remove_file_indexes():
+    """Forget the indexes of ?host=, optionally narrowed by &port= and &root="""
+    host = request.args.get("host")
+    if not host:
+        return jsonify({
+            "status": "error",
+            "message": "host is required",
+            "timestamp": datetime.now().isoformat()
+        }), 400
+
+    removed = file_index.remove(host, request.args.get("port", type=int), request.args.get("root"))
+    return jsonify({
+        "status": "success",
+        "timestamp": datetime.now().isoformat(),
+        "removed": removed
+    }), 200
+
+@api.route("/api/index/search", methods=["GET"])
+def search_file_index():
+    """Search a device's indexed paths by ?q= with mode=substring|prefix|glob, without an SSH round trip"""
+    try:
+        host = request.args.get("host")
+        query = request.args.get("q")
+        if not host or not query:
+            raise ValueError("host and q are required")
+        started = time.perf_counter()
+        found = file_index.search(
+            host, query,
+            mode=request.args.get("mode", "substring"),
+            port=request.args.get("port", type=int),
+            root=request.args.get("root"),
+            kind=request.args.get("type"),
+            limit=min(request.args.get("limit", 1000, type=int), LISTING_STREAM_ENTRIES)
+        )
+        return json_response({
+            "status": "success",
+            "timestamp": datetime.now().isoformat(),
+            "host": host,
+            "query": query,
+            "count": len(found["entries"]),
+            "truncated": found["truncated"],
+            "plans": found["plans"],
+            "took_ms": (time.perf_counter() - started) * 1000,
+            "entries": found["entries"]
+        }), 200
+    except ValueError as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 400
+    except Exception as e:
+        logger.error(f"File index search failed: {e}")
+        return jsonify({
+            "status": "error",
+            "message": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 500
+
+def transfer_devices(data):
+    """Return (source, destination, direction) for a transfer request body"""
+    device1_config = DeviceConfig(**data["device1"])
+    device2_config = DeviceConfig(**data["device2"])
+    direction = data.get("direction", "device1_to_device2") # or 'device2_to_device1
+
+    if direction == "device1_to_device2":
+        return device1_config, device2_config, direction
+    return device2_config, device1_config, direction
+
+def transfer_options(data, names=TRANSFER_OPTIONS):
+    """The transfer options present in a request body, with rate_limit checked before any copy starts"""
+    options = {option: data[option] for option in names if option in data}
+    if options.get("rate_limit") is not None:
+        options["rate_limit"] = float(options["rate_limit"])
+        check_limit(options["rate_limit"])
+    return options
+
+@api.route("/api/transfer-file", methods=["POST"])
 @log_api_call('transfer_file')
 def transfer_file():
     """Transfer file from device1 to device2 or vice versa"""
     try:
         data = request.get_json()
 
-        device1_config = DeviceConfig(**data["device1"])
-        device2_config = DeviceConfig(**data["device2"])
-
+        source_device, dest_device, direction = transfer_devices(data)
         source_path = data["source_path"]
         dest_path = data["dest_path"]
-        direction = data.get("direction", "device1_to_device2") # or 'device2_to_device1
 
-        if direction == "device1_to_device2":
-            source_device = device1_config
-            dest_device = device2_config
-        else:
-            source_device = device2_config
-            dest_device = device1_config
-
-        transfer_result = SCPManager.transfer_file(source_device, dest_device, source_path, dest_path)
+        transfer_result = SCPManager.transfer_file(
+            source_device, dest_device, source_path, dest_path,
+            **transfer_options(data)
+        )
 
         return jsonify({
             "status": "success" if transfer_result["success"] else "error",
@@ -171,6 +511,12 @@ def transfer_file():
             "transfer_details": transfer_result,
             "direction": direction
         }), 200 if transfer_result["success"] else 500
+    except ValueError as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 400
     except Exception as e:
         logger.error(f"File transfer operation failed: {e}")
         return jsonify({
@@ -179,7 +525,241 @@ def transfer_file():
             "timestamp": datetime.now().isoformat()
         }), 500
     
-@app.route("/api/execute-command", methods=["POST"])
+@api.route("/api/transfer-tree", methods=["POST"])
+@log_api_call('transfer_tree')
+def transfer_tree():
+    """Copy a whole directory tree as a single tar stream"""
+    try:
+        data = request.get_json()
+        source_device, dest_device, direction = transfer_devices(data)
+
+        tree_result = SCPManager.transfer_tree(
+            source_device, dest_device, data["source_dir"], data["dest_dir"],
+            include=data.get("include"),
+            exclude=data.get("exclude"),
+            **transfer_options(data, ("compression", "route", "direct_host", "rate_limit"))
+        )
+
+        return jsonify({
+            "status": "success" if tree_result["success"] else "error",
+            "timestamp": datetime.now().isoformat(),
+            "transfer_details": tree_result,
+            "direction": direction
+        }), 200 if tree_result["success"] else 500
+    except ValueError as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 400
+    except Exception as e:
+        logger.error(f"Tree transfer failed: {e}")
+        return jsonify({
+            "status": "error",
+            "message": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 500
+
+@api.route("/api/mirror-directory", methods=["POST"])
+@log_api_call('mirror_directory')
+def mirror_directory():
+    """Make a directory on one device match a directory on the other, copying only what changed"""
+    try:
+        data = request.get_json()
+        source_device, dest_device, direction = transfer_devices(data)
+
+        mirror = DirectoryMirror(
+            source_device, dest_device, data["source_dir"], data["dest_dir"],
+            delete=bool(data.get("delete", False)),
+            hash_algorithm=data.get("hash"),
+            max_parallel=int(data.get("max_parallel", 4)),
+            transfer_options=transfer_options(data)
+        )
+        mirror_result = mirror.run(dry_run=bool(data.get("dry_run", False)))
+
+        return jsonify({
+            "status": "success" if mirror_result["success"] else "error",
+            "timestamp": datetime.now().isoformat(),
+            "mirror_details": mirror_result,
+            "direction": direction
+        }), 200 if mirror_result["success"] else 500
+    except ValueError as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 400
+    except Exception as e:
+        logger.error(f"Directory mirror failed: {e}")
+        return jsonify({
+            "status": "error",
+            "message": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 500
+
+@api.route("/api/transfers", methods=["POST"])
+@log_api_call('submit_transfer')
+def submit_transfer():
+    """Queue a transfer and return its job ID without waiting for the copy"""
+    try:
+        data = request.get_json()
+        source_device, dest_device, direction = transfer_devices(data)
+        job = transfer_jobs.submit(TransferJob(
+            source_device, dest_device, data["source_path"], data["dest_path"],
+            options=transfer_options(data),
+            priority=int(data.get("priority", 0))
+        ))
+
+        return jsonify({
+            "status": "accepted",
+            "timestamp": datetime.now().isoformat(),
+            "job": job.to_dict(),
+            "direction": direction
+        }), 202
+    except QueueFullError as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 429
+    except Exception as e:
+        logger.error(f"Transfer submission failed: {e}")
+        return jsonify({
+            "status": "error",
+            "message": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 400
+
+@api.route("/api/transfers", methods=["GET"])
+def list_transfers():
+    """List known transfer jobs, optionally filtered with ?state="""
+    state = request.args.get("state")
+    if state is not None and state not in JOB_STATES:
+        return jsonify({
+            "status": "error",
+            "message": f"Unknown state '{state}', expected one of: {', '.join(JOB_STATES)}",
+            "timestamp": datetime.now().isoformat()
+        }), 400
+
+    return jsonify({
+        "status": "success",
+        "timestamp": datetime.now().isoformat(),
+        "queue": transfer_jobs.stats(),
+        "jobs": [job.to_dict() for job in transfer_jobs.jobs(state)]
+    }), 200
+
+@api.route("/api/transfers/<job_id>", methods=["GET"])
+def get_transfer(job_id):
+    """Report a transfer job's state, bytes done, rate and ETA"""
+    job = transfer_jobs.get(job_id)
+    if job is None:
+        return jsonify({
+            "status": "error",
+            "message": f"Unknown transfer job '{job_id}'",
+            "timestamp": datetime.now().isoformat()
+        }), 404
+
+    return jsonify({
+        "status": "success",
+        "timestamp": datetime.now().isoformat(),
+        "job": job.to_dict()
+    }), 200
+
+@api.route("/api/transfers/<job_id>", methods=["DELETE"])
+def cancel_transfer(job_id):
+    """Cancel a queued or running transfer job"""
+    job = transfer_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({
+            "status": "error",
+            "message": f"Unknown transfer job '{job_id}'",
+            "timestamp": datetime.now().isoformat()
+        }), 404
+
+    return jsonify({
+        "status": "success",
+        "timestamp": datetime.now().isoformat(),
+        "job": job.to_dict()
+    }), 200
+
+@api.route("/api/bandwidth", methods=["GET"])
+def get_bandwidth_limits():
+    """List per-host bandwidth limits"""
+    return jsonify({
+        "status": "success",
+        "timestamp": datetime.now().isoformat(),
+        "limits": host_bandwidth.limits()
+    }), 200
+
+@api.route("/api/bandwidth/<host>", methods=["PUT"])
+def set_bandwidth_limit(host):
+    """Limit bulk transfers touching a host; a null rate removes the limit"""
+    try:
+        data = request.get_json() or {}
+        rate = data.get("rate")
+        burst = data.get("burst")
+        host_bandwidth.set_limit(
+            host,
+            float(rate) if rate is not None else None,
+            float(burst) if burst is not None else None,
+            float(data.get("interactive_share", 0.5))
+        )
+        limit = host_bandwidth.get_limit(host)
+
+        return jsonify({
+            "status": "success",
+            "timestamp": datetime.now().isoformat(),
+            "host": host,
+            "limit": limit.to_dict() if limit else None
+        }), 200
+    except Exception as e:
+        logger.error(f"Setting bandwidth limit failed: {e}")
+        return jsonify({
+            "status": "error",
+            "message": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 400
+
+@api.route("/api/ssh-algorithms", methods=["GET"])
+def read_ssh_algorithms():
+    """Global SSH algorithm preferences, the resulting offer order and what paramiko supports"""
+    try:
+        return jsonify({
+            "status": "success",
+            "timestamp": datetime.now().isoformat(),
+            "preferences": get_ssh_algorithms(),
+            "offered": resolve_ssh_algorithms(),
+            "supported": supported_ssh_algorithms()
+        }), 200
+    except Exception as e:
+        logger.error(f"Reading SSH algorithms failed: {e}")
+        return jsonify({
+            "status": "error",
+            "message": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 500
+
+@api.route("/api/ssh-algorithms", methods=["PUT"])
+def update_ssh_algorithms():
+    """Replace the global SSH algorithm preferences; an empty body restores paramiko's defaults"""
+    try:
+        preferences = request.get_json() or {}
+        offered = set_ssh_algorithms(preferences)
+        return jsonify({
+            "status": "success",
+            "timestamp": datetime.now().isoformat(),
+            "preferences": preferences,
+            "offered": offered
+        }), 200
+    except Exception as e:
+        logger.error(f"Setting SSH algorithms failed: {e}")
+        return jsonify({
+            "status": "error",
+            "message": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 400
+
+@api.route("/api/execute-command", methods=["POST"])
 @log_api_call("execute_command")
 def execute_command():
     """Execute custom command on specified device"""
@@ -191,9 +771,10 @@ def execute_command():
 
         device_config = DeviceConfig(**data[device_name])
 
-        client = SSHManager.create_ssh_client(device_config)
-        stdout, stderr, exit_code = SSHManager.execute_command(client, command)
-        client.close()
+        with host_bandwidth.interactive(device_config.host):
+            client = SSHManager.create_ssh_client(device_config, compress=bool(data.get("compress", False)))
+            stdout, stderr, exit_code = SSHManager.execute_command(client, command)
+            client.close()
 
         return jsonify({
             "status": "success",
@@ -214,16 +795,267 @@ def execute_command():
             "timestamp": datetime.now().isoformat()
         }), 500
 
-@app.route('/api/health', methods=['GET'])
+def output_limits(data, default_timeout=None):
+    """max_bytes and timeout from a request body, checked before any output is streamed"""
+    max_bytes = data.get("max_bytes")
+    timeout = data.get("timeout", default_timeout)
+    max_bytes = int(max_bytes) if max_bytes is not None else None
+    timeout = float(timeout) if timeout is not None else None
+    if max_bytes is not None and max_bytes <= 0:
+        raise ValueError(f"max_bytes must be positive, got {max_bytes}")
+    if timeout is not None and not timeout > 0:
+        raise ValueError(f"timeout must be positive, got {timeout}")
+    return max_bytes, timeout
+
+@api.route("/api/execute-command/stream", methods=["POST"])
+def execute_command_stream():
+    """Execute command on specified device and stream its output as NDJSON"""
+    data = request.get_json() or {}
+    device_name = data.get("device", "unknown")
+    device_info = {
+        "device1": data.get("device1", {}).get("host", "unknown"),
+        "device2": data.get("device2", {}).get("host", "unknown")
+    }
+
+    try:
+        max_bytes, timeout = output_limits(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 400
+
+    try:
+        command = data["command"]
+        device_config = DeviceConfig(**data[device_name])
+        client = SSHManager.create_ssh_client(device_config, compress=bool(data.get("compress", False)))
+    except Exception as e:
+        logger.error(f"Command execution failed: {str(e)}")
+        error_response = {
+            "status": "error",
+            "message": str(e),
+            "timestamp": datetime.now().isoformat()
+        }
+        db_manager.log_operation("execute_command_stream", device_info, data, error_response, "error")
+        return jsonify(error_response), 500
+
+    def generate():
+        summary = {"error": "stream interrupted"}
+        try:
+            with host_bandwidth.interactive(device_config.host):
+                for event in SSHManager.stream_command(client, command, max_bytes=max_bytes, timeout=timeout):
+                    if "data" not in event:
+                        summary = dict(event, device=device_name, command=command)
+                        event = summary
+                    yield json.dumps(event) + "\n"
+        except Exception as e:
+            logger.error(f"Command execution failed: {str(e)}")
+            summary = {"error": str(e)}
+            yield json.dumps(summary) + "\n"
+        finally:
+            client.close()
+            status = "success" if summary.get("exit_code") is not None else "error"
+            # Output is not retained, so only the summary is audited
+            db_manager.log_operation("execute_command_stream", device_info, data, summary, status)
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+def parse_device_list(devices) -> dict:
+    """Build name -> DeviceConfig from a list or an object of device entries"""
+    if isinstance(devices, list):
+        # Allow a plain list, naming each device by an optional "name" or its host
+        devices = {entry.get("name") or entry["host"]: entry for entry in devices}
+    return {
+        name: DeviceConfig(**{k: v for k, v in entry.items() if k != "name"})
+        for name, entry in devices.items()
+    }
+
+@api.route("/api/broadcast-command", methods=["POST"])
+def broadcast_command():
+    """Execute a command on many devices in parallel and stream each result as NDJSON"""
+    data = request.get_json() or {}
+
+    try:
+        command = data["command"]
+        device_configs = parse_device_list(data["devices"])
+        max_concurrency = int(data.get("max_concurrency", 16))
+        max_bytes, timeout = output_limits(data, default_timeout=60)
+    except Exception as e:
+        logger.error(f"Broadcast command failed: {e}")
+        return jsonify({
+            "status": "error",
+            "message": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 400
+
+    device_info = {name: config.host for name, config in device_configs.items()}
+
+    def generate():
+        started = time.monotonic()
+        summary = {"command": command, "devices": len(device_configs), "succeeded": 0, "failed": 0}
+        try:
+            for result in SSHManager.broadcast_command(device_configs, command, max_concurrency, timeout, max_bytes):
+                summary["succeeded" if result["status"] == "success" else "failed"] += 1
+                yield json.dumps(result) + "\n"
+            summary["duration"] = time.monotonic() - started
+            yield json.dumps(dict(summary, status="completed", timestamp=datetime.now().isoformat())) + "\n"
+        finally:
+            status = "success" if summary["failed"] == 0 else "error"
+            db_manager.log_operation("broadcast_command", device_info, data, summary, status)
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+@api.route("/api/fanout-transfer", methods=["POST"])
+def fanout_transfer():
+    """Copy one file to many devices, reading the source once, and stream progress as NDJSON"""
+    data = request.get_json() or {}
+
+    try:
+        source_device = DeviceConfig(**data["source"])
+        source_path = data["source_path"]
+        entries = data["destinations"]
+        if isinstance(entries, list):
+            entries = {entry.get("name") or entry["host"]: entry for entry in entries}
+        destinations = {
+            name: (DeviceConfig(**{k: v for k, v in entry.items() if k not in ("name", "dest_path")}),
+                   entry.get("dest_path", source_path))
+            for name, entry in entries.items()
+        }
+        transfer = FanOutTransfer(
+            source_device, source_path, destinations,
+            buffer_chunks=int(data.get("buffer_chunks", 16)),
+            slow_policy=data.get("slow_policy", "detach"),
+            detach_after=float(data.get("detach_after", 2.0)),
+            checksum=data.get("checksum")
+        )
+        progress_interval = float(data.get("progress_interval", 1.0))
+    except Exception as e:
+        logger.error(f"Fan-out transfer failed: {e}")
+        return jsonify({
+            "status": "error",
+            "message": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 400
+
+    device_info = {"source": source_device.host, **{name: config.host for name, (config, _) in destinations.items()}}
+
+    def generate():
+        outcome = {}
+        worker = threading.Thread(target=lambda: outcome.update(transfer.run()), daemon=True)
+        worker.start()
+        try:
+            while worker.is_alive():
+                worker.join(progress_interval)
+                if worker.is_alive():
+                    yield json.dumps(dict(transfer.status(), status="progress",
+                                          timestamp=datetime.now().isoformat())) + "\n"
+            yield json.dumps(dict(outcome, status="completed", timestamp=datetime.now().isoformat())) + "\n"
+        finally:
+            # The copy keeps running if the client disconnects; audit whatever is known
+            summary = {k: v for k, v in outcome.items() if k != "destinations"} or transfer.status()
+            db_manager.log_operation("fanout_transfer", device_info, data, summary,
+                                     "success" if outcome.get("success") else "error")
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+@api.route("/api/history/<table>", methods=["GET"])
+def query_history(table):
+    """Query audit or monitor history by time range, operation, host and status"""
+    try:
+        end = datetime.fromisoformat(request.args["end"]) if "end" in request.args else datetime.now()
+        start = (datetime.fromisoformat(request.args["start"]) if "start" in request.args
+                 else end - timedelta(minutes=int(request.args.get("minutes", 60))))
+        rows = history_store.query(
+            table, start, end,
+            operation=request.args.get("operation"),
+            host=request.args.get("host"),
+            status=request.args.get("status"),
+            limit=int(request.args.get("limit", 100))
+        )
+        return jsonify({
+            "status": "success",
+            "timestamp": datetime.now().isoformat(),
+            "table": table,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "count": len(rows),
+            "rows": rows
+        }), 200
+    except ValueError as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e),
+            "tables": list(HISTORY_TABLES),
+            "timestamp": datetime.now().isoformat()
+        }), 400
+    except Exception as e:
+        logger.error(f"History query failed: {e}")
+        return jsonify({
+            "status": "error",
+            "message": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 500
+
+@api.route("/api/history/retention", methods=["POST"])
+@log_api_call('history_retention')
+def run_history_retention():
+    """Drop history partitions older than retention_days now"""
+    try:
+        data = request.get_json(silent=True) or {}
+        retention_days = int(data.get("retention_days", HISTORY_RETENTION_DAYS))
+        dropped = history_store.drop_expired_partitions(retention_days)
+        return jsonify({
+            "status": "success",
+            "timestamp": datetime.now().isoformat(),
+            "retention_days": retention_days,
+            "dropped_partitions": dropped
+        }), 200
+    except (TypeError, ValueError) as e:
+        return jsonify({
+            "status": "error",
+            "message": f"Invalid retention_days: {e}",
+            "timestamp": datetime.now().isoformat()
+        }), 400
+    except Exception as e:
+        logger.error(f"History retention failed: {e}")
+        return jsonify({
+            "status": "error",
+            "message": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 500
+
+@api.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Counters and latency histograms in the Prometheus text format"""
+    return Response(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+@api.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
         "status": "healthy",
-        "timestamp": datetime.datetime.now().isoformat(),
+        "timestamp": datetime.now().isoformat(),
         "service": "SSH/SCP API"
     }), 200
 
-@app.route('/api/test-connections', methods=['POST'])
+@api.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """Readiness endpoint; 503 until the background warm-up has finished"""
+    status = startup.status()
+    return jsonify(dict(status, status=status["state"], timestamp=datetime.now().isoformat())), \
+        200 if status["ready"] else 503
+
+@api.route('/api/test-connections', methods=['POST'])
 @log_api_call('test_connections')
 def test_connections():
     """Test SSH connections to both devices"""
@@ -268,5 +1100,40 @@ def test_connections():
         }), 500
 
 
+def prepare_history():
+    """Migrate the history tables, then keep them within HISTORY_RETENTION_DAYS"""
+    history_store.ensure_schema()
+    history_store.start_retention(HISTORY_RETENTION_DAYS)
+
+def warm_up_tasks() -> dict:
+    """Start-up work moved off the request path, by name"""
+    return {
+        "imports": lambda: [importlib.import_module(name) for name in HEAVY_MODULES],
+        "audit_database": db_manager.warm_up,
+        "security_database": lambda: get_security_db_handler().connection,
+        "monitor_host_keys": lambda: get_security_db_handler().migrate_host_keys(),
+        "history_schema": prepare_history,
+        "file_index": file_index.indexes
+    }
+
+def create_app(warm_up: bool = True) -> Flask:
+    """
+    Build the Flask app
+
+    Heavy modules and database connections are not touched here. With
+    warm_up they are loaded and opened in the background, and /api/ready
+    reports when that has finished; otherwise each is created on first use.
+    """
+    flask_app = Flask(__name__)
+    flask_app.json = FastJSONProvider(flask_app)
+    CORS(flask_app, origins=CORS_ORIGINS)
+    flask_app.register_blueprint(api)
+    # Registered after the blueprint's timer so compression counts towards the request time
+    flask_app.after_request(compress_response)
+    startup.start(warm_up_tasks() if warm_up else {})
+    return flask_app
+
+app = create_app()
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
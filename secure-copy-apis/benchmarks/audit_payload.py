@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark: audit record size and encode time for heavy listing calls
+
+Builds the request and response of a /api/list-files call over --paths
+paths per device. It compares the old audit write, three JSON CLOBs with
+the request's credentials in plain text, against encode_audit_record (a
+compacted, compressed BLOB). It reports encode time, bytes stored per call,
+and modelled insert time over a --db-mb-s link with --db-rtt-ms per round
+trip.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from repos.securecopy.SecureCopy import encode_audit_record
+
+MB = 1024 * 1024
+
+
+def listing_call(paths: int):
+    device = {'host': '10.0.0.1', 'port': 22, 'username': 'admin', 'password': 'hunter2', 'directory': '/srv'}
+    request_data = {'device1': device, 'device2': dict(device, host='10.0.0.2')}
+    listing = [f"/srv/data/project-{i // 1000:04d}/module-{i // 50:06d}/file-{i:08d}.dat" for i in range(paths)]
+    response_data = {'status': 'success', 'timestamp': '2024-07-24T12:00:00', 'data': {'device1': listing,
+                                                                                        'device2': listing}}
+    device_info = {'device1': '10.0.0.1', 'device2': '10.0.0.2'}
+    return device_info, request_data, response_data
+
+
+def best_of(fn, repeats: int):
+    best, result = None, None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run(paths: int, repeats: int, db_bandwidth: float, db_rtt: float):
+    device_info, request_data, response_data = listing_call(paths)
+
+    legacy_seconds, legacy = best_of(
+        lambda: [json.dumps(device_info), json.dumps(request_data), json.dumps(response_data)], repeats)
+    legacy_bytes = sum(len(text.encode('utf-8')) for text in legacy)
+    compact_seconds, (blob, record_bytes) = best_of(
+        lambda: encode_audit_record(device_info, request_data, response_data), repeats)
+
+    def insert_seconds(stored: int, encode: float) -> float:
+        # Connect, DDL, insert and commit round trips plus the bytes themselves
+        return encode + 4 * db_rtt + stored / db_bandwidth
+
+    return {
+        'paths_per_device': paths,
+        'legacy': {'encode_ms': legacy_seconds * 1000, 'stored_bytes': legacy_bytes,
+                   'credentials_stored': 'hunter2' in legacy[1],
+                   'modelled_insert_ms': insert_seconds(legacy_bytes, legacy_seconds) * 1000},
+        'compact': {'encode_ms': compact_seconds * 1000, 'record_bytes': record_bytes, 'stored_bytes': len(blob),
+                    'credentials_stored': b'hunter2' in blob,
+                    'modelled_insert_ms': insert_seconds(len(blob), compact_seconds) * 1000},
+        'size_reduction': legacy_bytes / len(blob)
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--paths', type=int, nargs='+', default=[100, 10000, 1000000])
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--db-mb-s', type=float, default=10, help='Throughput of the database link')
+    parser.add_argument('--db-rtt-ms', type=float, default=1)
+    args = parser.parse_args()
+    print(json.dumps({'benchmark': 'audit_payload',
+                      'results': [run(paths, args.repeats, args.db_mb_s * MB, args.db_rtt_ms / 1000)
+                                  for paths in args.paths]}, indent=2))
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Benchmark: throughput fairness and interactive latency under mixed load
+
+By default the link is simulated as a FIFO byte queue at --link-mb-s.
+Several bulk transfers push TRANSFER_CHUNK_SIZE chunks into it, while an
+interactive operation (a few small request/response round trips, like an
+SSH exec) runs every --interval seconds.
+Each scenario runs three ways:
+
+  unshaped     bulk transfers send as fast as the link accepts
+  host_limit   bulk transfers share a per-host TokenBucket (--limit-fraction of link speed)
+  interactive  the same limit, with interactive operations marked through
+               BandwidthManager.interactive() so bulk traffic yields headroom
+
+The output reports per-transfer throughput, Jain's fairness index and
+interactive latency percentiles. With --source/--dest, real transfers run
+through SCPManager.transfer_file against a device (for example a local
+sshd), timing `true` over SSH on the destination alongside them.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from repos.securecopy.Bandwidth import BandwidthManager, TokenBucket
+from repos.securecopy.SecureCopy import TRANSFER_CHUNK_SIZE
+
+MB = 1024 * 1024
+HOST = 'bench-host'
+
+
+def jain_index(values):
+    """1.0 when every transfer got the same throughput, 1/n when one got everything"""
+    if not values or not any(values):
+        return None
+    return sum(values) ** 2 / (len(values) * sum(v * v for v in values))
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {'p50_ms': pick(0.5) * 1000, 'p95_ms': pick(0.95) * 1000, 'max_ms': ordered[-1] * 1000,
+            'mean_ms': statistics.mean(ordered) * 1000}
+
+
+def simulate(mode: str, link_rate: float, transfers: int, seconds: float, interval: float,
+             request_bytes: int, round_trips: int, limit_fraction: float):
+    # With a one-chunk burst, a reservation bucket behaves as a FIFO queue draining at link speed
+    link = TokenBucket(link_rate, burst=TRANSFER_CHUNK_SIZE)
+    manager = BandwidthManager()
+    if mode != 'unshaped':
+        manager.set_limit(HOST, link_rate * limit_fraction, burst=TRANSFER_CHUNK_SIZE)
+    deadline = time.monotonic() + seconds
+    sent = [0] * transfers
+    latencies = []
+
+    def bulk(index):
+        shaper = manager.shaper([HOST])
+        while time.monotonic() < deadline:
+            if shaper is not None:
+                shaper.consume(TRANSFER_CHUNK_SIZE)
+            link.consume(TRANSFER_CHUNK_SIZE)
+            sent[index] += TRANSFER_CHUNK_SIZE
+
+    def operation():
+        for _ in range(round_trips):
+            link.consume(request_bytes)
+
+    def interactive():
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            if mode == 'interactive':
+                with manager.interactive(HOST):
+                    operation()
+            else:
+                operation()
+            latencies.append(time.monotonic() - started)
+            time.sleep(interval)
+
+    threads = [threading.Thread(target=bulk, args=(i,)) for i in range(transfers)]
+    threads.append(threading.Thread(target=interactive))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    rates = [b / seconds / MB for b in sent]
+    return {
+        'mode': mode,
+        'transfer_mb_s': rates,
+        'total_mb_s': sum(rates),
+        'fairness': jain_index(rates),
+        'interactive_latency': percentiles(latencies)
+    }
+
+
+def live(source: dict, dest: dict, path: str, transfers: int, rate: float, samples: int, interval: float):
+    from repos.securecopy.Bandwidth import host_bandwidth
+    from repos.securecopy.SecureCopy import DeviceConfig, SCPManager, SSHManager
+
+    source_device, dest_device = DeviceConfig(**source), DeviceConfig(**dest)
+    results = []
+    for mode in ('unshaped', 'host_limit', 'interactive'):
+        host_bandwidth.set_limit(dest_device.host, rate if mode != 'unshaped' else None)
+        outcomes = [None] * transfers
+
+        def run(index):
+            started = time.monotonic()
+            outcome = SCPManager.transfer_file(source_device, dest_device, path, f"{path}.copy{index}")
+            outcomes[index] = (outcome, time.monotonic() - started)
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(transfers)]
+        for thread in threads:
+            thread.start()
+        latencies = []
+        client = SSHManager.create_ssh_client(dest_device)
+        try:
+            for _ in range(samples):
+                started = time.monotonic()
+                if mode == 'interactive':
+                    with host_bandwidth.interactive(dest_device.host):
+                        SSHManager.execute_command(client, 'true')
+                else:
+                    SSHManager.execute_command(client, 'true')
+                latencies.append(time.monotonic() - started)
+                time.sleep(interval)
+        finally:
+            client.close()
+        for thread in threads:
+            thread.join()
+
+        rates = [o['file_size'] / d / MB if o.get('success') else 0.0 for o, d in outcomes]
+        results.append({
+            'mode': mode,
+            'transfer_mb_s': rates,
+            'fairness': jain_index(rates),
+            'errors': [o.get('error') for o, _ in outcomes if not o.get('success')],
+            'interactive_latency': percentiles(latencies)
+        })
+    host_bandwidth.set_limit(dest_device.host, None)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--link-mb-s', type=float, default=40)
+    parser.add_argument('--transfers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--interval', type=float, default=0.1, help='Seconds between interactive operations')
+    parser.add_argument('--request-bytes', type=int, default=4096)
+    parser.add_argument('--round-trips', type=int, default=4, help='Round trips per interactive operation')
+    parser.add_argument('--limit-fraction', type=float, default=0.9,
+                        help='Per-host limit as a fraction of link speed')
+    parser.add_argument('--source', type=json.loads, help='Source device JSON for a live run')
+    parser.add_argument('--dest', type=json.loads, help='Destination device JSON for a live run')
+    parser.add_argument('--path', default='/tmp/bandwidth-bench.bin', help='Existing file on the source')
+    parser.add_argument('--samples', type=int, default=50)
+    args = parser.parse_args()
+
+    if args.source and args.dest:
+        output = {'benchmark': 'bandwidth_shaping', 'mode': 'live',
+                  'results': live(args.source, args.dest, args.path, args.transfers,
+                                  args.link_mb_s * args.limit_fraction * MB, args.samples, args.interval)}
+    else:
+        output = {'benchmark': 'bandwidth_shaping', 'mode': 'simulated', 'link_mb_s': args.link_mb_s,
+                  'results': [simulate(mode, args.link_mb_s * MB, args.transfers, args.seconds, args.interval,
+                                       args.request_bytes, args.round_trips, args.limit_fraction)
+                              for mode in ('unshaped', 'host_limit', 'interactive')]}
+    print(json.dumps(output, indent=2))
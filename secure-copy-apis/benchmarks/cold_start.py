@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cold start and time to first request
+
+Starts --runs fresh interpreters. Each one imports app, which builds the app
+with create_app(), and answers GET /api/health through the test client. It
+then waits up to --ready-timeout seconds for the background warm-up to
+finish. Each run records, from the moment the process was spawned:
+
+  interpreter     until the child's first line of Python ran
+  import          time spent importing app
+  first_request   until the health check was answered
+  ready           until warm-up finished (/api/ready turns 200)
+
+Medians are reported. Warm-up connects to the configured database, so
+ready and the task outcomes depend on whether it is reachable from here.
+One more run under -X importtime lists the --top slowest imports below app.
+--output and --compare work as in offline_suite.py, so a change can be
+checked against an earlier revision.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.offline_suite import compare, revision
+
+CHILD = '''
+import json, logging, sys, time
+started = time.time()
+sys.path.insert(0, sys.argv[1])
+logging.disable(logging.CRITICAL)
+import app as module
+imported = time.time()
+module.app.test_client().get("/api/health")
+answered = time.time()
+startup = getattr(module, "startup", None)
+ready, tasks = None, None
+if startup is not None and startup.wait(float(sys.argv[2])):
+    ready = startup.finished_at
+    tasks = {name: task["state"] for name, task in startup.status()["tasks"].items()}
+print(json.dumps({"started": started, "imported": imported, "answered": answered, "ready": ready, "tasks": tasks}))
+'''
+
+
+def one_run(ready_timeout: float):
+    spawned = time.time()
+    completed = subprocess.run([sys.executable, '-c', CHILD, ROOT, str(ready_timeout)], cwd=ROOT,
+                               capture_output=True, text=True, timeout=ready_timeout + 120)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Child failed: {completed.stderr.strip()[-500:]}")
+    child = json.loads(completed.stdout.strip().splitlines()[-1])
+    return {
+        'interpreter': child['started'] - spawned,
+        'import': child['imported'] - child['started'],
+        'first_request': child['answered'] - spawned,
+        'ready': child['ready'] - spawned if child['ready'] is not None else None,
+        'tasks': child['tasks']
+    }
+
+
+def slowest_imports(top: int):
+    """Cumulative microseconds of the slowest modules imported on behalf of app"""
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=ROOT,
+                               capture_output=True, text=True, timeout=300)
+    entries = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line.split('|', 2)
+        # One space after the bar, then two per level of nesting
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        # Depth 1 and 2 are app's own imports and what they pull in directly
+        if 1 <= depth <= 2:
+            entries.append({'module': name.strip(), 'cumulative_ms': int(cumulative_us) / 1000})
+    return sorted(entries, key=lambda entry: entry['cumulative_ms'], reverse=True)[:top]
+
+
+def run(args):
+    runs = [one_run(args.ready_timeout) for _ in range(args.runs)]
+    median = lambda key: (statistics.median(r[key] for r in runs if r[key] is not None)
+                          if any(r[key] is not None for r in runs) else None)
+    return {
+        'benchmark': 'cold_start',
+        'revision': revision(),
+        'results': {
+            'median_seconds': {key: median(key) for key in ('interpreter', 'import', 'first_request', 'ready')},
+            'warm_up_tasks': runs[-1]['tasks'],
+            'slowest_imports': slowest_imports(args.top)
+        }
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--ready-timeout', type=float, default=30, help='Seconds to wait for warm-up per run')
+    parser.add_argument('--top', type=int, default=10, help='Slowest imports to list')
+    parser.add_argument('--output', help='Also write the results to this file')
+    parser.add_argument('--compare', help='Earlier --output file to compare against')
+    args = parser.parse_args()
+
+    output = run(args)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        output['comparison'] = {'baseline_revision': baseline.get('revision'),
+                                'results': compare(output['results'], baseline.get('results', {}))}
+    text = json.dumps(output, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
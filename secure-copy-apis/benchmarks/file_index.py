@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Benchmark: file index build, search latency and incremental refresh
+
+Builds a PathIndex over --paths synthetic paths (a million by default) in a
+tree of --dirs directories. It reports the build time, the snapshot save and
+load times and size, and the median latency of substring, prefix and glob
+queries. Each query is compared with a linear scan over the path list, which
+is what searching a /api/list-files result amounts to.
+
+It then indexes a local tree of --tree-files files through an in-process SSH
+server (see harness.py) and changes --touch directories. It compares an
+incremental refresh, which re-lists only changed directories, with a full one.
+On a local tree both are dominated by the SSH session and the index rebuild;
+the listed bytes show what an incremental refresh saves on a slow link.
+
+Before timing anything it checks search against the linear scan on a smaller
+index rooted at /data/root: fixed queries that cover the root's parent
+folders, random substrings of indexed paths and globs must return exactly
+what the scan finds. Any difference is printed and the run exits with 1.
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harness import LocalDevice, make_tree
+from repos.securecopy.FileIndex import DeviceIndex, PathIndex
+
+WORDS = ('src', 'lib', 'test', 'config', 'data', 'app', 'util', 'core', 'api', 'docs', 'build', 'vendor',
+         'internal', 'assets', 'cache', 'logs', 'scripts', 'models', 'views', 'include')
+EXTENSIONS = ('.py', '.c', '.h', '.js', '.json', '.md', '.txt', '.log', '.conf', '.so', '')
+QUERIES = (
+    ('substring', 'config'),
+    ('substring', 'report_1234'),
+    ('substring', 'models/user'),
+    ('prefix', '/srv/src0/'),
+    ('glob', '*.conf'),
+    ('glob', 'report_12*.log'),
+    ('glob', '/srv/*/test*/*.py'),
+)
+CHECK_ROOT = '/data/root'
+CHECK_QUERIES = (
+    ('substring', 'data'),
+    ('substring', 'ta/ro'),
+    ('substring', '/'),
+    ('substring', 'a/root/src'),
+    ('substring', '/data/root'),
+    ('substring', 'ROOT/'),
+    ('substring', 'config'),
+    ('substring', 'report_1234'),
+    ('substring', 'models/user'),
+    ('glob', '*.conf'),
+    ('glob', 'root'),
+    ('glob', 'report_1*.log'),
+    ('glob', '/data/*'),
+    ('glob', '/data/root/*/test*/*.py'),
+    ('glob', '*/root/src*'),
+    ('glob', '*ta/ro*'),
+)
+
+
+def synthetic_entries(paths: int, dirs: int, seed: int = 1, root: str = '/srv'):
+    rng = random.Random(seed)
+    directories = [root]
+    entries = [(root, 'd', 4096, 0.0)]
+    for i in range(dirs):
+        path = f"{rng.choice(directories)}/{rng.choice(WORDS)}{i}"
+        directories.append(path)
+        entries.append((path, 'd', 4096, float(i)))
+    for i in range(paths - dirs - 1):
+        stem = rng.choice(('report_', 'user', 'index', 'main', 'module_', 'part-', ''))
+        name = f"{stem}{rng.randrange(100000)}{rng.choice(EXTENSIONS)}"
+        entries.append((f"{rng.choice(directories)}/{name}", 'f', rng.randrange(1 << 20), float(i)))
+    return entries
+
+
+def scan(paths, mode: str, query: str):
+    """What a client does with a full listing"""
+    if mode == 'prefix':
+        return [path for path in paths if path.startswith(query)]
+    if mode == 'substring':
+        needle = query.lower()
+        return [path for path in paths if needle in path.lower()]
+    if '/' in query:
+        return [path for path in paths if fnmatch.fnmatchcase(path, query)]
+    return [path for path in paths if fnmatch.fnmatchcase(path.rpartition('/')[2], query)]
+
+
+def median_ms(fn, repeats: int) -> float:
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def check_search(paths: int, dirs: int, samples: int, seed: int = 1):
+    """Queries whose index results differ from the linear scan"""
+    index = PathIndex(synthetic_entries(paths, dirs, seed, CHECK_ROOT))
+    rng = random.Random(seed)
+    queries = list(CHECK_QUERIES)
+    for _ in range(samples):
+        # Random substrings of indexed paths, including the root's full path; the glob
+        # variant replaces the substring's inner part with '*'
+        path = rng.choice(index.paths)
+        start = rng.randrange(len(path))
+        needle = path[start:rng.randrange(start + 1, len(path) + 1)]
+        queries.append(('substring', needle))
+        if len(needle) > 2:
+            queries.append(('glob', f"*{needle[0]}*{needle[-1]}*" if '/' not in needle else f"*{needle}*"))
+    mismatches = []
+    for mode, query in queries:
+        found = index.search(query, mode, limit=len(index))
+        got = [entry['path'] for entry in found['entries']]
+        expected = sorted(scan(index.paths, mode, query))
+        if got != expected:
+            mismatches.append({'mode': mode, 'query': query, 'plan': found['plan'],
+                               'returned': len(got), 'expected': len(expected)})
+    return {'paths': len(index), 'root': CHECK_ROOT, 'queries': len(queries), 'mismatches': mismatches}
+
+
+def bench_search(paths: int, dirs: int, repeats: int, limit: int):
+    entries = synthetic_entries(paths, dirs)
+    started = time.perf_counter()
+    index = PathIndex(entries)
+    build_seconds = time.perf_counter() - started
+    del entries
+
+    with tempfile.TemporaryDirectory() as work:
+        device_index = DeviceIndex('bench', 22, '/srv', os.path.join(work, 'bench.idx.gz'))
+        device_index.index = index
+        device_index.refreshed_at = time.time()
+        started = time.perf_counter()
+        device_index.save()
+        save_seconds = time.perf_counter() - started
+        snapshot_bytes = os.path.getsize(device_index.snapshot_path)
+        started = time.perf_counter()
+        DeviceIndex.load(device_index.snapshot_path)
+        load_seconds = time.perf_counter() - started
+
+    queries = []
+    for mode, query in QUERIES:
+        found = index.search(query, mode, limit=limit)
+        queries.append({
+            'mode': mode,
+            'query': query,
+            'plan': found['plan'],
+            'returned': len(found['entries']),
+            'truncated': found['truncated'],
+            'index_ms': median_ms(lambda: index.search(query, mode, limit=limit), repeats),
+            'scan_ms': median_ms(lambda: scan(index.paths, mode, query), 1)
+        })
+    return {
+        'paths': len(index),
+        'distinct_names': len(index.names),
+        'build_seconds': build_seconds,
+        'snapshot_bytes': snapshot_bytes,
+        'save_seconds': save_seconds,
+        'load_seconds': load_seconds,
+        'queries': queries
+    }
+
+
+def bench_refresh(files: int, touch: int):
+    device = LocalDevice()
+    try:
+        with tempfile.TemporaryDirectory() as work:
+            root = os.path.join(work, 'tree')
+            make_tree(root, files)
+            device_index = DeviceIndex('127.0.0.1', device.config.port, root, os.path.join(work, 'tree.idx.gz'))
+            first = device_index.refresh(device.config)
+            directories = sorted(os.listdir(root))
+            for name in directories[:touch]:
+                with open(os.path.join(root, name, 'added'), 'w') as f:
+                    f.write('x')
+            incremental = device_index.refresh(device.config)
+            full = device_index.refresh(device.config, full=True)
+    finally:
+        device.close()
+    return {
+        'files': files,
+        'touched_directories': touch,
+        'first_seconds': first['duration'],
+        'incremental_seconds': incremental['duration'],
+        'incremental_listed_directories': incremental['listed_directories'],
+        'incremental_listed_bytes': incremental['listed_bytes'],
+        'full_seconds': full['duration'],
+        'full_listed_bytes': full['listed_bytes']
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--paths', type=int, default=1000000)
+    parser.add_argument('--dirs', type=int, default=20000)
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--limit', type=int, default=1000)
+    parser.add_argument('--tree-files', type=int, default=50000)
+    parser.add_argument('--touch', type=int, default=5)
+    parser.add_argument('--check-paths', type=int, default=20000)
+    parser.add_argument('--check-samples', type=int, default=200)
+    args = parser.parse_args()
+
+    check = check_search(args.check_paths, max(args.check_paths // 50, 1), args.check_samples)
+    if check['mismatches']:
+        print(json.dumps({'benchmark': 'file_index', 'check': check}, indent=2))
+        sys.exit(1)
+    output = {
+        'benchmark': 'file_index',
+        'check': check,
+        'search': bench_search(args.paths, args.dirs, args.repeats, args.limit),
+        'refresh': bench_refresh(args.tree_files, args.touch)
+    }
+    print(json.dumps(output, indent=2))
@@ -0,0 +1,477 @@
+"""
+Offline stand-ins for benchmarks
+An in-process paramiko SSH/SFTP server over the local filesystem, a link emulator adding latency and a
+bandwidth limit in front of it, and an Oracle stand-in with a fixed round-trip time
+"""
+
+import logging
+import os
+import queue
+import socket
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import oracledb
+import paramiko
+
+from repos.securecopy.Bandwidth import TokenBucket
+from repos.securecopy.SecureCopy import DeviceConfig
+
+logging.getLogger('benchmarks.sshd').setLevel(logging.CRITICAL)
+
+# Generating a host key takes a noticeable fraction of a second; every server in a run shares one
+_host_key = None
+_host_key_lock = threading.Lock()
+
+
+def host_key() -> paramiko.RSAKey:
+    global _host_key
+    with _host_key_lock:
+        if _host_key is None:
+            _host_key = paramiko.RSAKey.generate(2048)
+        return _host_key
+
+
+class _Handle(paramiko.SFTPHandle):
+    def stat(self):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def chattr(self, attr):
+        try:
+            paramiko.SFTPServer.set_file_attr(self.filename, attr)
+            return paramiko.SFTP_OK
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+
+class LocalSFTPServer(paramiko.SFTPServerInterface):
+    """SFTP over the local filesystem; paths are used as given"""
+
+    @staticmethod
+    def _errno(e: OSError):
+        return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def canonicalize(self, path):
+        return os.path.normpath(path if os.path.isabs(path) else os.path.join('/', path))
+
+    def list_folder(self, path):
+        try:
+            entries = []
+            for name in os.listdir(path):
+                attr = paramiko.SFTPAttributes.from_stat(os.lstat(os.path.join(path, name)))
+                attr.filename = name
+                entries.append(attr)
+            return entries
+        except OSError as e:
+            return self._errno(e)
+
+    def stat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(path))
+        except OSError as e:
+            return self._errno(e)
+
+    def lstat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.lstat(path))
+        except OSError as e:
+            return self._errno(e)
+
+    def open(self, path, flags, attr):
+        try:
+            fd = os.open(path, flags | getattr(os, 'O_BINARY', 0), getattr(attr, 'st_mode', None) or 0o666)
+        except OSError as e:
+            return self._errno(e)
+        if flags & os.O_WRONLY:
+            mode = 'ab' if flags & os.O_APPEND else 'wb'
+        elif flags & os.O_RDWR:
+            mode = 'a+b' if flags & os.O_APPEND else 'r+b'
+        else:
+            mode = 'rb'
+        handle = _Handle(flags)
+        handle.filename = path
+        handle.readfile = handle.writefile = os.fdopen(fd, mode)
+        return handle
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+            return paramiko.SFTP_OK
+        except OSError as e:
+            return self._errno(e)
+
+    def rename(self, oldpath, newpath):
+        try:
+            os.rename(oldpath, newpath)
+            return paramiko.SFTP_OK
+        except OSError as e:
+            return self._errno(e)
+
+    def mkdir(self, path, attr):
+        try:
+            os.mkdir(path)
+            return paramiko.SFTP_OK
+        except OSError as e:
+            return self._errno(e)
+
+    def rmdir(self, path):
+        try:
+            os.rmdir(path)
+            return paramiko.SFTP_OK
+        except OSError as e:
+            return self._errno(e)
+
+    def chattr(self, path, attr):
+        try:
+            paramiko.SFTPServer.set_file_attr(path, attr)
+            return paramiko.SFTP_OK
+        except OSError as e:
+            return self._errno(e)
+
+
+class _ServerInterface(paramiko.ServerInterface):
+    """Accepts any password and runs exec requests with the local shell"""
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED_OPEN_REQUEST
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=_run_exec, args=(channel, command.decode('utf-8')), daemon=True).start()
+        return True
+
+
+def _run_exec(channel: paramiko.Channel, command: str):
+    process = subprocess.Popen(['sh', '-c', command], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+
+    def feed_stdin():
+        try:
+            while True:
+                data = channel.recv(32768)
+                if not data:
+                    break
+                process.stdin.write(data)
+                process.stdin.flush()
+        except (OSError, EOFError):
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    def drain(stream, send):
+        for data in iter(lambda: stream.read1(32768), b''):
+            send(data)
+
+    threads = [threading.Thread(target=feed_stdin, daemon=True),
+               threading.Thread(target=drain, args=(process.stderr, channel.sendall_stderr), daemon=True)]
+    for thread in threads:
+        thread.start()
+    try:
+        drain(process.stdout, channel.sendall)
+        threads[1].join()
+        channel.send_exit_status(process.wait())
+    except OSError:
+        # The client closed the channel early, e.g. a truncated or timed-out command
+        process.kill()
+    finally:
+        channel.close()
+
+
+class LocalSSHServer:
+    """
+    SSH server on 127.0.0.1 serving exec and SFTP against the local filesystem
+
+    Every connection gets its own paramiko Transport, so the server costs
+    match what a client pays against a real sshd closely enough to compare
+    versions of the client side.
+    """
+
+    def __init__(self):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(('127.0.0.1', 0))
+        self._socket.listen(128)
+        self.port = self._socket.getsockname()[1]
+        self._transports = []
+        self._running = True
+        threading.Thread(target=self._accept, name=f"ssh-server-{self.port}", daemon=True).start()
+
+    def _accept(self):
+        while self._running:
+            try:
+                conn, _ = self._socket.accept()
+            except OSError:
+                return
+            transport = paramiko.Transport(conn)
+            # Clients hanging up after each benchmark call would otherwise log a reset per connection
+            transport.set_log_channel('benchmarks.sshd')
+            transport.add_server_key(host_key())
+            transport.set_subsystem_handler('sftp', paramiko.SFTPServer, LocalSFTPServer)
+            self._transports.append(transport)
+            try:
+                transport.start_server(server=_ServerInterface())
+            except (paramiko.SSHException, EOFError, OSError):
+                transport.close()
+
+    def close(self):
+        self._running = False
+        self._socket.close()
+        for transport in self._transports:
+            transport.close()
+
+
+class LinkEmulator:
+    """
+    TCP proxy adding one-way latency and a bandwidth limit in each direction
+
+    Data is delayed rather than paced per round trip, so pipelined requests
+    overlap the way they do over a real long link.
+    """
+
+    def __init__(self, target_port: int, rtt: float = 0.0, bandwidth: Optional[float] = None):
+        """
+        Args:
+            target_port: Local port to forward to
+            rtt: Round-trip time in seconds, split evenly between directions
+            bandwidth: Bytes per second in each direction, None for unlimited
+        """
+        self.target_port = target_port
+        self.delay = rtt / 2
+        self.bandwidth = bandwidth
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(('127.0.0.1', 0))
+        self._socket.listen(128)
+        self.port = self._socket.getsockname()[1]
+        threading.Thread(target=self._accept, name=f"link-{self.port}", daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self._socket.accept()
+            except OSError:
+                return
+            try:
+                upstream = socket.create_connection(('127.0.0.1', self.target_port))
+            except OSError:
+                client.close()
+                continue
+            for src, dst in ((client, upstream), (upstream, client)):
+                src.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self._pipe(src, dst)
+
+    def _pipe(self, src: socket.socket, dst: socket.socket):
+        pending = queue.Queue()
+        bucket = TokenBucket(self.bandwidth, burst=64 * 1024) if self.bandwidth else None
+
+        def read():
+            try:
+                while True:
+                    data = src.recv(65536)
+                    if not data:
+                        break
+                    pending.put((time.monotonic() + self.delay, data))
+            except OSError:
+                pass
+            pending.put((None, None))
+
+        def deliver():
+            try:
+                while True:
+                    due, data = pending.get()
+                    if data is None:
+                        dst.shutdown(socket.SHUT_WR)
+                        break
+                    wait = due - time.monotonic()
+                    if wait > 0:
+                        time.sleep(wait)
+                    if bucket is not None:
+                        bucket.consume(len(data))
+                    dst.sendall(data)
+            except OSError:
+                pass
+
+        threading.Thread(target=read, daemon=True).start()
+        threading.Thread(target=deliver, daemon=True).start()
+
+    def close(self):
+        self._socket.close()
+
+
+class LocalDevice:
+    """A LocalSSHServer, optionally behind a LinkEmulator, and the DeviceConfig that reaches it"""
+
+    def __init__(self, rtt: float = 0.0, bandwidth: Optional[float] = None, directory: str = ''):
+        self.server = LocalSSHServer()
+        self.link = LinkEmulator(self.server.port, rtt, bandwidth) if rtt or bandwidth else None
+        port = self.link.port if self.link else self.server.port
+        self.config = DeviceConfig(username='bench', password='bench', host='127.0.0.1', directory=directory,
+                                   port=port)
+
+    def as_json(self) -> Dict:
+        """Request body form of the device"""
+        return {'username': self.config.username, 'password': self.config.password, 'host': self.config.host,
+                'port': self.config.port, 'directory': self.config.directory}
+
+    def close(self):
+        if self.link:
+            self.link.close()
+        self.server.close()
+
+
+class DeviceProcess:
+    """
+    A LocalSSHServer in a child process and the DeviceConfig that reaches it
+
+    Use it when the server's crypto must not share the benchmark's GIL, as
+    when measuring how the client side scales across processes.
+    """
+
+    def __init__(self, directory: str = ''):
+        benchmarks = os.path.dirname(os.path.abspath(__file__))
+        self._process = subprocess.Popen(
+            [sys.executable, '-c', f"import sys; sys.path[:0] = {[os.path.dirname(benchmarks), benchmarks]!r}; "
+                                   "import harness; harness.serve_forever()"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        port = int(self._process.stdout.readline())
+        self.config = DeviceConfig(username='bench', password='bench', host='127.0.0.1', directory=directory,
+                                   port=port)
+
+    def close(self):
+        # The child exits when its stdin closes
+        self._process.stdin.close()
+        self._process.wait()
+
+
+def serve_forever():
+    """DeviceProcess child: print the server's port, then serve until stdin closes"""
+    server = LocalSSHServer()
+    print(server.port, flush=True)
+    sys.stdin.read()
+    server.close()
+
+
+class _StandInCursor:
+    def __init__(self, database: 'StandInDatabase'):
+        self.database = database
+        self.rowcount = 0
+
+    def execute(self, sql, params=None):
+        self.database._round_trip(1)
+        self.rowcount = 1
+
+    def executemany(self, sql, rows):
+        rows = list(rows)
+        self.database._round_trip(len(rows))
+        self.rowcount = len(rows)
+
+    def setinputsizes(self, *args, **kwargs):
+        pass
+
+    def fetchone(self):
+        # Existence checks such as SELECT COUNT(*) FROM user_tables see every table as present
+        return (1,)
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class _StandInConnection:
+    def __init__(self, database: 'StandInDatabase'):
+        self.database = database
+
+    def cursor(self):
+        return _StandInCursor(self.database)
+
+    def commit(self):
+        self.database._round_trip(0)
+        with self.database._lock:
+            self.database.commits += 1
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class StandInDatabase:
+    """
+    Replaces oracledb.connect with connections that accept any SQL
+
+    Each execute, executemany and commit costs one round trip of rtt
+    seconds, and connect costs connect_rtts of them. Rows are counted but
+    not stored, so this measures the client's side of auditing.
+    """
+
+    def __init__(self, rtt: float = 0.0005, connect_rtts: int = 4):
+        self.rtt = rtt
+        self.connect_rtts = connect_rtts
+        self.connects = 0
+        self.statements = 0
+        self.rows = 0
+        self.commits = 0
+        self._lock = threading.Lock()
+
+    def _round_trip(self, rows: int):
+        if self.rtt:
+            time.sleep(self.rtt)
+        with self._lock:
+            self.statements += 1
+            self.rows += rows
+
+    def connect(self, *args, **kwargs):
+        if self.rtt:
+            time.sleep(self.rtt * self.connect_rtts)
+        with self._lock:
+            self.connects += 1
+        return _StandInConnection(self)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'connects': self.connects, 'statements': self.statements, 'rows': self.rows,
+                    'commits': self.commits}
+
+    @contextmanager
+    def installed(self):
+        """Route every oracledb.connect call in the process to this stand-in"""
+        original = oracledb.connect
+        oracledb.connect = self.connect
+        try:
+            yield self
+        finally:
+            oracledb.connect = original
+
+
+def make_tree(root: str, files: int, per_dir: int = 100, size: int = 128):
+    """Create files small files spread over directories of per_dir entries"""
+    payload = b'x' * size
+    for i in range(files):
+        directory = os.path.join(root, f"d{i // per_dir:04d}")
+        if i % per_dir == 0:
+            os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"f{i:06d}"), 'wb') as f:
+            f.write(payload)
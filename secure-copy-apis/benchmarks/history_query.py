@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark: "last hour of errors" latency against total history size
+
+By default, a local sqlite database stands in for Oracle. api_logs-shaped
+rows are spread evenly over --days days at each of --rows sizes. The query
+is timed on an unindexed table with a text timestamp, the old layout, and
+on a TIMESTAMP-ordered table with the (status, time) index HistoryStore
+creates. The indexed query should stay flat as history grows. Daily
+partitions add pruning on top of that in Oracle. With --dsn/--user/--password,
+HistoryStore.query runs against a real database instead, and times the same
+query on its existing data.
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+OPERATIONS = ('transfer_file', 'list_files', 'execute_command', 'mirror_directory')
+
+
+def populate(rows: int, days: int, indexed: bool) -> sqlite3.Connection:
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE api_logs (id INTEGER PRIMARY KEY, ts TEXT, operation_type TEXT, device1 TEXT, '
+                 'status TEXT)')
+    now = datetime.now()
+    span = days * 86400
+    rng = random.Random(1)
+    conn.executemany('INSERT INTO api_logs (ts, operation_type, device1, status) VALUES (?, ?, ?, ?)', (
+        ((now - timedelta(seconds=span * i / rows)).isoformat(), rng.choice(OPERATIONS),
+         f"10.0.0.{rng.randrange(1, 50)}", 'error' if rng.random() < 0.02 else 'success')
+        for i in range(rows)
+    ))
+    if indexed:
+        conn.execute('CREATE INDEX api_logs_status_ts_ix ON api_logs (status, ts)')
+        conn.execute('CREATE INDEX api_logs_ts_ix ON api_logs (ts)')
+    conn.commit()
+    return conn
+
+
+def time_query(conn: sqlite3.Connection, repeats: int):
+    start = (datetime.now() - timedelta(hours=1)).isoformat()
+    best, found = None, 0
+    for _ in range(repeats):
+        started = time.perf_counter()
+        found = len(conn.execute("SELECT * FROM api_logs WHERE status = 'error' AND ts >= ? "
+                                 "ORDER BY ts DESC LIMIT 100", (start,)).fetchall())
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, found
+
+
+def simulate(sizes, days: int, repeats: int):
+    results = []
+    for rows in sizes:
+        entry = {'rows': rows}
+        for layout, indexed in (('unindexed', False), ('indexed', True)):
+            conn = populate(rows, days, indexed)
+            seconds, found = time_query(conn, repeats)
+            conn.close()
+            entry[layout] = {'query_ms': seconds * 1000, 'rows_returned': found}
+        results.append(entry)
+    return results
+
+
+def live(dsn: str, user: str, password: str, repeats: int):
+    import oracledb
+    from repos.databases.AuditHistory import HistoryStore
+
+    store = HistoryStore(lambda: oracledb.connect(user=user, password=password, dsn=dsn, mode=oracledb.SYSDBA))
+    store.ensure_schema(['api_logs'])
+    end = datetime.now()
+    samples = []
+    rows = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        rows = store.query('api_logs', end - timedelta(hours=1), end, status='error')
+        samples.append(time.perf_counter() - started)
+    return {'query_ms': min(samples) * 1000, 'rows_returned': len(rows)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--days', type=int, default=90, help='History the rows are spread over')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--dsn', help='Oracle DSN for a live run')
+    parser.add_argument('--user', default='sys')
+    parser.add_argument('--password')
+    args = parser.parse_args()
+
+    if args.dsn:
+        output = {'benchmark': 'history_query', 'mode': 'live',
+                  **live(args.dsn, args.user, args.password, args.repeats)}
+    else:
+        output = {'benchmark': 'history_query', 'mode': 'simulated', 'days': args.days,
+                  'results': simulate(args.rows, args.days, args.repeats)}
+    print(json.dumps(output, indent=2))
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark: JSON serialization and compression of a /api/list-files response
+
+Builds a listing of --paths paths (one million by default) and reports:
+
+  encode     time and peak extra memory for the standard library encoder
+             Flask used before (sorted keys), orjson, and streamed iter_json
+  encodings  for each Content-Encoding available here, the compress time,
+             bytes on the wire and ratio against the uncompressed body
+  delivery   modelled time to the last byte, encoding plus compression plus
+             the wire, over --link-mb-s links
+
+brotli and zstd are included when the brotli and zstandard packages are installed.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from repos.api.JsonResponse import ENCODINGS, compress, dumps, iter_json, orjson
+
+MB = 1024 * 1024
+
+
+def listing_response(paths: int):
+    listing = [f"/srv/data/project-{i // 1000:04d}/module-{i // 50:06d}/file-{i:08d}.dat" for i in range(paths)]
+    return {'status': 'success', 'timestamp': '2024-07-24T12:00:00', 'data': {'device1': listing, 'device2': []}}
+
+
+def best_of(fn, repeats: int):
+    best, result = None, None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def peak_memory(fn) -> int:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def streamed_size(payload) -> int:
+    # Consumes the chunks as a server would, holding one at a time
+    return sum(len(chunk) for chunk in iter_json(payload))
+
+
+def run(paths: int, repeats: int, links):
+    payload = listing_response(paths)
+    encoders = {
+        'stdlib_sorted': lambda: json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('utf-8'),
+        'dumps': lambda: dumps(payload),
+        'iter_json': lambda: streamed_size(payload)
+    }
+    encode = {}
+    for name, fn in encoders.items():
+        seconds, _ = best_of(fn, repeats)
+        encode[name] = {'seconds': seconds, 'peak_mb': peak_memory(fn) / MB}
+
+    body = dumps(payload)
+    encodings = {'identity': {'seconds': 0.0, 'bytes': len(body), 'ratio': 1.0}}
+    for encoding in ENCODINGS:
+        seconds, compressed = best_of(lambda: compress(body, encoding), repeats)
+        encodings[encoding] = {'seconds': seconds, 'bytes': len(compressed), 'ratio': len(body) / len(compressed)}
+
+    delivery = []
+    for link in links:
+        row = {'link_mb_s': link}
+        for encoding, stats in encodings.items():
+            row[encoding] = encode['dumps']['seconds'] + stats['seconds'] + stats['bytes'] / (link * MB)
+        delivery.append(row)
+    return {'encode': encode, 'encodings': encodings, 'delivery_seconds': delivery}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--paths', type=int, default=1000000)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--link-mb-s', type=float, nargs='+', default=[1, 10, 100, 1000])
+    args = parser.parse_args()
+
+    output = {'benchmark': 'json_encoding', 'paths': args.paths, 'orjson': orjson is not None,
+              'available_encodings': list(ENCODINGS), **run(args.paths, args.repeats, args.link_mb_s)}
+    print(json.dumps(output, indent=2))
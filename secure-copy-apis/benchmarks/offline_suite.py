@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Benchmark: the API, SCPManager and the monitor without devices or Oracle
+
+Two in-process SSH/SFTP servers stand in for the devices (see harness.py),
+optionally behind a link emulator adding --rtt-ms and --bandwidth-mb-s, and
+oracledb.connect is routed to a stand-in costing --db-rtt-ms per round trip.
+The suite measures:
+
+  endpoints   latency of API calls through the Flask test client, audit logging included
+  transfers   SCPManager.transfer_file relay throughput across --sizes
+  listing     /api/list-files on synthetic trees of --tree-files files
+  audit       DatabaseManager.log_operation calls per second
+  report      SystemSecurityMonitor.generate_security_report time, per phase
+
+Results are printed as JSON and written to --output. --compare takes an
+earlier output and adds the ratio of every timing to its baseline value, so
+two versions can be compared run against run.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.harness import LocalDevice, StandInDatabase, make_tree
+
+MB = 1024 * 1024
+SUITES = ('endpoints', 'transfers', 'listing', 'audit', 'report')
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {'p50_ms': pick(0.5) * 1000, 'p95_ms': pick(0.95) * 1000, 'mean_ms': statistics.mean(ordered) * 1000,
+            'samples': len(ordered)}
+
+
+def timed(fn, iterations: int):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return percentiles(samples)
+
+
+def bench_endpoints(client, device1, device2, iterations: int):
+    devices = {'device1': device1.as_json(), 'device2': device2.as_json()}
+
+    def post(path, body):
+        response = client.post(path, json=body)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{path} returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+
+    calls = {
+        'GET /api/health': lambda: client.get('/api/health'),
+        'GET /metrics': lambda: client.get('/metrics'),
+        'POST /api/execute-command': lambda: post('/api/execute-command',
+                                                  dict(devices, device='device1', command='echo ok')),
+        'POST /api/test-connections': lambda: post('/api/test-connections', devices)
+    }
+    return {name: timed(call, iterations) for name, call in calls.items()}
+
+
+def bench_transfers(device1, device2, work: str, sizes, repeats: int):
+    from repos.securecopy.SecureCopy import SCPManager
+
+    results = []
+    for size in sizes:
+        source = os.path.join(work, f"transfer-{size}.bin")
+        with open(source, 'wb') as f:
+            f.write(os.urandom(size))
+        durations = []
+        for i in range(repeats):
+            dest = os.path.join(work, f"transfer-{size}.copy{i}")
+            started = time.perf_counter()
+            outcome = SCPManager.transfer_file(device1.config, device2.config, source, dest)
+            durations.append(time.perf_counter() - started)
+            if not outcome.get('success'):
+                raise RuntimeError(f"Transfer of {size} bytes failed: {outcome.get('error')}")
+            os.remove(dest)
+        os.remove(source)
+        best = min(durations)
+        results.append({'bytes': size, 'seconds': statistics.median(durations), 'best_seconds': best,
+                        'mb_s': size / best / MB})
+    return results
+
+
+def bench_listing(client, device1, device2, work: str, tree_sizes):
+    results = []
+    for files in tree_sizes:
+        root = os.path.join(work, f"tree-{files}")
+        make_tree(root, files)
+        devices = {name: dict(device.as_json(), directory=root)
+                   for name, device in (('device1', device1), ('device2', device2))}
+        started = time.perf_counter()
+        response = client.post('/api/list-files', json=devices)
+        seconds = time.perf_counter() - started
+        listed = len(response.get_json()['data']['device1'])
+        shutil.rmtree(root)
+        results.append({'files': files, 'entries_listed': listed, 'seconds': seconds,
+                        'entries_per_s': 2 * listed / seconds if seconds else None})
+    return results
+
+
+def bench_audit(database: StandInDatabase, iterations: int):
+    from app import db_manager
+
+    request_data = {'device1': {'host': '10.0.0.1'}, 'device2': {'host': '10.0.0.2'},
+                    'source_path': '/var/log/syslog', 'dest_path': '/tmp/syslog'}
+    response_data = {'status': 'success', 'transfer_details': {'success': True, 'file_size': 1048576}}
+    before = database.stats()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        db_manager.log_operation('transfer_file', {'device1': '10.0.0.1', 'device2': '10.0.0.2'},
+                                 request_data, response_data, 'success')
+    seconds = time.perf_counter() - started
+    after = database.stats()
+    return {'calls': iterations, 'seconds': seconds, 'calls_per_s': iterations / seconds,
+            'database_calls_per_call': (after['statements'] + after['connects'] - before['statements']
+                                     - before['connects']) / iterations}
+
+
+def bench_report(work: str, iterations: int):
+    from repos.SystemSecurityMonitor import MONITOR_PHASE_SECONDS, SystemSecurityMonitor
+
+    monitor = SystemSecurityMonitor(log_file=os.path.join(work, 'monitor.log'), insert_state='true')
+    phases = ('process_anomalies', 'process_scan', 'system_integrity', 'resource_monitoring')
+    before = {phase: MONITOR_PHASE_SECONDS.summary(phase=phase)['sum'] for phase in phases}
+    totals = timed(monitor.generate_security_report, iterations)
+    return dict(totals, phases_ms={
+        phase: (MONITOR_PHASE_SECONDS.summary(phase=phase)['sum'] - before[phase]) / iterations * 1000
+        for phase in phases
+    })
+
+
+def compare(current, baseline):
+    """Mirror current, replacing each timing with {value, baseline, ratio}"""
+    if isinstance(current, dict) and isinstance(baseline, dict):
+        return {key: compare(value, baseline.get(key)) for key, value in current.items()}
+    if isinstance(current, list) and isinstance(baseline, list):
+        # Rows are matched on their size column so runs with different --sizes still line up
+        def row_key(row):
+            return (row.get('bytes'), row.get('files')) if isinstance(row, dict) else None
+        rows = {row_key(row): row for row in baseline}
+        return [compare(row, rows.get(row_key(row))) for row in current]
+    if isinstance(current, (int, float)) and isinstance(baseline, (int, float)) and not isinstance(current, bool):
+        return {'value': current, 'baseline': baseline, 'ratio': current / baseline if baseline else None}
+    return current
+
+
+def revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(args):
+    # Connection and scan logging would otherwise dominate the timings
+    logging.disable(logging.INFO)
+    database = StandInDatabase(rtt=args.db_rtt_ms / 1000)
+    bandwidth = args.bandwidth_mb_s * MB if args.bandwidth_mb_s else None
+    device1 = LocalDevice(args.rtt_ms / 1000, bandwidth)
+    device2 = LocalDevice(args.rtt_ms / 1000, bandwidth)
+    work = tempfile.mkdtemp(prefix='securecopy-bench-')
+    output = {
+        'benchmark': 'offline_suite',
+        'revision': revision(),
+        'python': platform.python_version(),
+        'config': {'rtt_ms': args.rtt_ms, 'bandwidth_mb_s': args.bandwidth_mb_s, 'db_rtt_ms': args.db_rtt_ms},
+        'results': {}
+    }
+    try:
+        with database.installed():
+            from app import app
+            client = app.test_client()
+            results = output['results']
+            if 'endpoints' in args.suites:
+                results['endpoints'] = bench_endpoints(client, device1, device2, args.iterations)
+            if 'transfers' in args.suites:
+                results['transfers'] = bench_transfers(device1, device2, work, args.sizes, args.repeats)
+            if 'listing' in args.suites:
+                results['listing'] = bench_listing(client, device1, device2, work, args.tree_files)
+            if 'audit' in args.suites:
+                results['audit'] = bench_audit(database, args.audit_calls)
+            if 'report' in args.suites:
+                results['report'] = bench_report(work, args.report_iterations)
+        output['database'] = database.stats()
+    finally:
+        device1.close()
+        device2.close()
+        shutil.rmtree(work, ignore_errors=True)
+    return output
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--suites', nargs='+', choices=SUITES, default=list(SUITES))
+    parser.add_argument('--rtt-ms', type=float, default=0, help='Emulated round-trip time to each device')
+    parser.add_argument('--bandwidth-mb-s', type=float, default=0, help='Emulated link speed, 0 for unlimited')
+    parser.add_argument('--db-rtt-ms', type=float, default=0.5, help='Round-trip time of the database stand-in')
+    parser.add_argument('--iterations', type=int, default=20, help='Calls per endpoint')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[64 * 1024, MB, 16 * MB])
+    parser.add_argument('--repeats', type=int, default=3, help='Transfers per size')
+    parser.add_argument('--tree-files', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--audit-calls', type=int, default=200)
+    parser.add_argument('--report-iterations', type=int, default=2)
+    parser.add_argument('--output', help='Also write the results to this file')
+    parser.add_argument('--compare', help='Earlier --output file to compare against')
+    args = parser.parse_args()
+
+    output = run(args)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        output['comparison'] = {'baseline_revision': baseline.get('revision'),
+                                'results': compare(output['results'], baseline.get('results', {}))}
+    text = json.dumps(output, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-interval JSON report files vs the compressed report archive
+Measures disk usage and the time to read the last 24h of reports
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from repos.monitoring.ReportArchive import ReportArchive
+
+
+def synthetic_report(timestamp: float, rng: random.Random) -> dict:
+    """Build a report shaped like SystemSecurityMonitor.generate_security_report()"""
+    iso = datetime.fromtimestamp(timestamp).isoformat()
+    processes = [
+        {'pid': 1000 + i, 'name': f"worker-{i}", 'cpu_percent': rng.random() * 40,
+         'memory_percent': rng.random() * 10}
+        for i in range(40)
+    ]
+    return {
+        'timestamp': iso,
+        'system_info': {'hostname': 'bench-host', 'system': 'Linux', 'release': '5.15.0'},
+        'process_anomalies': [],
+        'process_scan': {
+            'total_processes': 350,
+            'suspicious_processes': [],
+            'high_resource_processes': processes[:5],
+            'network_processes': [{'pid': p['pid'], 'name': p['name'], 'connections': 3} for p in processes],
+            'timestamp': iso
+        },
+        'system_integrity': {
+            'file_integrity': {},
+            'system_files': {
+                path: {'size': 1024, 'mtime': 1700000000.0, 'permissions': '644'}
+                for path in ['/etc/passwd', '/etc/shadow', '/etc/hosts', '/etc/crontab', '/etc/sudoers']
+            },
+            'permissions': {'world_writable': [f"/etc/app/conf-{i}.d" for i in range(20)]},
+            'timestamp': iso
+        },
+        'resource_monitoring': {
+            'cpu_usage': rng.random() * 100,
+            'memory_usage': rng.random() * 100,
+            'disk_usage': {'/': {'total': 100, 'used': 50, 'free': 50, 'percent': 50.0}},
+            'network_connections': 120,
+            'load_average': [0.5, 0.4, 0.3],
+            'anomalies': [],
+            'timestamp': iso
+        }
+    }
+
+
+def directory_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+def read_legacy(directory: str, start: float, end: float) -> int:
+    """Read a range the only way the old layout allows: list and parse every file"""
+    count = 0
+    for name in os.listdir(directory):
+        if not name.startswith('security_report_'):
+            continue
+        with open(os.path.join(directory, name)) as f:
+            report = json.load(f)
+        if start <= datetime.fromisoformat(report['timestamp']).timestamp() <= end:
+            count += 1
+    return count
+
+
+def run(days: int, interval: int) -> dict:
+    rng = random.Random(42)
+    now = time.time()
+    first = now - days * 86400
+    timestamps = [first + i * interval for i in range(int(days * 86400 / interval))]
+    workdir = tempfile.mkdtemp(prefix='report-archive-bench-')
+    legacy_dir = os.path.join(workdir, 'legacy')
+    archive_dir = os.path.join(workdir, 'archive')
+    os.makedirs(legacy_dir)
+
+    try:
+        reports = [synthetic_report(ts, rng) for ts in timestamps]
+
+        started = time.perf_counter()
+        for ts, report in zip(timestamps, reports):
+            with open(os.path.join(legacy_dir, f"security_report_{int(ts)}.json"), 'w') as f:
+                json.dump(report, f, indent=2)
+        legacy_write = time.perf_counter() - started
+
+        archive = ReportArchive(archive_dir, retention_seconds=None, max_total_bytes=None)
+        started = time.perf_counter()
+        for report in reports:
+            archive.append(report)
+        archive_write = time.perf_counter() - started
+
+        range_start, range_end = now - 86400, now
+        started = time.perf_counter()
+        legacy_count = read_legacy(legacy_dir, range_start, range_end)
+        legacy_read = time.perf_counter() - started
+
+        started = time.perf_counter()
+        archive_count = sum(1 for _ in archive.read_range(range_start, range_end))
+        archive_read = time.perf_counter() - started
+
+        return {
+            'benchmark': 'report_archive',
+            'reports': len(reports),
+            'interval_seconds': interval,
+            'days': days,
+            'legacy': {
+                'files': len(os.listdir(legacy_dir)),
+                'bytes': directory_bytes(legacy_dir),
+                'write_seconds': legacy_write,
+                'read_last_24h_seconds': legacy_read,
+                'reports_read': legacy_count
+            },
+            'archive': {
+                'files': len(os.listdir(archive_dir)),
+                'bytes': archive.disk_usage(),
+                'write_seconds': archive_write,
+                'read_last_24h_seconds': archive_read,
+                'reports_read': archive_count
+            }
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--days', type=int, default=7, help='Days of reports to generate')
+    parser.add_argument('--interval', type=int, default=60, help='Seconds between reports')
+    args = parser.parse_args()
+    print(json.dumps(run(args.days, args.interval), indent=2))
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark: SSH throughput per cipher and MAC
+
+For every cipher paramiko supports, and for each of --macs with ciphers that
+need a separate MAC, connects with SSHManager.create_ssh_client offering only
+that suite. It then streams --size bytes of `head -c` output over one exec
+channel. The handshake time, the negotiated suite and MB/s are reported.
+Suites using CBC, 3DES, SHA-1 or MD5 are marked unsafe. The fastest safe
+suite is printed in the ssh_algorithms form a device or the global
+preferences take.
+
+By default the server is an in-process paramiko server (see harness.py), so
+both ends' crypto share this process and the figures rank suites rather than
+predict a real link. Pass --device with a device JSON, for example a local
+sshd, to measure the client side against a real server.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from repos.securecopy.SecureCopy import DeviceConfig, SSHManager, supported_ssh_algorithms
+
+MB = 1024 * 1024
+UNSAFE_MARKERS = ('cbc', '3des', 'sha1', 'md5')
+DEFAULT_MACS = ['hmac-sha2-256-etm@openssh.com', 'hmac-sha2-512-etm@openssh.com', 'hmac-sha2-256', 'hmac-sha1']
+
+
+def is_aead(cipher: str) -> bool:
+    return 'gcm' in cipher or 'poly1305' in cipher
+
+
+def is_safe(cipher: str, mac: str) -> bool:
+    return not any(marker in name for name in (cipher, mac or '') for marker in UNSAFE_MARKERS)
+
+
+def measure(device: dict, cipher: str, mac: str, size: int, repeats: int):
+    config = DeviceConfig(**dict(device, ssh_algorithms={'ciphers': [cipher], 'macs': [mac], 'fallback': False}))
+    best = None
+    handshake = None
+    negotiated = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        client = SSHManager.create_ssh_client(config)
+        connected = time.perf_counter()
+        try:
+            negotiated = SSHManager.negotiated_algorithms(client)
+            channel = client.get_transport().open_session()
+            channel.exec_command(f"head -c {size} /dev/zero")
+            received = 0
+            streaming = time.perf_counter()
+            while True:
+                data = channel.recv(1024 * 1024)
+                if not data:
+                    break
+                received += len(data)
+            elapsed = time.perf_counter() - streaming
+            channel.close()
+        finally:
+            client.close()
+        if received != size:
+            raise RuntimeError(f"{cipher}/{mac}: received {received} of {size} bytes")
+        best = elapsed if best is None else min(best, elapsed)
+        handshake = connected - started if handshake is None else min(handshake, connected - started)
+    return {'cipher': negotiated['cipher'], 'mac': negotiated['mac'], 'safe': is_safe(cipher, mac if not is_aead(cipher) else None),
+            'mb_s': size / best / MB, 'handshake_ms': handshake * 1000}
+
+
+def run(device: dict, size: int, repeats: int, macs):
+    supported = supported_ssh_algorithms()
+    macs = [mac for mac in macs if mac in supported['macs']]
+    results = []
+    for cipher in supported['ciphers']:
+        # AEAD ciphers ignore the MAC, so one run covers them
+        for mac in (macs[:1] if is_aead(cipher) else macs):
+            try:
+                results.append(measure(device, cipher, mac, size, repeats))
+            except Exception as e:
+                results.append({'cipher': cipher, 'mac': mac, 'error': str(e)})
+    results.sort(key=lambda row: row.get('mb_s', 0), reverse=True)
+    safe = [row for row in results if row.get('safe')]
+    recommended = None
+    if safe:
+        ciphers = list(dict.fromkeys(row['cipher'] for row in safe))
+        macs_ranked = list(dict.fromkeys(row['mac'] for row in safe if row['mac'] != 'aead'))
+        recommended = {'ciphers': ciphers, 'macs': macs_ranked}
+    return {'results': results, 'recommended_ssh_algorithms': recommended}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=64 * MB, help='Bytes streamed per measurement')
+    parser.add_argument('--repeats', type=int, default=2)
+    parser.add_argument('--macs', nargs='+', default=DEFAULT_MACS, help='MACs tried with non-AEAD ciphers')
+    parser.add_argument('--device', help='Device JSON (host, port, username, password) to measure against')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    output = {'benchmark': 'ssh_ciphers', 'size': args.size}
+    if args.device:
+        output.update(mode='live', **run(json.loads(args.device), args.size, args.repeats, args.macs))
+    else:
+        from benchmarks.harness import LocalDevice
+
+        device = LocalDevice()
+        try:
+            output.update(mode='local', **run(device.as_json(), args.size, args.repeats, args.macs))
+        finally:
+            device.close()
+    print(json.dumps(output, indent=2))
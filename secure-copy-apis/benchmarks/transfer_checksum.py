@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark: overhead of inline checksum verification on relayed transfers
+
+The relay path writes each received chunk to a temp file. This measures
+that baseline and the same loop through _HashingWriter for every checksum
+algorithm available locally. Because the hash runs inline in the receive
+loop, overhead is reported as hash time relative to link plus write time
+at several link speeds.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from repos.securecopy.SecureCopy import CHECKSUM_COMMANDS, TRANSFER_CHUNK_SIZE, _HashingWriter, new_checksum
+
+MB = 1024 * 1024
+
+
+def receive(data: bytes, algorithm=None) -> float:
+    """Replay the relay receive loop over data, returning seconds spent"""
+    chunks = [data[i:i + TRANSFER_CHUNK_SIZE] for i in range(0, len(data), TRANSFER_CHUNK_SIZE)]
+    with tempfile.TemporaryFile() as f:
+        writer = _HashingWriter(f, new_checksum(algorithm)) if algorithm else f
+        started = time.perf_counter()
+        for chunk in chunks:
+            writer.write(chunk)
+        f.flush()
+        elapsed = time.perf_counter() - started
+    return elapsed
+
+
+def best_of(repeat: int, data: bytes, algorithm=None) -> float:
+    return min(receive(data, algorithm) for _ in range(repeat))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=int, default=256)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--bandwidth', type=float, nargs='+', default=[10, 100, 1000],
+                        help='Link speeds in MB/s to express the overhead against')
+    args = parser.parse_args()
+
+    size = args.size_mb * MB
+    data = os.urandom(size)
+    baseline = best_of(args.repeat, data)
+    results = [{'algorithm': 'none', 'write_mb_s': size / baseline / MB}]
+    for algorithm in CHECKSUM_COMMANDS:
+        try:
+            seconds = best_of(args.repeat, data, algorithm)
+        except RuntimeError as e:
+            results.append({'algorithm': algorithm, 'skipped': str(e)})
+            continue
+        hash_seconds = max(seconds - baseline, 0.0)
+        results.append({
+            'algorithm': algorithm,
+            'write_mb_s': size / seconds / MB,
+            'hash_mb_s': size / hash_seconds / MB if hash_seconds else None,
+            'overhead_pct': {
+                str(bandwidth): hash_seconds / (size / (bandwidth * MB) + baseline) * 100
+                for bandwidth in args.bandwidth
+            }
+        })
+    print(json.dumps({'benchmark': 'transfer_checksum', 'size_bytes': size, 'results': results}, indent=2))
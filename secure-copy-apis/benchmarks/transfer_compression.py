@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Benchmark: effective transfer throughput with and without compression
+
+By default the link is simulated: each codec's measured compress/decompress
+speed is combined with the wire time of its output at several throttled
+bandwidths, assuming the three stages are pipelined as in streamed transfers.
+With --source/--dest the same files are moved between real devices through
+SCPManager.transfer_file for every compression mode.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MB = 1024 * 1024
+
+
+def compressible_data(size: int) -> bytes:
+    """Log-like text, similar to what `find` listings and config files look like"""
+    rng = random.Random(7)
+    words = ['INFO', 'WARN', 'request', 'completed', 'user', 'session', '/var/log/app', 'latency_ms', 'status=200']
+    lines, total = [], 0
+    while total < size:
+        line = f"2024-07-24T12:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d} " + ' '.join(rng.choices(words, k=8)) + '\n'
+        lines.append(line)
+        total += len(line)
+    return ''.join(lines).encode()[:size]
+
+
+def incompressible_data(size: int) -> bytes:
+    return os.urandom(size)
+
+
+def codecs():
+    """Local equivalents of the remote codec commands"""
+    available = {'gzip': (lambda d: gzip.compress(d, 1), gzip.decompress)}
+    try:
+        import zstandard
+        compressor, decompressor = zstandard.ZstdCompressor(level=1), zstandard.ZstdDecompressor()
+        available['zstd'] = (compressor.compress, decompressor.decompress)
+    except ImportError:
+        pass
+    return available
+
+
+def simulate(size: int, bandwidths):
+    results = []
+    for kind, make in (('compressible', compressible_data), ('incompressible', incompressible_data)):
+        data = make(size)
+        for bandwidth in bandwidths:
+            link = bandwidth * MB
+            results.append({
+                'data': kind, 'codec': 'none', 'link_mb_s': bandwidth, 'ratio': 1.0,
+                'effective_mb_s': size / (size / link) / MB
+            })
+        for name, (compress, decompress) in codecs().items():
+            started = time.perf_counter()
+            compressed = compress(data)
+            compress_seconds = time.perf_counter() - started
+            started = time.perf_counter()
+            decompress(compressed)
+            decompress_seconds = time.perf_counter() - started
+            for bandwidth in bandwidths:
+                wire_seconds = len(compressed) / (bandwidth * MB)
+                # Pipelined stages run at the pace of the slowest one
+                seconds = max(compress_seconds, wire_seconds, decompress_seconds)
+                results.append({
+                    'data': kind, 'codec': name, 'link_mb_s': bandwidth,
+                    'ratio': len(compressed) / size,
+                    'compress_mb_s': size / compress_seconds / MB,
+                    'decompress_mb_s': size / decompress_seconds / MB,
+                    'effective_mb_s': size / seconds / MB
+                })
+    return results
+
+
+def live(size: int, source: dict, dest: dict, remote_dir: str, modes):
+    from repos.securecopy.SecureCopy import DeviceConfig, SCPManager, SSHManager
+
+    source_device, dest_device = DeviceConfig(**source), DeviceConfig(**dest)
+    client = SSHManager.create_ssh_client(source_device)
+    sftp = client.open_sftp()
+    results = []
+    try:
+        for kind, make in (('compressible', compressible_data), ('incompressible', incompressible_data)):
+            path = f"{remote_dir}/transfer-bench-{kind}.bin"
+            with sftp.open(path, 'wb') as f:
+                f.write(make(size))
+            for mode in modes:
+                outcome = SCPManager.transfer_file(source_device, dest_device, path, path + '.copy', compression=mode)
+                results.append({
+                    'data': kind, 'mode': mode, 'success': outcome['success'],
+                    'codec': outcome.get('compression'),
+                    'bytes_on_wire': outcome.get('bytes_on_wire'),
+                    'effective_mb_s': (outcome.get('throughput') or 0) / MB,
+                    'error': outcome.get('error')
+                })
+            sftp.remove(path)
+    finally:
+        sftp.close()
+        client.close()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=int, default=32)
+    parser.add_argument('--bandwidth', type=float, nargs='+', default=[1, 10, 100, 1000],
+                        help='Simulated link speeds in MB/s')
+    parser.add_argument('--source', type=json.loads, help='Source device JSON for a live run')
+    parser.add_argument('--dest', type=json.loads, help='Destination device JSON for a live run')
+    parser.add_argument('--remote-dir', default='/tmp')
+    parser.add_argument('--modes', nargs='+', default=['none', 'ssh', 'gzip', 'zstd', 'auto'])
+    args = parser.parse_args()
+
+    size = args.size_mb * MB
+    if args.source and args.dest:
+        output = {'benchmark': 'transfer_compression', 'mode': 'live', 'size_bytes': size,
+                  'results': live(size, args.source, args.dest, args.remote_dir, args.modes)}
+    else:
+        output = {'benchmark': 'transfer_compression', 'mode': 'simulated', 'size_bytes': size,
+                  'results': simulate(size, args.bandwidth)}
+    print(json.dumps(output, indent=2))
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark: aggregate transfer throughput with worker threads versus worker processes
+
+Runs --transfers concurrent relayed transfers of --size-mb each through a
+TransferJobQueue, once with worker threads (every transfer in this process,
+sharing one GIL) and once with worker processes (see TransferWorkers). It
+reports aggregate MB/s and the speedup for each mode.
+
+Every source and destination is a paramiko server in its own process (see
+harness.DeviceProcess), so server-side crypto does not compete with the
+client side for this process's GIL. The machine then needs roughly three
+cores per transfer for the servers and the client to all run at once.
+Figures from a host with fewer cores understate the scaling. A warm-up round
+starts the worker processes before timing, so their startup is not counted.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harness import DeviceProcess
+from repos.securecopy.TransferJobs import TransferJob, TransferJobQueue
+
+MB = 1024 * 1024
+
+
+def run_round(queue: TransferJobQueue, pairs, source_path: str, work: str, tag: str):
+    jobs = [queue.submit(TransferJob(source.config, dest.config, source_path,
+                                     os.path.join(work, f"{tag}-{i}.bin")))
+            for i, (source, dest) in enumerate(pairs)]
+    while any(job.state in ('queued', 'running') for job in jobs):
+        time.sleep(0.01)
+    failed = [job.error for job in jobs if job.state != 'succeeded']
+    if failed:
+        raise RuntimeError(f"{len(failed)} transfers failed: {failed[0]}")
+    return max(job.finished_at for job in jobs) - min(job.started_at for job in jobs)
+
+
+def measure(pairs, size: int, work: str, worker_processes: bool):
+    source_path = os.path.join(work, 'source.bin')
+    warm_up_path = os.path.join(work, 'warm-up.bin')
+    queue = TransferJobQueue(max_workers=len(pairs), per_host_limit=len(pairs), worker_processes=worker_processes)
+    try:
+        run_round(queue, pairs, warm_up_path, work, 'warm-up')
+        seconds = run_round(queue, pairs, source_path, work, 'copy')
+    finally:
+        queue.shutdown()
+    return {
+        'mode': 'process' if worker_processes else 'thread',
+        'seconds': seconds,
+        'aggregate_mb_s': len(pairs) * size / MB / seconds,
+        'worker_processes': len(queue.stats()['worker_processes'])
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--transfers', type=int, default=8)
+    parser.add_argument('--size-mb', type=float, default=64)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    size = int(args.size_mb * MB)
+    with tempfile.TemporaryDirectory() as work:
+        with open(os.path.join(work, 'source.bin'), 'wb') as f:
+            f.write(os.urandom(size))
+        with open(os.path.join(work, 'warm-up.bin'), 'wb') as f:
+            f.write(os.urandom(64 * 1024))
+        devices = [DeviceProcess() for _ in range(2 * args.transfers)]
+        try:
+            pairs = list(zip(devices[::2], devices[1::2]))
+            results = [measure(pairs, size, work, worker_processes) for worker_processes in (False, True)]
+        finally:
+            for device in devices:
+                device.close()
+
+    output = {
+        'benchmark': 'transfer_workers',
+        'cpu_count': os.cpu_count(),
+        'transfers': args.transfers,
+        'size_mb': args.size_mb,
+        'results': results,
+        'speedup': results[1]['aggregate_mb_s'] / results[0]['aggregate_mb_s']
+    }
+    print(json.dumps(output, indent=2))
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark: files per second for many small files, tar stream versus per-file SFTP
+
+A local tree of --files small files is created, and the actual cost of
+`tar -c | tar -x` over it is measured. Per-file SFTP is modelled as
+--round-trips request round trips per file (open, write, close, setstat)
+plus wire time. The tar stream is one round trip plus the slower of tar's
+own pace and the wire time of the archive. Both are reported at several
+RTTs. With --source/--dest, SCPManager.transfer_tree copies a real tree
+and SCPManager.transfer_file copies --sample of its files one by one.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MB = 1024 * 1024
+TAR_BLOCK = 512
+
+
+def make_tree(root: str, files: int, size: int, per_dir: int = 1000):
+    payload = b'x' * size
+    for i in range(files):
+        directory = os.path.join(root, f"d{i // per_dir:04d}")
+        if i % per_dir == 0:
+            os.makedirs(directory)
+        with open(os.path.join(directory, f"f{i:06d}.txt"), 'wb') as f:
+            f.write(payload)
+
+
+def local_tar_seconds(source: str, dest: str) -> float:
+    os.makedirs(dest)
+    started = time.perf_counter()
+    subprocess.run(f"tar -C {source} -cf - . | tar -C {dest} -xf -", shell=True, check=True)
+    return time.perf_counter() - started
+
+
+def simulate(files: int, size: int, rtts, bandwidth: float, round_trips: int):
+    with tempfile.TemporaryDirectory() as work:
+        source = os.path.join(work, 'src')
+        os.makedirs(source)
+        make_tree(source, files, size)
+        tar_seconds = local_tar_seconds(source, os.path.join(work, 'dst'))
+
+    # Each member is a 512-byte header plus its data padded to a whole block
+    archive_bytes = files * (TAR_BLOCK + -(-size // TAR_BLOCK) * TAR_BLOCK)
+    results = []
+    for rtt_ms in rtts:
+        rtt = rtt_ms / 1000
+        sftp_seconds = files * (round_trips * rtt + size / bandwidth)
+        stream_seconds = rtt + max(tar_seconds, archive_bytes / bandwidth)
+        results.append({
+            'rtt_ms': rtt_ms,
+            'sftp_files_per_s': files / sftp_seconds,
+            'tar_files_per_s': files / stream_seconds,
+            'speedup': sftp_seconds / stream_seconds
+        })
+    return {'local_tar_seconds': tar_seconds, 'archive_bytes': archive_bytes, 'results': results}
+
+
+def live(source: dict, dest: dict, files: int, size: int, sample: int, remote_dir: str, compression: str):
+    from repos.securecopy.SecureCopy import DeviceConfig, SCPManager, SSHManager
+
+    source_device, dest_device = DeviceConfig(**source), DeviceConfig(**dest)
+    source_dir, dest_dir = f"{remote_dir}/tree-bench-src", f"{remote_dir}/tree-bench-dst"
+    client = SSHManager.create_ssh_client(source_device)
+    try:
+        # Build the tree remotely in one command rather than one SFTP upload per file
+        SSHManager.execute_command(client, (
+            f"rm -rf {source_dir} && mkdir -p {source_dir} && cd {source_dir} && "
+            f"head -c {size} /dev/zero > .seed && "
+            f"i=0; while [ $i -lt {files} ]; do d=d$((i / 1000)); mkdir -p $d; cp .seed $d/f$i.txt; i=$((i + 1)); done; "
+            f"rm .seed"
+        ))
+    finally:
+        client.close()
+
+    tree = SCPManager.transfer_tree(source_device, dest_device, source_dir, dest_dir, compression=compression)
+    started = time.monotonic()
+    copied = 0
+    for i in range(min(sample, files)):
+        outcome = SCPManager.transfer_file(source_device, dest_device, f"{source_dir}/d{i // 1000}/f{i}.txt",
+                                           f"{remote_dir}/tree-bench-file-{i}.txt")
+        copied += bool(outcome.get('success'))
+    per_file_seconds = time.monotonic() - started
+    return {
+        'tree': {k: tree.get(k) for k in ('success', 'error', 'route', 'compression', 'bytes_on_wire', 'duration')},
+        'tar_files_per_s': files / tree['duration'] if tree.get('success') else None,
+        'per_file_files_per_s': copied / per_file_seconds if per_file_seconds else None,
+        'per_file_sample': copied
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=100000)
+    parser.add_argument('--file-size', type=int, default=1024)
+    parser.add_argument('--rtt-ms', type=float, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--bandwidth-mb-s', type=float, default=100)
+    parser.add_argument('--round-trips', type=int, default=4, help='SFTP round trips per file')
+    parser.add_argument('--source', type=json.loads, help='Source device JSON for a live run')
+    parser.add_argument('--dest', type=json.loads, help='Destination device JSON for a live run')
+    parser.add_argument('--remote-dir', default='/tmp')
+    parser.add_argument('--sample', type=int, default=200, help='Files copied one by one in a live run')
+    parser.add_argument('--compression', default='none')
+    args = parser.parse_args()
+
+    if args.source and args.dest:
+        output = {'benchmark': 'tree_transfer', 'mode': 'live', 'files': args.files, 'file_size': args.file_size,
+                  **live(args.source, args.dest, args.files, args.file_size, args.sample, args.remote_dir,
+                         args.compression)}
+    else:
+        output = {'benchmark': 'tree_transfer', 'mode': 'simulated', 'files': args.files,
+                  'file_size': args.file_size,
+                  **simulate(args.files, args.file_size, args.rtt_ms, args.bandwidth_mb_s * MB, args.round_trips)}
+    print(json.dumps(output, indent=2))
@@ -0,0 +1,41 @@
+"""
+Deferred imports for heavy dependencies
+A module is imported on first attribute access instead of when the importing module loads
+"""
+
+import importlib
+import threading
+from types import ModuleType
+
+
+class LazyModule:
+    """
+    Stand-in for a module that imports it on first attribute access
+
+    Code keeps writing paramiko.SSHClient or oracledb.connect; only the first
+    access pays for the import. Attributes are read from the real module on
+    every access, so patching the real module (as the benchmarks do) is seen.
+    Annotations naming the module must be postponed with
+    `from __future__ import annotations`, or they trigger the import at
+    definition time.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load_module(self) -> ModuleType:
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attribute: str):
+        return getattr(self._load_module(), attribute)
+
+    def __repr__(self) -> str:
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<lazy module '{self._name}' ({state})>"
+
@@ -5,30 +5,53 @@ Monitors system processes, resource usage, and potential security anomalies
 """
 
 import os
-import pandas as pd
-import psutil
 import subprocess
 import logging
 import hashlib
 import time
 from datetime import datetime
 from typing import Dict, List, Tuple, Optional
-import json
 import threading
 from pathlib import Path
-import oracledb
+from repos.LazyModule import LazyModule
 from repos.databases.OracleDbHandler import OracleDBHandler
+from repos.monitoring.AnomalyStateStore import AnomalyStateStore
+from repos.monitoring.ResourceTimeSeries import ResourceTimeSeries
+from repos.monitoring.ReportArchive import ReportArchive
+from repos.monitoring.ReportDelta import ReportDeltaEncoder, diff_mapping
+from repos.monitoring.MonitorEventHub import MonitorEventHub
+from repos.monitoring.Metrics import metrics
+
+psutil = LazyModule('psutil')
+
+MONITOR_PHASE_SECONDS = metrics.histogram(
+    'monitor_phase_seconds', 'Security scan phase duration, including its database inserts', ('phase',))
 
 
 class SystemSecurityMonitor:
-    def __init__(self, log_file: str = "/tmp/security_monitor.log", insert_state: str = "false"):
+    def __init__(self, log_file: str = "/tmp/security_monitor.log", insert_state: str = "false",
+                 resource_series: Optional[ResourceTimeSeries] = None,
+                 report_archive: Optional[ReportArchive] = None,
+                 delta_mode: bool = False, keyframe_interval: int = 10,
+                 event_hub: Optional[MonitorEventHub] = None):
         """
         Initialize the security monitor
         
         Args:
             log_file: Path to the log file for security events
+            resource_series: Shared in-memory time series fed by resource samples
+            report_archive: Archive for reports produced by continuous monitoring
+            delta_mode: Persist only changes since the previous scan, with a full
+                keyframe every keyframe_interval scans
+            keyframe_interval: Number of scans between full database writes in delta mode
+            event_hub: Hub receiving live resource, anomaly and integrity events
         """
         self.insert_state = insert_state
+        self.resource_series = resource_series if resource_series is not None else ResourceTimeSeries()
+        self.report_archive = report_archive
+        self.db_delta_encoder = ReportDeltaEncoder(keyframe_interval=keyframe_interval) if delta_mode else None
+        self.event_hub = event_hub
+        self._last_integrity = None
         self.log_file = log_file
         self.baseline_processes = set()
         self.baseline_cpu_usage = 0.0
@@ -36,6 +59,7 @@ class SystemSecurityMonitor:
         self.suspicious_processes = []
         self.known_malicious_hashes = set()
         self.monitoring = False
+        self.anomaly_store = AnomalyStateStore()
         self.db_handler = OracleDBHandler(user="sys", password="oracle", dsn="10.42.0.243:1521/FREE")
         
         # Setup logging
@@ -49,8 +73,11 @@ class SystemSecurityMonitor:
         )
         self.logger = logging.getLogger(__name__)
         
-        # Initialize baseline
-        self._establish_baseline()
+        # The baseline includes a one-second CPU sample, so it is taken in the background;
+        # scans wait only for the part of it they compare against
+        self._baseline_processes_ready = threading.Event()
+        self._baseline_ready = threading.Event()
+        threading.Thread(target=self._establish_baseline, name='monitor-baseline', daemon=True).start()
         
 
         
@@ -63,6 +90,7 @@ class SystemSecurityMonitor:
                     self.baseline_processes.add(proc.info['name'])
                 except (psutil.NoSuchProcess, psutil.AccessDenied):
                     continue
+            self._baseline_processes_ready.set()
                     
             # Get baseline resource usage
             self.baseline_cpu_usage = psutil.cpu_percent(interval=1)
@@ -72,68 +100,181 @@ class SystemSecurityMonitor:
                            f"CPU: {self.baseline_cpu_usage}%, Memory: {self.baseline_memory_usage}%")
         except Exception as e:
             self.logger.error(f"Error establishing baseline: {e}")
+        finally:
+            self._baseline_processes_ready.set()
+            self._baseline_ready.set()
+
+    def wait_for_baseline(self, timeout: Optional[float] = None) -> bool:
+        """Block until the baseline has been established, True unless timeout expired first"""
+        return self._baseline_ready.wait(timeout)
     
     def detect_process_anomalies(self) -> List[Dict]:
         """
         Detect anomalous processes based on resource usage and behavior
         
         Returns:
-            List of suspicious process information
+            List of anomaly transitions (open/update/close) since the previous scan
         """
         anomalies = []
+        self._baseline_processes_ready.wait()
         
         try:
-            for proc in psutil.process_iter(['pid', 'name', 'cmdline', 'cpu_percent', 'memory_percent']):
+            for proc in psutil.process_iter(['pid', 'name', 'cmdline', 'cpu_percent', 'memory_percent', 'create_time']):
                 try:
-                    proc_info = proc.info
-                    
-                    # Skip system processes
-                    if proc_info['pid'] < 100:
-                        continue
-                    
-                    # Check for high resource usage
-                    if proc_info['cpu_percent'] > 50 or proc_info['memory_percent'] > 25:
-                        anomalies.append({
-                            'type': 'high_resource_usage',
-                            'pid': proc_info['pid'],
-                            'name': proc_info['name'],
-                            'cmdline': proc_info['cmdline'],
-                            'cpu_percent': proc_info['cpu_percent'],
-                            'memory_percent': proc_info['memory_percent'],
-                            'timestamp': datetime.now().isoformat()
-                        })
-                    
-                    # Check for new processes not in baseline
-                    if proc_info['name'] not in self.baseline_processes:
-                        anomalies.append({
-                            'type': 'new_process',
-                            'pid': proc_info['pid'],
-                            'name': proc_info['name'],
-                            'cmdline': proc_info['cmdline'],
-                            'timestamp': datetime.now().isoformat()
-                        })
-                    
-                    # Check for suspicious process names/paths
-                    if self._is_suspicious_process(proc_info):
-                        anomalies.append({
-                            'type': 'suspicious_process',
-                            'pid': proc_info['pid'],
-                            'name': proc_info['name'],
-                            'cmdline': proc_info['cmdline'],
-                            'timestamp': datetime.now().isoformat()
-                        })
-                        
+                    anomalies.extend(self.classify_process_anomalies(proc.info, self.baseline_processes))
                 except (psutil.NoSuchProcess, psutil.AccessDenied):
                     continue
-            if self.insert_state == "true":
-                self.db_handler.insert_anomalies_into_db(anomalies)
         except Exception as e:
             self.logger.error(f"Error detecting process anomalies: {e}")
-        if self.insert_state == "true":
-            self.db_handler.insert_anomalies_into_db(anomalies=anomalies)
-        return anomalies
+            return []
+
+        # Only state changes are reported and persisted
+        transitions = self.anomaly_store.observe(anomalies)
+        if transitions:
+            self._publish('anomaly', transitions)
+        if self.insert_state == "true" and transitions:
+            try:
+                self.db_handler.insert_anomalies_into_db(anomalies=transitions)
+            except Exception as e:
+                self.logger.error(f"Error inserting process anomalies: {e}")
+        return transitions
     
-    def _is_suspicious_process(self, proc_info: Dict) -> bool:
+    @staticmethod
+    def classify_process_anomalies(proc_info: Dict, baseline_processes: set) -> List[Dict]:
+        """
+        Check one process against the anomaly rules
+        
+        Args:
+            proc_info: Process attributes (pid, name, cmdline, cpu_percent, memory_percent, create_time)
+            baseline_processes: Process names seen when the baseline was established
+        
+        Returns:
+            List of anomalies raised by the process
+        """
+        anomalies = []
+
+        # Skip system processes
+        if proc_info['pid'] < 100:
+            return anomalies
+
+        # Check for high resource usage
+        if proc_info['cpu_percent'] > 50 or proc_info['memory_percent'] > 25:
+            anomalies.append({
+                'type': 'high_resource_usage',
+                'pid': proc_info['pid'],
+                'name': proc_info['name'],
+                'cmdline': proc_info['cmdline'],
+                'create_time': proc_info['create_time'],
+                'cpu_percent': proc_info['cpu_percent'],
+                'memory_percent': proc_info['memory_percent'],
+                'timestamp': datetime.now().isoformat()
+            })
+
+        # Check for new processes not in baseline
+        if proc_info['name'] not in baseline_processes:
+            anomalies.append({
+                'type': 'new_process',
+                'pid': proc_info['pid'],
+                'name': proc_info['name'],
+                'cmdline': proc_info['cmdline'],
+                'create_time': proc_info['create_time'],
+                'timestamp': datetime.now().isoformat()
+            })
+
+        # Check for suspicious process names/paths
+        if SystemSecurityMonitor._is_suspicious_process(proc_info):
+            anomalies.append({
+                'type': 'suspicious_process',
+                'pid': proc_info['pid'],
+                'name': proc_info['name'],
+                'cmdline': proc_info['cmdline'],
+                'create_time': proc_info['create_time'],
+                'timestamp': datetime.now().isoformat()
+            })
+
+        return anomalies
+
+    @staticmethod
+    def add_to_process_scan(results: Dict, proc_info: Dict, connections: Optional[int]):
+        """
+        Add one process to scan_running_processes() style results
+        
+        Args:
+            results: Scan results being built
+            proc_info: Process attributes (pid, name, cmdline, cpu_percent, memory_percent)
+            connections: Number of network connections, None if they could not be read
+        """
+        results['total_processes'] += 1
+
+        # Check for high resource usage
+        if proc_info['cpu_percent'] > 30 or proc_info['memory_percent'] > 20:
+            results['high_resource_processes'].append({
+                'pid': proc_info['pid'],
+                'name': proc_info['name'],
+                'cpu_percent': proc_info['cpu_percent'],
+                'memory_percent': proc_info['memory_percent']
+            })
+
+        # Check for network connections
+        if connections:
+            results['network_processes'].append({
+                'pid': proc_info['pid'],
+                'name': proc_info['name'],
+                'connections': connections
+            })
+
+        # Check for suspicious processes
+        if SystemSecurityMonitor._is_suspicious_process(proc_info):
+            results['suspicious_processes'].append({
+                'pid': proc_info['pid'],
+                'name': proc_info['name'],
+                'cmdline': proc_info['cmdline']
+            })
+
+    @staticmethod
+    def resource_anomalies(results: Dict, baseline_cpu_usage: float, baseline_memory_usage: float) -> List[str]:
+        """Check resource monitoring results against the baseline"""
+        anomalies = []
+        
+        if results['cpu_usage'] > baseline_cpu_usage * 2:
+            anomalies.append('high_cpu_usage')
+        
+        if results['memory_usage'] > baseline_memory_usage * 1.5:
+            anomalies.append('high_memory_usage')
+        
+        if results['load_average'][0] > 5.0:
+            anomalies.append('high_load_average')
+
+        return anomalies
+
+    def _publish(self, event_type: str, data):
+        """Send an event to live stream subscribers, if any"""
+        if self.event_hub is not None:
+            self.event_hub.publish(event_type, data)
+
+    def _publish_integrity_changes(self, results: Dict):
+        """Publish system file and world-writable changes since the previous check"""
+        previous, self._last_integrity = self._last_integrity, results
+        if previous is None or self.event_hub is None:
+            return
+        old_paths = set(previous['permissions'].get('world_writable', []))
+        new_paths = set(results['permissions'].get('world_writable', []))
+        changes = {
+            'system_files': diff_mapping(previous['system_files'], results['system_files'], rel_tol=0, abs_tol=0),
+            'world_writable_added': sorted(new_paths - old_paths),
+            'world_writable_removed': sorted(old_paths - new_paths)
+        }
+        if any(changes.values()):
+            self._publish('integrity', dict(changes, timestamp=results['timestamp']))
+
+    def _db_payload(self, section: str, results: Dict) -> Dict:
+        """Return the results to persist, delta-encoded when delta mode is enabled"""
+        if self.db_delta_encoder is None:
+            return results
+        return self.db_delta_encoder.encode_section(section, results)
+
+    @staticmethod
+    def _is_suspicious_process(proc_info: Dict) -> bool:
         """Check if a process exhibits suspicious characteristics"""
         suspicious_indicators = [
             # Hidden or obfuscated names
@@ -166,42 +307,16 @@ class SystemSecurityMonitor:
         try:
             for proc in psutil.process_iter(['pid', 'name', 'cmdline', 'cpu_percent', 'memory_percent']):
                 try:
-                    proc_info = proc.info
-                    results['total_processes'] += 1
-
-                    # Check for high resource usage
-                    if proc_info['cpu_percent'] > 30 or proc_info['memory_percent'] > 20:
-                        results['high_resource_processes'].append({
-                            'pid': proc_info['pid'],
-                            'name': proc_info['name'],
-                            'cpu_percent': proc_info['cpu_percent'],
-                            'memory_percent': proc_info['memory_percent']
-                        })
-
-                    # Check for network connections
                     try:
-                        connections = proc.net_connections()
-                        if connections:
-                            results['network_processes'].append({
-                                'pid': proc_info['pid'],
-                                'name': proc_info['name'],
-                                'connections': len(connections)
-                            })
+                        connections = len(proc.net_connections())
                     except (psutil.AccessDenied, psutil.NoSuchProcess):
-                        continue
-
-                    # Check for suspicious processes
-                    if self._is_suspicious_process(proc_info):
-                        results['suspicious_processes'].append({
-                            'pid': proc_info['pid'],
-                            'name': proc_info['name'],
-                            'cmdline': proc_info['cmdline']
-                        })
+                        connections = None
+                    self.add_to_process_scan(results, proc.info, connections)
 
                 except (psutil.NoSuchProcess, psutil.AccessDenied):
                     continue
             if self.insert_state == "true":
-                self.db_handler._insert_results_to_db(results)
+                self.db_handler._insert_results_to_db(self._db_payload('process_scan', results))
                     
         except Exception as e:
             self.logger.error(f"Error scanning processes: {e}")
@@ -257,8 +372,9 @@ class SystemSecurityMonitor:
                                 continue
             
             results['permissions']['world_writable'] = world_writable
+            self._publish_integrity_changes(results)
             if self.insert_state == "true":
-                self.db_handler._insert_integrity_results_to_db(results)
+                self.db_handler._insert_integrity_results_to_db(self._db_payload('system_integrity', results))
         except Exception as e:
             self.logger.error(f"Error checking system integrity: {e}")
             
@@ -295,20 +411,14 @@ class SystemSecurityMonitor:
                     continue
             
             # Check for anomalies
-            anomalies = []
-            
-            if results['cpu_usage'] > self.baseline_cpu_usage * 2:
-                anomalies.append('high_cpu_usage')
-            
-            if results['memory_usage'] > self.baseline_memory_usage * 1.5:
-                anomalies.append('high_memory_usage')
-            
-            if results['load_average'][0] > 5.0:
-                anomalies.append('high_load_average')
-            
+            self._baseline_ready.wait()
+            anomalies = self.resource_anomalies(results, self.baseline_cpu_usage, self.baseline_memory_usage)
             results['anomalies'] = anomalies
+            self.resource_series.add_results(results)
+            self._publish('resource', dict(ResourceTimeSeries.values_from_results(results),
+                                           timestamp=results['timestamp'], anomalies=anomalies))
             if self.insert_state == "true":
-                self.db_handler._insert_resource_results_to_db(results)
+                self.db_handler._insert_resource_results_to_db(self._db_payload('resource_monitoring', results))
         except Exception as e:
             self.logger.error(f"Error monitoring system resources: {e}")
             
@@ -327,18 +437,21 @@ class SystemSecurityMonitor:
                 'hostname': os.uname().nodename,
                 'system': os.uname().sysname,
                 'release': os.uname().release
-            },
-            'process_anomalies': self.detect_process_anomalies(),
-            'process_scan': self.scan_running_processes(),
-            'system_integrity': self.check_system_integrity(),
-            'resource_monitoring': self.monitor_system_resources()
+            }
         }
+        for section, scan in (('process_anomalies', self.detect_process_anomalies),
+                              ('process_scan', self.scan_running_processes),
+                              ('system_integrity', self.check_system_integrity),
+                              ('resource_monitoring', self.monitor_system_resources)):
+            with MONITOR_PHASE_SECONDS.time(phase=section):
+                report[section] = scan()
         
         # Log critical findings
         critical_issues = []
         
-        if len(report['process_anomalies']) > 0:
-            critical_issues.append(f"Found {len(report['process_anomalies'])} process anomalies")
+        opened_anomalies = [a for a in report['process_anomalies'] if a.get('transition') == 'open']
+        if len(opened_anomalies) > 0:
+            critical_issues.append(f"Found {len(opened_anomalies)} new process anomalies")
         
         if len(report['process_scan']['suspicious_processes']) > 0:
             critical_issues.append(f"Found {len(report['process_scan']['suspicious_processes'])} suspicious processes")
@@ -353,14 +466,39 @@ class SystemSecurityMonitor:
         
         return report
     
-    def start_monitoring(self, interval: int = 60):
+    def sample_resources(self):
+        """Record a lightweight resource sample into the in-memory time series"""
+        disk_percents = []
+        for partition in psutil.disk_partitions():
+            try:
+                disk_percents.append(psutil.disk_usage(partition.mountpoint).percent)
+            except (PermissionError, OSError):
+                continue
+        load1, load5, load15 = os.getloadavg()
+        values = {
+            'cpu_usage': psutil.cpu_percent(interval=None),
+            'memory_usage': psutil.virtual_memory().percent,
+            'load_1': load1,
+            'load_5': load5,
+            'load_15': load15,
+            'disk_usage': max(disk_percents) if disk_percents else 0.0,
+            'network_connections': len(psutil.net_connections())
+        }
+        self.resource_series.record(values)
+        self._publish('resource', dict(values, timestamp=datetime.now().isoformat()))
+
+    def start_monitoring(self, interval: int = 60, sample_interval: Optional[float] = 1.0):
         """
         Start continuous monitoring
         
         Args:
             interval: Monitoring interval in seconds
+            sample_interval: Resource sampling interval in seconds for the
+                in-memory time series, None to sample only with each report
         """
         self.monitoring = True
+        if self.report_archive is None:
+            self.report_archive = ReportArchive()
         self.logger.info(f"Starting continuous monitoring with {interval}s interval")
         
         def monitor_loop():
@@ -368,10 +506,8 @@ class SystemSecurityMonitor:
                 try:
                     report = self.generate_security_report()
                     
-                    # Save report to file
-                    report_file = f"/tmp/security_report_{int(time.time())}.json"
-                    with open(report_file, 'w') as f:
-                        json.dump(report, f, indent=2)
+                    # Append report to the compressed archive
+                    self.report_archive.append(report)
                     
                     time.sleep(interval)
                     
@@ -379,8 +515,19 @@ class SystemSecurityMonitor:
                     self.logger.error(f"Error in monitoring loop: {e}")
                     time.sleep(interval)
         
+        def sample_loop():
+            while self.monitoring:
+                try:
+                    self.sample_resources()
+                except Exception as e:
+                    self.logger.error(f"Error sampling resources: {e}")
+                time.sleep(sample_interval)
+
         monitor_thread = threading.Thread(target=monitor_loop, daemon=True)
         monitor_thread.start()
+
+        if sample_interval:
+            threading.Thread(target=sample_loop, daemon=True).start()
         
         return monitor_thread
     
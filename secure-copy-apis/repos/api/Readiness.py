@@ -0,0 +1,128 @@
+"""
+Background warm-up and readiness reporting
+Start-up work runs off the request path; readiness and start-up timings are reported as it finishes
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from repos.LazyModule import LazyModule
+from repos.monitoring.Metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+psutil = LazyModule('psutil')
+
+STARTUP_SECONDS = metrics.gauge(
+    'startup_seconds', 'Seconds from process start until the app was created, warm-up finished and the '
+    'first request was answered', ('stage',))
+WARM_UP_TASK_SECONDS = metrics.gauge(
+    'warm_up_task_seconds', 'Duration of each warm-up task', ('task', 'result'))
+
+
+class WarmUp:
+    """
+    Runs start-up tasks in the background and tracks readiness
+
+    Tasks run concurrently on a small pool so the app can answer requests
+    while they run. A failed task is logged and reported but does not block
+    readiness; its resource is created on first use instead, as it would be
+    without warm-up.
+    """
+
+    def __init__(self):
+        self.created_at = time.time()
+        self.process_started = self.created_at
+        self.finished_at: Optional[float] = None
+        self.first_request_at: Optional[float] = None
+        self._process_started_known = False
+        self._tasks: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._started = False
+
+    def start(self, tasks: Dict[str, Callable[[], object]], max_workers: int = 4):
+        """Run tasks, a name -> callable mapping, once in the background"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            self._tasks = {name: {'state': 'pending'} for name in tasks}
+        threading.Thread(target=self._run, args=(tasks, max_workers), name='warm-up', daemon=True).start()
+
+    def _run(self, tasks: Dict[str, Callable[[], object]], max_workers: int):
+        try:
+            # Creation time comes from the kernel, so interpreter start-up and imports are counted
+            self.process_started = psutil.Process().create_time()
+        except Exception as e:
+            logger.warning(f"Process start time unavailable, timing from app creation: {e}")
+        self._process_started_known = True
+        STARTUP_SECONDS.set(self.created_at - self.process_started, stage='app_created')
+        if self.first_request_at is not None:
+            STARTUP_SECONDS.set(self.first_request_at - self.process_started, stage='first_request')
+        if tasks:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tasks))),
+                                    thread_name_prefix='warm-up') as executor:
+                for name, task in tasks.items():
+                    executor.submit(self._run_task, name, task)
+        self.finished_at = time.time()
+        STARTUP_SECONDS.set(self.finished_at - self.process_started, stage='warm_up')
+        failed = [name for name, task in self._tasks.items() if task['state'] == 'failed']
+        logger.info(f"Warm-up finished in {self.finished_at - self.created_at:.2f}s"
+                    + (f", failed: {', '.join(failed)}" if failed else ""))
+        self._done.set()
+
+    def _run_task(self, name: str, task: Callable[[], object]):
+        started = time.perf_counter()
+        with self._lock:
+            self._tasks[name] = {'state': 'running'}
+        try:
+            task()
+            outcome = {'state': 'ready'}
+        except Exception as e:
+            logger.warning(f"Warm-up task {name} failed: {e}")
+            outcome = {'state': 'failed', 'error': str(e)}
+        outcome['seconds'] = time.perf_counter() - started
+        WARM_UP_TASK_SECONDS.set(outcome['seconds'], task=name, result=outcome['state'])
+        with self._lock:
+            self._tasks[name] = outcome
+
+    def request_served(self):
+        """Record time to first request; cheap enough for an after_request hook"""
+        if self.first_request_at is None:
+            self.first_request_at = time.time()
+            # Otherwise set by the warm-up thread once the process start time is known
+            if self._process_started_known:
+                STARTUP_SECONDS.set(self.first_request_at - self.process_started, stage='first_request')
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def status(self) -> Dict:
+        """Readiness, per-task outcomes and start-up timings relative to process start"""
+        with self._lock:
+            tasks = {name: dict(task) for name, task in self._tasks.items()}
+        if not self.ready:
+            state = 'warming' if self._started else 'pending'
+        else:
+            state = 'degraded' if any(task['state'] == 'failed' for task in tasks.values()) else 'ready'
+        since_start = lambda moment: moment - self.process_started if moment is not None else None
+        return {
+            'state': state,
+            'ready': self.ready,
+            'process_started': datetime.fromtimestamp(self.process_started).isoformat(),
+            'startup_seconds': {
+                'app_created': since_start(self.created_at),
+                'warm_up': since_start(self.finished_at),
+                'first_request': since_start(self.first_request_at)
+            },
+            'tasks': tasks
+        }
@@ -0,0 +1,270 @@
+"""
+Time-range queries over the audit and monitor tables
+Adds TIMESTAMP columns, daily interval partitions and local indexes, and drops expired partitions for retention
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from repos.monitoring.Metrics import DB_SECONDS
+from repos.securecopy.SecureCopy import decode_audit_record, oracledb
+
+logger = logging.getLogger(__name__)
+
+# Where the history lives in each queryable table. 'time' is the TIMESTAMP column
+# queries and partitions use; tables that store VARCHAR2 timestamps in 'source_time'
+# get it as a new LOGGED_AT column. Filters map to None where a table has no such column.
+HISTORY_TABLES = {
+    'api_logs': {'table': 'API_LOGS', 'time': 'TIMESTAMP', 'hosts': ('DEVICE1', 'DEVICE2'),
+                 'operation': 'OPERATION_TYPE', 'status': 'STATUS',
+                 'columns': ('ID', 'TIMESTAMP', 'OPERATION_TYPE', 'DEVICE1', 'DEVICE2', 'STATUS', 'PAYLOAD',
+                             'PAYLOAD_BYTES')},
+    'security_logs': {'table': 'SECURITY_LOGS', 'time': 'LOG_TIME', 'hosts': (),
+                      'operation': None, 'status': 'LOG_LEVEL'},
+    'process_anomalies': {'table': 'PROCESS_ANOMALIES', 'time': 'TIMESTAMP', 'hosts': ('HOST',),
+                          'operation': 'TYPE', 'status': 'TRANSITION'},
+    'resource_summary': {'table': 'SYSTEM_RESOURCE_SUMMARY', 'source_time': 'TIMESTAMP', 'hosts': ('HOST',),
+                         'operation': None, 'status': None},
+    'disk_usage': {'table': 'DISK_USAGE_INFO', 'source_time': 'TIMESTAMP', 'hosts': ('HOST',),
+                   'operation': 'MOUNT_POINT', 'status': 'CHANGE_TYPE'},
+    'resource_anomalies': {'table': 'RESOURCE_ANOMALIES', 'source_time': 'TIMESTAMP', 'hosts': ('HOST',),
+                           'operation': 'ANOMALY_TYPE', 'status': None},
+    'integrity_summary': {'table': 'SYSTEM_INTEGRITY_SUMMARY', 'source_time': 'TIMESTAMP', 'hosts': ('HOST',),
+                          'operation': None, 'status': None},
+    'system_files': {'table': 'SYSTEM_FILES_INFO', 'source_time': 'TIMESTAMP', 'hosts': ('HOST',),
+                     'operation': 'FILE_PATH', 'status': 'CHANGE_TYPE'},
+    'world_writable_files': {'table': 'WORLD_WRITABLE_FILES', 'source_time': 'TIMESTAMP', 'hosts': ('HOST',),
+                             'operation': 'FILE_PATH', 'status': 'CHANGE_TYPE'},
+    'process_summary': {'table': 'PROCESS_SUMMARY', 'source_time': 'TIMESTAMP', 'hosts': ('HOST',),
+                        'operation': None, 'status': None},
+    'high_resource_processes': {'table': 'HIGH_RESOURCE_PROCESSES', 'source_time': 'TIMESTAMP', 'hosts': ('HOST',),
+                                'operation': 'NAME', 'status': 'CHANGE_TYPE'},
+    'network_processes': {'table': 'NETWORK_PROCESSES', 'source_time': 'TIMESTAMP', 'hosts': ('HOST',),
+                          'operation': 'NAME', 'status': 'CHANGE_TYPE'},
+    'suspicious_processes': {'table': 'SUSPICIOUS_PROCESSES', 'source_time': 'TIMESTAMP', 'hosts': ('HOST',),
+                             'operation': 'NAME', 'status': 'CHANGE_TYPE'},
+}
+
+MAX_QUERY_ROWS = 5000
+# Retention never reaches today's or yesterday's partition
+MIN_RETENTION_DAYS = 1
+# Rows older than this land in the first, fixed partition; everything newer gets one partition per day
+PARTITION_START = '2000-01-01 00:00:00'
+_HIGH_VALUE = re.compile(r"(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})")
+
+
+def _time_column(spec: Dict) -> str:
+    return spec.get('time') or 'LOGGED_AT'
+
+
+class HistoryStore:
+    """Partitioned, indexed history tables and the queries that use them"""
+
+    def __init__(self, connect: Callable[[], oracledb.Connection]):
+        """
+        Initialize the store
+
+        Args:
+            connect: Returns a new database connection, e.g. DatabaseManager.get_connection
+        """
+        self.connect = connect
+        self._ready = set()
+        self._lock = threading.Lock()
+        self._retention_thread = None
+        self._retention_stop = threading.Event()
+
+    @staticmethod
+    def _execute_ddl(cursor, sql: str, ignore=()):
+        try:
+            cursor.execute(sql)
+            return True
+        except oracledb.DatabaseError as e:
+            if any(code in str(e) for code in ignore):
+                return False
+            raise
+
+    def _prepare_table(self, cursor, spec: Dict) -> bool:
+        """Bring one table to the history layout; False when the table does not exist yet"""
+        table = spec['table']
+        cursor.execute("SELECT COUNT(*) FROM user_tables WHERE table_name = :1", [table])
+        if cursor.fetchone()[0] == 0:
+            return False
+        time_column = _time_column(spec)
+
+        if 'source_time' in spec:
+            added = self._execute_ddl(
+                cursor, f"ALTER TABLE {table} ADD (LOGGED_AT TIMESTAMP DEFAULT SYSTIMESTAMP NOT NULL)",
+                ignore=('ORA-01430',))  # column already exists
+            if added:
+                # Existing rows got the time of the ALTER; give them the time they were written instead
+                cursor.execute(f"""
+                    UPDATE {table} SET LOGGED_AT = NVL(TO_TIMESTAMP(
+                        REPLACE(SUBSTR({spec['source_time']}, 1, 19), 'T', ' ')
+                        DEFAULT NULL ON CONVERSION ERROR, 'YYYY-MM-DD HH24:MI:SS'), LOGGED_AT)
+                """)
+
+        cursor.execute("SELECT COUNT(*) FROM user_part_tables WHERE table_name = :1", [table])
+        if cursor.fetchone()[0] == 0:
+            # Interval partitions cannot hold NULL keys
+            cursor.execute(f"UPDATE {table} SET {time_column} = SYSTIMESTAMP WHERE {time_column} IS NULL")
+            cursor.execute(f"""
+                ALTER TABLE {table} MODIFY
+                PARTITION BY RANGE ({time_column}) INTERVAL (NUMTODSINTERVAL(1, 'DAY'))
+                (PARTITION P_HISTORY_START VALUES LESS THAN (TIMESTAMP '{PARTITION_START}'))
+                ONLINE UPDATE INDEXES
+            """)
+            logger.info(f"Partitioned {table} by day on {time_column}")
+
+        index_columns = [(time_column,)]
+        index_columns += [(column, time_column) for column in spec['hosts']]
+        index_columns += [(spec[key], time_column) for key in ('operation', 'status') if spec.get(key)]
+        for columns in index_columns:
+            name = f"{table}_{'_'.join(columns)}_IX"[:128]
+            # ORA-00955: name in use, ORA-01408: these columns are already indexed
+            self._execute_ddl(cursor, f"CREATE INDEX {name} ON {table} ({', '.join(columns)}) LOCAL",
+                              ignore=('ORA-00955', 'ORA-01408'))
+        return True
+
+    def ensure_schema(self, names: Optional[List[str]] = None):
+        """
+        Prepare the given history tables (default all), once each per process
+
+        This is the migration: it adds and backfills columns, repartitions and
+        builds indexes, so it runs as a start-up step and never from a query.
+        """
+        with self._lock:
+            pending = [name for name in (names or HISTORY_TABLES) if name not in self._ready]
+            if not pending:
+                return
+            with DB_SECONDS.time(operation='history', phase='ddl'):
+                with self.connect() as conn:
+                    cursor = conn.cursor()
+                    for name in pending:
+                        try:
+                            if self._prepare_table(cursor, HISTORY_TABLES[name]):
+                                self._ready.add(name)
+                        except oracledb.DatabaseError as e:
+                            logger.error(f"Preparing history table {name} failed: {e}")
+                    conn.commit()
+
+    def query(self, name: str, start: datetime, end: datetime, operation: Optional[str] = None,
+              host: Optional[str] = None, status: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """
+        Newest-first rows of one history table within [start, end)
+
+        The time range prunes to the partitions it covers and the filters
+        use the per-partition (column, time) indexes, so the cost follows the
+        number of matching rows rather than the size of the table. Runs no
+        DDL: ensure_schema must have prepared the table.
+
+        Raises:
+            ValueError: Unknown table, or a filter the table has no column for
+        """
+        if name not in HISTORY_TABLES:
+            raise ValueError(f"Unknown history table '{name}', expected one of: {', '.join(HISTORY_TABLES)}")
+        spec = HISTORY_TABLES[name]
+        time_column = _time_column(spec)
+        conditions = [f"{time_column} >= :start_time", f"{time_column} < :end_time"]
+        binds = {'start_time': start, 'end_time': end, 'row_limit': max(1, min(int(limit), MAX_QUERY_ROWS))}
+        for key, value in (('operation', operation), ('status', status)):
+            if value is None:
+                continue
+            if not spec.get(key):
+                raise ValueError(f"History table '{name}' cannot be filtered by {key}")
+            conditions.append(f"{spec[key]} = :{key}")
+            binds[key] = value
+        if host is not None:
+            if not spec['hosts']:
+                raise ValueError(f"History table '{name}' cannot be filtered by host")
+            conditions.append('(' + ' OR '.join(f"{column} = :host" for column in spec['hosts']) + ')')
+            binds['host'] = host
+
+        columns = ', '.join(spec['columns']) if 'columns' in spec else '*'
+        sql = (f"SELECT {columns} FROM {spec['table']} WHERE {' AND '.join(conditions)} "
+               f"ORDER BY {time_column} DESC FETCH FIRST :row_limit ROWS ONLY")
+        with DB_SECONDS.time(operation='history', phase='query'):
+            with self.connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute(sql, binds)
+                names = [d[0].lower() for d in cursor.description]
+                rows = [self._row(dict(zip(names, row))) for row in cursor.fetchall()]
+        return rows
+
+    @staticmethod
+    def _row(row: Dict) -> Dict:
+        for key, value in row.items():
+            if isinstance(value, oracledb.LOB):
+                value = value.read()
+            if key == 'payload' and isinstance(value, bytes):
+                value = decode_audit_record(value)
+            elif isinstance(value, datetime):
+                value = value.isoformat()
+            row[key] = value
+        return row
+
+    def drop_expired_partitions(self, retention_days: int) -> Dict[str, List[str]]:
+        """
+        Drop whole daily partitions older than retention_days
+
+        Dropping a partition is a dictionary operation, so retention costs
+        the same however many rows expire. The fixed first partition is kept
+        because an interval-partitioned table needs it. Tables ensure_schema
+        has not partitioned yet have nothing to drop.
+
+        Returns:
+            Table name -> dropped partition names
+
+        Raises:
+            ValueError: retention_days is below MIN_RETENTION_DAYS
+        """
+        if retention_days < MIN_RETENTION_DAYS:
+            raise ValueError(f"retention_days must be at least {MIN_RETENTION_DAYS}, got {retention_days}")
+        cutoff = datetime.now() - timedelta(days=retention_days)
+        dropped = {}
+        with DB_SECONDS.time(operation='history', phase='retention'):
+            with self.connect() as conn:
+                cursor = conn.cursor()
+                for spec in HISTORY_TABLES.values():
+                    table = spec['table']
+                    cursor.execute("""
+                        SELECT partition_name, high_value, partition_position FROM user_tab_partitions
+                        WHERE table_name = :1 ORDER BY partition_position
+                    """, [table])
+                    for partition, high_value, position in cursor.fetchall():
+                        match = _HIGH_VALUE.search(str(high_value))
+                        if position == 1 or match is None:
+                            continue
+                        if datetime.strptime(match.group(1), '%Y-%m-%d %H:%M:%S') > cutoff:
+                            break
+                        try:
+                            cursor.execute(f"ALTER TABLE {table} DROP PARTITION {partition} UPDATE INDEXES")
+                            dropped.setdefault(table, []).append(partition)
+                        except oracledb.DatabaseError as e:
+                            logger.error(f"Dropping partition {partition} of {table} failed: {e}")
+        if dropped:
+            logger.info(f"Retention dropped {sum(len(p) for p in dropped.values())} partitions older than {cutoff}")
+        return dropped
+
+    def start_retention(self, retention_days: int, interval: float = 3600):
+        """Run drop_expired_partitions every interval seconds in a daemon thread"""
+        if self._retention_thread is not None:
+            return
+
+        def loop():
+            while not self._retention_stop.is_set():
+                try:
+                    self.drop_expired_partitions(retention_days)
+                except Exception as e:
+                    logger.error(f"Retention run failed: {e}")
+                self._retention_stop.wait(interval)
+
+        self._retention_thread = threading.Thread(target=loop, name='history-retention', daemon=True)
+        self._retention_thread.start()
+
+    def stop_retention(self):
+        self._retention_stop.set()
@@ -1,31 +1,73 @@
 import re
+import threading
 from typing import List, Dict
-import oracledb  # or use cx_Oracle if needed
 import logging
+import time
 from datetime import datetime
 import logging
+from repos.LazyModule import LazyModule
+from repos.monitoring.Metrics import DB_SECONDS
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+oracledb = LazyModule("oracledb")  # or use cx_Oracle if needed
+
+# HOST of rows from this machine's own monitor; summary keys are (TIMESTAMP, HOST), so it cannot be NULL
+LOCAL_HOST = "localhost"
+# Summary tables keyed on (TIMESTAMP, HOST); earlier versions keyed them on TIMESTAMP alone
+HOST_KEYED_TABLES = ("SYSTEM_RESOURCE_SUMMARY", "SYSTEM_INTEGRITY_SUMMARY", "PROCESS_SUMMARY")
+
 class OracleDBHandler(logging.Handler):
     def __init__(self, dsn, user, password):
         super().__init__()
-        self.connection = oracledb.connect(user=user, password=password, dsn=dsn, mode=oracledb.SYSDBA)
-        self.cursor = self.connection.cursor()
-        self._ensure_tables_exist()
+        self.dsn = dsn
+        self.user = user
+        self.password = password
+        # Connected on first use, so building a handler (and a monitor) never waits on the database
+        self._connection = None
+        self._cursor = None
+        self._connect_lock = threading.Lock()
+        self._migration_lock = threading.Lock()
+        self._process_anomaly_table_ready = False
+        self._ensured_columns = set()
+
+    @property
+    def connection(self):
+        """Open the connection and create the process tables on first use"""
+        if self._connection is None:
+            with self._connect_lock:
+                if self._connection is None:
+                    with DB_SECONDS.time(operation='monitor', phase='connect'):
+                        connection = oracledb.connect(user=self.user, password=self.password, dsn=self.dsn,
+                                                      mode=oracledb.SYSDBA)
+                    self._cursor = connection.cursor()
+                    self._connection = connection
+                    self._ensure_tables_exist()
+        return self._connection
+
+    @property
+    def cursor(self):
+        self.connection
+        return self._cursor
+
+    @property
+    def connected(self) -> bool:
+        return self._connection is not None
 
     def _ensure_resource_tables_exist(self):
         cursor = self.connection.cursor()
         table_creations = [
             """
             CREATE TABLE SYSTEM_RESOURCE_SUMMARY (
-                TIMESTAMP VARCHAR2(50) PRIMARY KEY,
+                TIMESTAMP VARCHAR2(50),
                 CPU_USAGE FLOAT,
                 MEMORY_USAGE FLOAT,
                 NETWORK_CONNECTIONS NUMBER,
                 LOAD_1 FLOAT,
                 LOAD_5 FLOAT,
-                LOAD_15 FLOAT
+                LOAD_15 FLOAT,
+                HOST VARCHAR2(255),
+                CONSTRAINT SYSTEM_RESOURCE_SUMMARY_PK PRIMARY KEY (TIMESTAMP, HOST)
             )
             """,
             """
@@ -35,13 +77,16 @@ class OracleDBHandler(logging.Handler):
                 TOTAL NUMBER,
                 USED NUMBER,
                 FREE NUMBER,
-                PERCENT_USED FLOAT
+                PERCENT_USED FLOAT,
+                CHANGE_TYPE VARCHAR2(10),
+                HOST VARCHAR2(255)
             )
             """,
             """
             CREATE TABLE RESOURCE_ANOMALIES (
                 TIMESTAMP VARCHAR2(50),
-                ANOMALY_TYPE VARCHAR2(100)
+                ANOMALY_TYPE VARCHAR2(100),
+                HOST VARCHAR2(255)
             )
             """
         ]
@@ -67,24 +112,38 @@ class OracleDBHandler(logging.Handler):
                     continue
                 else:
                     raise
+        self._ensure_columns(cursor, "DISK_USAGE_INFO", ["CHANGE_TYPE VARCHAR2(10)"])
+        for table in tables:
+            self._ensure_columns(cursor, table, ["HOST VARCHAR2(255)"])
         cursor.close()
 
+    @staticmethod
+    def _change_type(results: Dict, row: Dict = None) -> str:
+        # Rows of delta-encoded results carry their own change; keyframes are 'full'
+        if row is not None and 'change' in row:
+            return row['change']
+        return 'added' if results.get('delta', {}).get('mode') == 'delta' else 'full'
+
     def _insert_resource_results_to_db(self, results: Dict):
         cursor = self.connection.cursor()
-        self._ensure_resource_tables_exist()
+        with DB_SECONDS.time(operation='resource_results', phase='ddl'):
+            self._ensure_resource_tables_exist()
+        started = time.perf_counter()
+        host = results.get('host') or LOCAL_HOST
         # Insert system resource summary
         load1, load5, load15 = results['load_average']
         cursor.execute("""
             INSERT INTO SYSTEM_RESOURCE_SUMMARY (
                 TIMESTAMP, CPU_USAGE, MEMORY_USAGE,
-                NETWORK_CONNECTIONS, LOAD_1, LOAD_5, LOAD_15
-            ) VALUES (:1, :2, :3, :4, :5, :6, :7)
+                NETWORK_CONNECTIONS, LOAD_1, LOAD_5, LOAD_15, HOST
+            ) VALUES (:1, :2, :3, :4, :5, :6, :7, :8)
         """, [
             results['timestamp'],
             results['cpu_usage'],
             results['memory_usage'],
             results['network_connections'],
-            load1, load5, load15
+            load1, load5, load15,
+            host
         ])
 
         # Insert disk usage info
@@ -95,29 +154,32 @@ class OracleDBHandler(logging.Handler):
                 data['total'],
                 data['used'],
                 data['free'],
-                data['percent']
+                data['percent'],
+                self._change_type(results, data),
+                host
             )
             for mount_point, data in results['disk_usage'].items()
         ]
         cursor.executemany("""
             INSERT INTO DISK_USAGE_INFO (
-                TIMESTAMP, MOUNT_POINT, TOTAL, USED, FREE, PERCENT_USED
-            ) VALUES (:1, :2, :3, :4, :5, :6)
+                TIMESTAMP, MOUNT_POINT, TOTAL, USED, FREE, PERCENT_USED, CHANGE_TYPE, HOST
+            ) VALUES (:1, :2, :3, :4, :5, :6, :7, :8)
         """, disk_data)
 
         # Insert anomalies
         if 'anomalies' in results:
             anomaly_data = [
-                (results['timestamp'], anomaly)
+                (results['timestamp'], anomaly, host)
                 for anomaly in results['anomalies']
             ]
             cursor.executemany("""
                 INSERT INTO RESOURCE_ANOMALIES (
-                    TIMESTAMP, ANOMALY_TYPE
-                ) VALUES (:1, :2)
+                    TIMESTAMP, ANOMALY_TYPE, HOST
+                ) VALUES (:1, :2, :3)
             """, anomaly_data)
 
-        self.connection.commit()
+        DB_SECONDS.observe(time.perf_counter() - started, operation='resource_results', phase='insert')
+        self._commit('resource_results')
         cursor.close()
 
 
@@ -126,7 +188,9 @@ class OracleDBHandler(logging.Handler):
         table_creations = [
             """
             CREATE TABLE SYSTEM_INTEGRITY_SUMMARY (
-                TIMESTAMP VARCHAR2(50) PRIMARY KEY
+                TIMESTAMP VARCHAR2(50),
+                HOST VARCHAR2(255),
+                CONSTRAINT SYSTEM_INTEGRITY_SUMMARY_PK PRIMARY KEY (TIMESTAMP, HOST)
             )
             """,
             """
@@ -135,13 +199,17 @@ class OracleDBHandler(logging.Handler):
                 FILE_PATH VARCHAR2(500),
                 FILE_SIZE NUMBER,
                 MTIME FLOAT,
-                PERMISSIONS VARCHAR2(10)
+                PERMISSIONS VARCHAR2(10),
+                CHANGE_TYPE VARCHAR2(10),
+                HOST VARCHAR2(255)
             )
             """,
             """
             CREATE TABLE WORLD_WRITABLE_FILES (
                 TIMESTAMP VARCHAR2(50),
-                FILE_PATH VARCHAR2(500)
+                FILE_PATH VARCHAR2(500),
+                CHANGE_TYPE VARCHAR2(10),
+                HOST VARCHAR2(255)
             )
             """
         ]
@@ -165,16 +233,23 @@ class OracleDBHandler(logging.Handler):
                     continue
                 else:
                     raise
+        for table in ("SYSTEM_FILES_INFO", "WORLD_WRITABLE_FILES"):
+            self._ensure_columns(cursor, table, ["CHANGE_TYPE VARCHAR2(10)"])
+        for table in tables:
+            self._ensure_columns(cursor, table, ["HOST VARCHAR2(255)"])
         cursor.close()
 
     def _insert_integrity_results_to_db(self, results: Dict):
         cursor = self.connection.cursor()
-        self._ensure_integrity_tables_exist()
+        with DB_SECONDS.time(operation='integrity_results', phase='ddl'):
+            self._ensure_integrity_tables_exist()
+        started = time.perf_counter()
+        host = results.get('host') or LOCAL_HOST
         # Insert summary
         cursor.execute("""
-            INSERT INTO SYSTEM_INTEGRITY_SUMMARY (TIMESTAMP)
-            VALUES (:1)
-        """, [results['timestamp']])
+            INSERT INTO SYSTEM_INTEGRITY_SUMMARY (TIMESTAMP, HOST)
+            VALUES (:1, :2)
+        """, [results['timestamp'], host])
 
         # Insert critical system files
         file_info_data = [
@@ -183,25 +258,31 @@ class OracleDBHandler(logging.Handler):
                 path,
                 meta['size'],
                 meta['mtime'],
-                meta['permissions']
+                meta['permissions'],
+                self._change_type(results, meta),
+                host
             )
             for path, meta in results['system_files'].items()
         ]
         cursor.executemany("""
-            INSERT INTO SYSTEM_FILES_INFO (TIMESTAMP, FILE_PATH, FILE_SIZE, MTIME, PERMISSIONS)
-            VALUES (:1, :2, :3, :4, :5)
+            INSERT INTO SYSTEM_FILES_INFO (TIMESTAMP, FILE_PATH, FILE_SIZE, MTIME, PERMISSIONS, CHANGE_TYPE, HOST)
+            VALUES (:1, :2, :3, :4, :5, :6, :7)
         """, file_info_data)
 
-        # Insert world-writable files
+        # Insert world-writable files (and, for deltas, the ones no longer world-writable)
         cursor.executemany("""
-            INSERT INTO WORLD_WRITABLE_FILES (TIMESTAMP, FILE_PATH)
-            VALUES (:1, :2)
+            INSERT INTO WORLD_WRITABLE_FILES (TIMESTAMP, FILE_PATH, CHANGE_TYPE, HOST)
+            VALUES (:1, :2, :3, :4)
         """, [
-            (results['timestamp'], path)
+            (results['timestamp'], path, self._change_type(results), host)
             for path in results['permissions'].get('world_writable', [])
+        ] + [
+            (results['timestamp'], path, 'removed', host)
+            for path in results['permissions'].get('world_writable_removed', [])
         ])
 
-        self.connection.commit()
+        DB_SECONDS.observe(time.perf_counter() - started, operation='integrity_results', phase='insert')
+        self._commit('integrity_results')
         cursor.close()
 
 
@@ -210,8 +291,10 @@ class OracleDBHandler(logging.Handler):
         table_creations = [
             """
             CREATE TABLE PROCESS_SUMMARY (
-                TIMESTAMP VARCHAR2(50) PRIMARY KEY,
-                TOTAL_PROCESSES NUMBER
+                TIMESTAMP VARCHAR2(50),
+                TOTAL_PROCESSES NUMBER,
+                HOST VARCHAR2(255),
+                CONSTRAINT PROCESS_SUMMARY_PK PRIMARY KEY (TIMESTAMP, HOST)
             )
             """,
             """
@@ -220,7 +303,9 @@ class OracleDBHandler(logging.Handler):
                 PID NUMBER,
                 NAME VARCHAR2(255),
                 CPU_PERCENT FLOAT,
-                MEMORY_PERCENT FLOAT
+                MEMORY_PERCENT FLOAT,
+                CHANGE_TYPE VARCHAR2(10),
+                HOST VARCHAR2(255)
             )
             """,
             """
@@ -228,7 +313,9 @@ class OracleDBHandler(logging.Handler):
                 TIMESTAMP VARCHAR2(50),
                 PID NUMBER,
                 NAME VARCHAR2(255),
-                CONNECTIONS NUMBER
+                CONNECTIONS NUMBER,
+                CHANGE_TYPE VARCHAR2(10),
+                HOST VARCHAR2(255)
             )
             """,
             """
@@ -236,7 +323,9 @@ class OracleDBHandler(logging.Handler):
                 TIMESTAMP VARCHAR2(50),
                 PID NUMBER,
                 NAME VARCHAR2(255),
-                CMDLINE CLOB
+                CMDLINE CLOB,
+                CHANGE_TYPE VARCHAR2(10),
+                HOST VARCHAR2(255)
             )
             """
         ]
@@ -261,6 +350,10 @@ class OracleDBHandler(logging.Handler):
                     continue
                 else:
                     raise
+        for table in ("HIGH_RESOURCE_PROCESSES", "NETWORK_PROCESSES", "SUSPICIOUS_PROCESSES"):
+            self._ensure_columns(cursor, table, ["CHANGE_TYPE VARCHAR2(10)"])
+        for table in tables:
+            self._ensure_columns(cursor, table, ["HOST VARCHAR2(255)"])
         cursor.close()
 
     def _is_suspicious_process(self, proc_info):
@@ -270,41 +363,46 @@ class OracleDBHandler(logging.Handler):
 
     def _insert_results_to_db(self, results: Dict):
         cursor = self.connection.cursor()
-        self._ensure_tables_exist()
+        with DB_SECONDS.time(operation='process_results', phase='ddl'):
+            self._ensure_tables_exist()
+        started = time.perf_counter()
+        host = results.get('host') or LOCAL_HOST
         # Insert summary
         cursor.execute("""
-            INSERT INTO PROCESS_SUMMARY (TIMESTAMP, TOTAL_PROCESSES)
-            VALUES (:1, :2)
-        """, [results['timestamp'], results['total_processes']])
+            INSERT INTO PROCESS_SUMMARY (TIMESTAMP, TOTAL_PROCESSES, HOST)
+            VALUES (:1, :2, :3)
+        """, [results['timestamp'], results['total_processes'], host])
 
         # Batch insert high resource
         cursor.executemany("""
-            INSERT INTO HIGH_RESOURCE_PROCESSES (TIMESTAMP, PID, NAME, CPU_PERCENT, MEMORY_PERCENT)
-            VALUES (:1, :2, :3, :4, :5)
+            INSERT INTO HIGH_RESOURCE_PROCESSES (TIMESTAMP, PID, NAME, CPU_PERCENT, MEMORY_PERCENT, CHANGE_TYPE, HOST)
+            VALUES (:1, :2, :3, :4, :5, :6, :7)
         """, [
-            (results['timestamp'], p['pid'], p['name'], p['cpu_percent'], p['memory_percent'])
+            (results['timestamp'], p['pid'], p['name'], p['cpu_percent'], p['memory_percent'],
+             self._change_type(results, p), host)
             for p in results['high_resource_processes']
         ])
 
         # Batch insert network
         cursor.executemany("""
-            INSERT INTO NETWORK_PROCESSES (TIMESTAMP, PID, NAME, CONNECTIONS)
-            VALUES (:1, :2, :3, :4)
+            INSERT INTO NETWORK_PROCESSES (TIMESTAMP, PID, NAME, CONNECTIONS, CHANGE_TYPE, HOST)
+            VALUES (:1, :2, :3, :4, :5, :6)
         """, [
-            (results['timestamp'], p['pid'], p['name'], p['connections'])
+            (results['timestamp'], p['pid'], p['name'], p['connections'], self._change_type(results, p), host)
             for p in results['network_processes']
         ])
 
         # Batch insert suspicious
         cursor.executemany("""
-            INSERT INTO SUSPICIOUS_PROCESSES (TIMESTAMP, PID, NAME, CMDLINE)
-            VALUES (:1, :2, :3, :4)
+            INSERT INTO SUSPICIOUS_PROCESSES (TIMESTAMP, PID, NAME, CMDLINE, CHANGE_TYPE, HOST)
+            VALUES (:1, :2, :3, :4, :5, :6)
         """, [
-            (results['timestamp'], p['pid'], p['name'], ' '.join(p['cmdline']))
+            (results['timestamp'], p['pid'], p['name'], ' '.join(p['cmdline'] or []), self._change_type(results, p), host)
             for p in results['suspicious_processes']
         ])
 
-        self.connection.commit()
+        DB_SECONDS.observe(time.perf_counter() - started, operation='process_results', phase='insert')
+        self._commit('process_results')
         cursor.close()
 
     def _ensure_process_anomaly_table_exists(self):
@@ -319,28 +417,98 @@ class OracleDBHandler(logging.Handler):
                     CMDLINE CLOB,
                     CPU_PERCENT FLOAT,
                     MEMORY_PERCENT FLOAT,
-                    TIMESTAMP TIMESTAMP
+                    TIMESTAMP TIMESTAMP,
+                    TRANSITION VARCHAR2(10),
+                    PROCESS_START FLOAT,
+                    FIRST_SEEN TIMESTAMP,
+                    LAST_SEEN TIMESTAMP,
+                    OCCURRENCES NUMBER,
+                    HOST VARCHAR2(255)
                 )
             """)
         except oracledb.DatabaseError as e:
             if 'ORA-00955' in str(e):  # table already exists
-                pass
+                self._ensure_columns(cursor, "PROCESS_ANOMALIES", [
+                    "TRANSITION VARCHAR2(10)",
+                    "PROCESS_START FLOAT",
+                    "FIRST_SEEN TIMESTAMP",
+                    "LAST_SEEN TIMESTAMP",
+                    "OCCURRENCES NUMBER",
+                    "HOST VARCHAR2(255)",
+                ])
             else:
                 raise
         cursor.close()
 
+    def _ensure_columns(self, cursor, table: str, columns: List[str]):
+        # Tables created by earlier versions lack newer columns
+        for column in columns:
+            if (table, column) in self._ensured_columns:
+                continue
+            try:
+                cursor.execute(f"ALTER TABLE {table} ADD ({column})")
+            except oracledb.DatabaseError as e:
+                if 'ORA-01430' not in str(e):  # column already exists
+                    raise
+            self._ensured_columns.add((table, column))
+
+    def migrate_host_keys(self) -> Dict[str, str]:
+        """
+        Re-key summary tables of earlier versions on (TIMESTAMP, HOST)
+
+        A one-off migration, run at start-up rather than from the writers:
+        keys on TIMESTAMP alone collide once several devices report with
+        their own clocks. Each table is locked against writers while rows
+        without a HOST get LOCAL_HOST and the key is replaced.
+
+        Returns:
+            Table name -> 'migrated' or 'current'
+        """
+        with self._migration_lock:
+            self._ensure_resource_tables_exist()
+            self._ensure_integrity_tables_exist()
+            cursor = self.connection.cursor()
+            outcome = {}
+            with DB_SECONDS.time(operation='host_keys', phase='ddl'):
+                for table in HOST_KEYED_TABLES:
+                    cursor.execute("""
+                        SELECT cc.column_name FROM user_constraints c
+                        JOIN user_cons_columns cc ON cc.constraint_name = c.constraint_name
+                        WHERE c.table_name = :1 AND c.constraint_type = 'P'
+                    """, [table])
+                    key = {row[0] for row in cursor.fetchall()}
+                    if key == {'TIMESTAMP', 'HOST'}:
+                        outcome[table] = 'current'
+                        continue
+                    # Held until the first ALTER commits; writers always set HOST, so none can add a NULL after
+                    cursor.execute(f"LOCK TABLE {table} IN EXCLUSIVE MODE")
+                    cursor.execute(f"UPDATE {table} SET HOST = :1 WHERE HOST IS NULL", [LOCAL_HOST])
+                    if key:
+                        cursor.execute(f"ALTER TABLE {table} DROP PRIMARY KEY")
+                    cursor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_PK PRIMARY KEY (TIMESTAMP, HOST)")
+                    logger.info(f"Table '{table}' is now keyed on (TIMESTAMP, HOST).")
+                    outcome[table] = 'migrated'
+            cursor.close()
+        return outcome
+
+    @staticmethod
+    def _parse_timestamp(value):
+        try:
+            return datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            return None
+
     def insert_anomalies_into_db(self, anomalies: List[Dict]):
         if not anomalies:
             return
-        self._ensure_process_anomaly_table_exists()
+        if not self._process_anomaly_table_ready:
+            self._ensure_process_anomaly_table_exists()
+            self._process_anomaly_table_ready = True
         cursor = self.connection.cursor()
         data_to_insert = []
 
         for entry in anomalies:
-            try:
-                timestamp = datetime.fromisoformat(entry.get('timestamp'))
-            except ValueError:
-                timestamp = datetime.now()
+            timestamp = self._parse_timestamp(entry.get('timestamp')) or datetime.now()
 
             data_to_insert.append((
                 entry.get('type'),
@@ -349,20 +517,33 @@ class OracleDBHandler(logging.Handler):
                 ' '.join(entry.get('cmdline', [])) if isinstance(entry.get('cmdline'), list) else str(entry.get('cmdline')),
                 entry.get('cpu_percent') if 'cpu_percent' in entry else None,
                 entry.get('memory_percent') if 'memory_percent' in entry else None,
-                timestamp
+                timestamp,
+                entry.get('transition'),
+                entry.get('create_time'),
+                self._parse_timestamp(entry.get('first_seen')),
+                self._parse_timestamp(entry.get('last_seen')),
+                entry.get('occurrences'),
+                entry.get('host')
             ))
 
+        started = time.perf_counter()
         cursor.executemany("""
             INSERT INTO PROCESS_ANOMALIES (
-                TYPE, PID, NAME, CMDLINE, CPU_PERCENT, MEMORY_PERCENT, TIMESTAMP
-            ) VALUES (:1, :2, :3, :4, :5, :6, :7)
+                TYPE, PID, NAME, CMDLINE, CPU_PERCENT, MEMORY_PERCENT, TIMESTAMP,
+                TRANSITION, PROCESS_START, FIRST_SEEN, LAST_SEEN, OCCURRENCES, HOST
+            ) VALUES (:1, :2, :3, :4, :5, :6, :7, :8, :9, :10, :11, :12, :13)
         """, data_to_insert)
 
-        self.connection.commit()
+        DB_SECONDS.observe(time.perf_counter() - started, operation='process_anomalies', phase='insert')
+        self._commit('process_anomalies')
         cursor.close()
 
 
 
+    def _commit(self, operation: str):
+        with DB_SECONDS.time(operation=operation, phase='commit'):
+            self.connection.commit()
+
     def _create_tables(self):
         create_processes_table = """
             BEGIN
@@ -427,17 +608,18 @@ class OracleDBHandler(logging.Handler):
         message = self.format(record)
         try:
             # Always insert into logs
-            self.cursor.execute(
-                "INSERT INTO security_logs (log_time, log_level, message) VALUES (:1, :2, :3)",
-                (log_time, log_level, message)
-            )
+            with DB_SECONDS.time(operation='security_log', phase='insert'):
+                self.cursor.execute(
+                    "INSERT INTO security_logs (log_time, log_level, message) VALUES (:1, :2, :3)",
+                    (log_time, log_level, message)
+                )
 
             # Try to extract metric
             match = re.match(r'^\s*([A-Za-z_][\w]*)\s*=\s*([-+]?[0-9]*\.?[0-9]+)\s*$', message)
             if match:
                 self.insert_process_metric(match.group(1), float(match.group(2)), log_time)
 
-            self.connection.commit()
+            self._commit('security_log')
 
         except Exception as e:
             print(f"[DB Logging Error] {e}")
@@ -446,18 +628,20 @@ class OracleDBHandler(logging.Handler):
         if log_time is None:
             log_time = datetime.now()
         try:
-            self.cursor.execute(
-                "INSERT INTO processes (label, value, logged_at) VALUES (:1, :2, :3)",
-                (label, value, log_time)
-            )
-            self.connection.commit()
+            with DB_SECONDS.time(operation='process_metric', phase='insert'):
+                self.cursor.execute(
+                    "INSERT INTO processes (label, value, logged_at) VALUES (:1, :2, :3)",
+                    (label, value, log_time)
+                )
+            self._commit('process_metric')
         except Exception as e:
             print(f"[Metric Insert Error] {e}")
 
     def close(self):
         try:
-            self.cursor.close()
-            self.connection.close()
+            if self._connection is not None:
+                self._cursor.close()
+                self._connection.close()
         except:
             pass
         super().close()
@@ -0,0 +1,92 @@
+"""
+Anomaly state store for the System Security Monitor
+Collapses repeated scan findings into open/update/close transitions
+"""
+
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+AnomalyKey = Tuple[str, int, Optional[float], str]
+
+
+class AnomalyStateStore:
+    """Tracks active process anomalies across scans"""
+
+    def __init__(self, update_threshold: float = 10.0):
+        """
+        Initialize the state store
+
+        Args:
+            update_threshold: Minimum change in cpu/memory percent that emits an 'update'
+        """
+        self.update_threshold = update_threshold
+        self.active: Dict[AnomalyKey, Dict] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(anomaly: Dict) -> AnomalyKey:
+        """Identify an anomaly by (type, pid, process start time, name)"""
+        return (anomaly.get('type'), anomaly.get('pid'), anomaly.get('create_time'), anomaly.get('name'))
+
+    def _has_changed(self, state: Dict, anomaly: Dict) -> bool:
+        """Check whether tracked resource values moved past the update threshold"""
+        for field in ('cpu_percent', 'memory_percent'):
+            previous = state.get(field)
+            current = anomaly.get(field)
+            if previous is None or current is None:
+                continue
+            if abs(current - previous) >= self.update_threshold:
+                return True
+        return False
+
+    def observe(self, anomalies: List[Dict]) -> List[Dict]:
+        """
+        Reconcile the anomalies of one scan with the stored state
+
+        Args:
+            anomalies: Anomalies detected by the current scan
+
+        Returns:
+            List of transitions since the previous scan, each tagged with
+            'transition', 'first_seen', 'last_seen' and 'occurrences'
+        """
+        now = datetime.now().isoformat()
+        transitions = []
+        seen = set()
+
+        with self._lock:
+            for anomaly in anomalies:
+                key = self.make_key(anomaly)
+                if key in seen:
+                    continue
+                seen.add(key)
+
+                state = self.active.get(key)
+                if state is None:
+                    state = dict(anomaly, first_seen=now, last_seen=now, occurrences=1)
+                    self.active[key] = state
+                    transitions.append(dict(state, transition='open'))
+                    continue
+
+                state['last_seen'] = now
+                state['occurrences'] += 1
+                if self._has_changed(state, anomaly):
+                    state.update(anomaly)
+                    transitions.append(dict(state, transition='update'))
+
+            for key in [key for key in self.active if key not in seen]:
+                state = self.active.pop(key)
+                transitions.append(dict(state, transition='close', timestamp=now))
+
+        return transitions
+
+    def get_active(self) -> List[Dict]:
+        """Return a snapshot of the currently open anomalies"""
+        with self._lock:
+            return [dict(state) for state in self.active.values()]
+
+    def reset(self):
+        """Forget all tracked anomalies"""
+        with self._lock:
+            self.active.clear()
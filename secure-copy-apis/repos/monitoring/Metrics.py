@@ -0,0 +1,261 @@
+"""
+In-process metrics in the Prometheus text exposition format
+Counters and fixed-bucket histograms cheap enough to record on every request
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds, from sub-millisecond cache hits to multi-minute transfers
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+                   60.0, 300.0)
+# Bytes per second, 64 KiB/s to 1 GiB/s in powers of four
+THROUGHPUT_BUCKETS = tuple(float(64 * 1024 * 4 ** i) for i in range(8))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        try:
+            if len(labels) == len(self.labelnames):
+                return tuple([str(labels[name]) for name in self.labelnames])
+        except KeyError:
+            pass
+        raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+
+    def drain(self) -> Dict[Tuple[str, ...], object]:
+        """Take every series and start again from empty"""
+        with self._lock:
+            series, self._series = self._series, {}
+        return series
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = sorted((key, self._snapshot(value)) for key, value in self._series.items())
+        for key, value in series:
+            lines.extend(self._render_series(key, value))
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing total; names end in _total by convention"""
+
+    kind = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._series.get(self._key(labels), 0.0)
+
+    def merge(self, series: Dict[Tuple[str, ...], float]):
+        with self._lock:
+            for key, value in series.items():
+                self._series[key] = self._series.get(key, 0.0) + value
+
+    @staticmethod
+    def _snapshot(value):
+        return value
+
+    def _render_series(self, key, value) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Gauge(_Metric):
+    """Value that is set rather than accumulated, such as a one-off start-up time"""
+
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = float(value)
+
+    def value(self, **labels) -> Optional[float]:
+        with self._lock:
+            return self._series.get(self._key(labels))
+
+    def merge(self, series: Dict[Tuple[str, ...], float]):
+        with self._lock:
+            self._series.update(series)
+
+    @staticmethod
+    def _snapshot(value):
+        return value
+
+    def _render_series(self, key, value) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observations over fixed upper bounds
+
+    Each series keeps per-bucket counts, a sum and a count, so an
+    observation is one bisect and three additions under the metric's lock.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Bucket counts plus the +Inf bucket, then sum
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def summary(self, **labels) -> Dict[str, float]:
+        """Count and sum of one series"""
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            if series is None:
+                return {'count': 0, 'sum': 0.0}
+            return {'count': sum(series[:-1]), 'sum': series[-1]}
+
+    def merge(self, series: Dict[Tuple[str, ...], List[float]]):
+        with self._lock:
+            for key, value in series.items():
+                current = self._series.get(key)
+                if current is None:
+                    self._series[key] = list(value)
+                else:
+                    for i, amount in enumerate(value):
+                        current[i] += amount
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block, including when it raises"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    @staticmethod
+    def _snapshot(value):
+        return list(value)
+
+    def _render_series(self, key, value) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), value[:-1]):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, ('le', _format_value(bound)))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(value[-1])}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics rendered together at the scrape endpoint"""
+
+    def __init__(self, prefix: str = 'securecopy_'):
+        self.prefix = prefix
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        name = self.prefix + name
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def drain(self) -> Dict[str, Dict]:
+        """
+        Take the series recorded since the last drain, by metric name
+
+        Transfer worker processes record into their own registry and ship
+        the drained series to the API process, which merge()s them into its
+        registry so /metrics covers work done in every process.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        drained = {}
+        for metric in metrics:
+            series = metric.drain()
+            if series:
+                drained[metric.name] = series
+        return drained
+
+    def merge(self, drained: Dict[str, Dict]):
+        """Add series taken with drain() in another process; metrics not registered here are skipped"""
+        for name, series in drained.items():
+            with self._lock:
+                metric = self._metrics.get(name)
+            if metric is not None:
+                metric.merge(series)
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text format, version 0.0.4"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# One registry per process, shared by the API, SCPManager and the monitor
+metrics = MetricsRegistry()
+
+# Shared by DatabaseManager and OracleDBHandler, which both talk to the audit database
+DB_SECONDS = metrics.histogram(
+    'db_seconds', 'Oracle round trip time by operation and phase (connect, ddl, insert, commit)',
+    ('operation', 'phase'))
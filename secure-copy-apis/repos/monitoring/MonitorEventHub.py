@@ -0,0 +1,138 @@
+"""
+Publish/subscribe hub for live monitor events
+Fans out resource samples, anomaly transitions and integrity changes to stream clients
+"""
+
+import itertools
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+EVENT_TYPES = ('resource', 'anomaly', 'integrity')
+# Upper bound on a client's buffer, so a stalled client cannot make the server hold events without limit
+MAX_SUBSCRIPTION_BUFFER = 1000
+
+
+class Subscription:
+    """Bounded per-client event buffer with filters"""
+
+    def __init__(self, hub: 'MonitorEventHub', types: Optional[Iterable[str]] = None,
+                 metrics: Optional[Iterable[str]] = None, anomaly_types: Optional[Iterable[str]] = None,
+                 max_buffer: int = 100):
+        """
+        Initialize the subscription
+
+        Args:
+            hub: Hub the subscription belongs to
+            types: Event types to receive (default all)
+            metrics: Resource metrics to keep in 'resource' events (default all)
+            anomaly_types: Anomaly types to receive, e.g. 'suspicious_process' (default all)
+            max_buffer: Events buffered before the slowest ones are coalesced or dropped,
+                at most MAX_SUBSCRIPTION_BUFFER
+        """
+        self.hub = hub
+        self.types = set(types) if types else set(EVENT_TYPES)
+        self.metrics = set(metrics) if metrics else None
+        self.anomaly_types = set(anomaly_types) if anomaly_types else None
+        self.max_buffer = max(1, min(int(max_buffer), MAX_SUBSCRIPTION_BUFFER))
+        self.dropped = 0
+        self.closed = False
+        self._events = deque()
+        self._condition = threading.Condition()
+
+    def _filter(self, event: Dict) -> Optional[Dict]:
+        if event['type'] not in self.types:
+            return None
+        if event['type'] == 'resource' and self.metrics:
+            data = {k: v for k, v in event['data'].items() if k in self.metrics or k == 'timestamp'}
+            return dict(event, data=data)
+        if event['type'] == 'anomaly' and self.anomaly_types:
+            anomalies = [a for a in event['data'] if a.get('type') in self.anomaly_types]
+            return dict(event, data=anomalies) if anomalies else None
+        return event
+
+    def offer(self, event: Dict):
+        """Queue an event, coalescing resource samples and dropping the oldest when full"""
+        event = self._filter(event)
+        if event is None:
+            return
+        with self._condition:
+            if len(self._events) >= self.max_buffer:
+                if event['type'] == 'resource':
+                    # A newer sample supersedes any queued one
+                    for i in range(len(self._events) - 1, -1, -1):
+                        if self._events[i]['type'] == 'resource':
+                            del self._events[i]
+                            self.dropped += 1
+                            break
+                if len(self._events) >= self.max_buffer:
+                    self._events.popleft()
+                    self.dropped += 1
+            self._events.append(event)
+            self._condition.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Dict]:
+        """
+        Wait for the next event
+
+        Returns:
+            The event, tagged with 'dropped' if events were lost since the
+            last one, or None on timeout or close
+        """
+        with self._condition:
+            if not self._events and not self.closed:
+                self._condition.wait(timeout)
+            if not self._events:
+                return None
+            event = self._events.popleft()
+            if self.dropped:
+                event = dict(event, dropped=self.dropped)
+                self.dropped = 0
+            return event
+
+    def close(self):
+        """Detach from the hub and wake any waiting reader"""
+        self.hub.unsubscribe(self)
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+
+class MonitorEventHub:
+    """Distributes monitor events produced by one scan loop to many subscribers"""
+
+    def __init__(self):
+        self._subscriptions: List[Subscription] = []
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def subscribe(self, **filters) -> Subscription:
+        """Register a subscriber; see Subscription for the accepted filters"""
+        subscription = Subscription(self, **filters)
+        with self._lock:
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscriptions)
+
+    def publish(self, event_type: str, data):
+        """Send an event to every subscriber without blocking on slow readers"""
+        event = {
+            'id': next(self._ids),
+            'type': event_type,
+            'timestamp': datetime.now().isoformat(),
+            'data': data
+        }
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.offer(event)
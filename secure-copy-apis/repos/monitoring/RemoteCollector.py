@@ -0,0 +1,205 @@
+"""
+Remote monitor collection over SSH
+Runs RemoteCollectorAgent on managed devices in one exec and builds monitor reports from the result
+"""
+
+import gzip
+import json
+import logging
+import os
+import select
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, Iterator
+
+from repos.SystemSecurityMonitor import SystemSecurityMonitor
+from repos.monitoring.AnomalyStateStore import AnomalyStateStore
+from repos.securecopy.SecureCopy import DeviceConfig, SSHManager
+
+logger = logging.getLogger(__name__)
+
+AGENT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'RemoteCollectorAgent.py')
+# Last bytes of the agent's stderr kept for the error message
+STDERR_TAIL_BYTES = 65536
+
+
+class _HostState:
+    """Per-device baseline and anomaly state, mirroring a local SystemSecurityMonitor"""
+
+    def __init__(self):
+        self.baseline_processes = None
+        self.baseline_cpu_usage = 0.0
+        self.baseline_memory_usage = 0.0
+        self.anomaly_store = AnomalyStateStore()
+
+
+class RemoteMonitorCollector:
+    """Collects process, integrity and resource data from devices with one SSH round trip each"""
+
+    def __init__(self, db_handler=None, timeout: float = 120, max_output_bytes: int = 64 * 1024 * 1024):
+        """
+        Initialize the collector
+
+        Args:
+            db_handler: OracleDBHandler used to persist reports, None to skip persistence
+            timeout: Per-device limit covering connect and collection
+            max_output_bytes: Maximum compressed agent output accepted from a device
+        """
+        self.db_handler = db_handler
+        self.timeout = timeout
+        self.max_output_bytes = max_output_bytes
+        self._hosts: Dict[str, _HostState] = {}
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        with open(AGENT_PATH, 'rb') as f:
+            self._agent = f.read()
+
+    def _host_state(self, host: str) -> _HostState:
+        with self._lock:
+            return self._hosts.setdefault(host, _HostState())
+
+    def _run_agent(self, device_config: DeviceConfig) -> Dict:
+        """Send the agent over stdin of `python3 -` and decode its compressed output"""
+        started = time.monotonic()
+        client = SSHManager.create_ssh_client(device_config, timeout=self.timeout)
+        try:
+            channel = client.get_transport().open_session()
+            channel.settimeout(max(self.timeout - (time.monotonic() - started), 1))
+            channel.exec_command('python3 -')
+            channel.sendall(self._agent)
+            channel.shutdown_write()
+
+            # stderr is read alongside stdout, so a chatty agent cannot fill the window and stall
+            deadline = started + self.timeout
+            chunks, size, errors = [], 0, bytearray()
+            while True:
+                received = False
+                if channel.recv_ready():
+                    data = channel.recv(65536)
+                    size += len(data)
+                    if size > self.max_output_bytes:
+                        raise RuntimeError(f"Collector output exceeded {self.max_output_bytes} bytes")
+                    chunks.append(data)
+                    received = received or bool(data)
+                if channel.recv_stderr_ready():
+                    data = channel.recv_stderr(65536)
+                    errors += data
+                    del errors[:-STDERR_TAIL_BYTES]
+                    received = received or bool(data)
+                if received:
+                    continue
+                if channel.exit_status_ready() and not channel.recv_ready() and not channel.recv_stderr_ready():
+                    break
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Collector did not finish within {self.timeout}s")
+                select.select([channel], [], [], 0.1)
+            stderr = errors.decode('utf-8', errors='replace').strip()
+            exit_code = channel.recv_exit_status()
+            if exit_code != 0:
+                raise RuntimeError(f"Collector exited with {exit_code}: {stderr}")
+            return json.loads(gzip.decompress(b''.join(chunks)))
+        finally:
+            client.close()
+
+    def build_report(self, host: str, collected: Dict) -> Dict:
+        """
+        Turn raw agent output into a generate_security_report() style report
+
+        The first collection from a host establishes its baseline, as
+        SystemSecurityMonitor does at construction.
+        """
+        state = self._host_state(host)
+        timestamp = datetime.fromtimestamp(collected['timestamp']).isoformat()
+        resources = collected['resources']
+
+        if state.baseline_processes is None:
+            state.baseline_processes = {p['name'] for p in collected['processes']}
+            state.baseline_cpu_usage = resources['cpu_usage']
+            state.baseline_memory_usage = resources['memory_usage']
+
+        anomalies = []
+        process_scan = {
+            'total_processes': 0,
+            'suspicious_processes': [],
+            'high_resource_processes': [],
+            'network_processes': [],
+            'timestamp': timestamp,
+            'host': host
+        }
+        for proc_info in collected['processes']:
+            anomalies.extend(SystemSecurityMonitor.classify_process_anomalies(proc_info, state.baseline_processes))
+            SystemSecurityMonitor.add_to_process_scan(process_scan, proc_info, proc_info.get('connections'))
+        transitions = [dict(t, host=host) for t in state.anomaly_store.observe(anomalies)]
+
+        resource_monitoring = {
+            'cpu_usage': resources['cpu_usage'],
+            'memory_usage': resources['memory_usage'],
+            'disk_usage': resources['disk_usage'],
+            'network_connections': resources['network_connections'],
+            'load_average': tuple(resources['load_average']),
+            'timestamp': timestamp,
+            'host': host
+        }
+        resource_monitoring['anomalies'] = SystemSecurityMonitor.resource_anomalies(
+            resource_monitoring, state.baseline_cpu_usage, state.baseline_memory_usage)
+
+        return {
+            'timestamp': timestamp,
+            'host': host,
+            'system_info': collected['system_info'],
+            'process_anomalies': transitions,
+            'process_scan': process_scan,
+            'system_integrity': {
+                'file_integrity': {},
+                'system_files': collected['system_files'],
+                'permissions': {'world_writable': collected['world_writable']},
+                'timestamp': timestamp,
+                'host': host
+            },
+            'resource_monitoring': resource_monitoring
+        }
+
+    def store_report(self, report: Dict):
+        """Persist a report through the OracleDBHandler writers"""
+        self.db_handler.insert_anomalies_into_db(report['process_anomalies'])
+        self.db_handler._insert_results_to_db(report['process_scan'])
+        self.db_handler._insert_integrity_results_to_db(report['system_integrity'])
+        self.db_handler._insert_resource_results_to_db(report['resource_monitoring'])
+
+    def collect(self, device_config: DeviceConfig, store: bool = True) -> Dict:
+        """
+        Collect a report from one device
+
+        Args:
+            device_config: Device to collect from
+            store: Persist the report when a db_handler is configured
+
+        Returns:
+            {"status": "success", "report": ...} or {"status": "failed", "message": ...}
+        """
+        started = time.monotonic()
+        try:
+            report = self.build_report(device_config.host, self._run_agent(device_config))
+            result = {"status": "success", "report": report}
+            if store and self.db_handler is not None:
+                # Writers share one Oracle connection, so persist one report at a time
+                with self._db_lock:
+                    self.store_report(report)
+        except Exception as e:
+            logger.error(f"Remote collection failed on {device_config.host}: {e}")
+            result = {"status": "failed", "message": str(e)}
+        result.update(host=device_config.host, duration=time.monotonic() - started)
+        return result
+
+    def collect_many(self, devices: Dict[str, DeviceConfig], max_concurrency: int = 16,
+                     store: bool = True) -> Iterator[Dict]:
+        """Collect from many devices concurrently, yielding results in completion order"""
+        executor = ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(devices) or 1)))
+        try:
+            futures = {executor.submit(self.collect, config, store): name for name, config in devices.items()}
+            for future in as_completed(futures):
+                yield dict(future.result(), device=futures[future])
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
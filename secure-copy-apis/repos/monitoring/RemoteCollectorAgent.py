@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Remote collector agent for the System Security Monitor
+Sent to managed devices over SSH and run as `python3 -`; reads /proc directly,
+uses only the standard library and writes one gzip-compressed JSON document to stdout
+"""
+
+import gzip
+import json
+import os
+import socket
+import sys
+import time
+
+CPU_SAMPLE_SECONDS = 0.5
+CRITICAL_FILES = ['/etc/passwd', '/etc/shadow', '/etc/hosts', '/etc/crontab', '/etc/sudoers']
+SENSITIVE_DIRS = ['/etc', '/usr/bin', '/usr/sbin']
+PSEUDO_FILESYSTEMS = {'proc', 'sysfs', 'devtmpfs', 'devpts', 'tmpfs', 'cgroup', 'cgroup2', 'pstore',
+                      'securityfs', 'debugfs', 'tracefs', 'mqueue', 'hugetlbfs', 'configfs', 'fusectl',
+                      'bpf', 'autofs', 'binfmt_misc', 'overlay', 'squashfs', 'nsfs', 'rpc_pipefs'}
+SOCKET_TABLES = ['/proc/net/tcp', '/proc/net/tcp6', '/proc/net/udp', '/proc/net/udp6']
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def total_jiffies():
+    return sum(int(v) for v in read('/proc/stat').split('\n', 1)[0].split()[1:])
+
+
+def cpu_busy_jiffies():
+    values = [int(v) for v in read('/proc/stat').split('\n', 1)[0].split()[1:]]
+    idle = values[3] + (values[4] if len(values) > 4 else 0)
+    return sum(values) - idle, sum(values)
+
+
+def process_times():
+    times = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            stat = read(f'/proc/{entry}/stat')
+        except OSError:
+            continue
+        # The command name may contain spaces, so split after its closing parenthesis
+        fields = stat[stat.rindex(')') + 2:].split()
+        times[int(entry)] = (int(fields[11]) + int(fields[12]), int(fields[19]), int(fields[21]),
+                             stat[stat.index('(') + 1:stat.rindex(')')])
+    return times
+
+
+def meminfo():
+    info = {}
+    for line in read('/proc/meminfo').splitlines():
+        name, value = line.split(':', 1)
+        info[name] = int(value.split()[0]) * 1024
+    return info
+
+
+def socket_inodes():
+    inodes = set()
+    for table in SOCKET_TABLES:
+        try:
+            lines = read(table).splitlines()[1:]
+        except OSError:
+            continue
+        for line in lines:
+            fields = line.split()
+            if len(fields) > 9:
+                inodes.add(fields[9])
+    return inodes
+
+
+def process_connections(pid, inodes):
+    count = 0
+    try:
+        for fd in os.listdir(f'/proc/{pid}/fd'):
+            try:
+                target = os.readlink(f'/proc/{pid}/fd/{fd}')
+            except OSError:
+                continue
+            if target.startswith('socket:[') and target[8:-1] in inodes:
+                count += 1
+    except OSError:
+        return None
+    return count
+
+
+def collect_processes(memory_total, boot_time, clock_ticks, page_size):
+    before = process_times()
+    total_before = total_jiffies()
+    time.sleep(CPU_SAMPLE_SECONDS)
+    after = process_times()
+    total_elapsed = max(total_jiffies() - total_before, 1)
+    cpu_count = os.cpu_count() or 1
+    inodes = socket_inodes()
+
+    processes = []
+    for pid, (jiffies, start_ticks, rss_pages, name) in after.items():
+        try:
+            cmdline = [part for part in read(f'/proc/{pid}/cmdline').split('\0') if part]
+        except OSError:
+            continue
+        previous = before.get(pid)
+        busy = jiffies - previous[0] if previous and previous[1] == start_ticks else 0
+        processes.append({
+            'pid': pid,
+            'name': name,
+            'cmdline': cmdline,
+            # Same scale as psutil: 100% per fully used core
+            'cpu_percent': round(busy / total_elapsed * 100 * cpu_count, 1),
+            'memory_percent': round(rss_pages * page_size / memory_total * 100, 2) if memory_total else 0.0,
+            'create_time': boot_time + start_ticks / clock_ticks,
+            'connections': process_connections(pid, inodes)
+        })
+    return processes, len(inodes)
+
+
+def collect_integrity():
+    system_files = {}
+    for path in CRITICAL_FILES:
+        try:
+            stat_info = os.stat(path)
+        except OSError:
+            continue
+        system_files[path] = {
+            'size': stat_info.st_size,
+            'mtime': stat_info.st_mtime,
+            'permissions': oct(stat_info.st_mode)[-3:]
+        }
+    world_writable = []
+    for directory in SENSITIVE_DIRS:
+        for root, _, files in os.walk(directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if os.stat(path).st_mode & 0o002:
+                        world_writable.append(path)
+                except OSError:
+                    continue
+    return system_files, world_writable
+
+
+def collect_disks():
+    disks = {}
+    for line in read('/proc/mounts').splitlines():
+        fields = line.split()
+        if len(fields) < 3 or fields[2] in PSEUDO_FILESYSTEMS or fields[1] in disks:
+            continue
+        try:
+            usage = os.statvfs(fields[1])
+        except OSError:
+            continue
+        total = usage.f_blocks * usage.f_frsize
+        if not total:
+            continue
+        free = usage.f_bavail * usage.f_frsize
+        used = (usage.f_blocks - usage.f_bfree) * usage.f_frsize
+        disks[fields[1]] = {'total': total, 'used': used, 'free': free, 'percent': used / total * 100}
+    return disks
+
+
+def main():
+    clock_ticks = os.sysconf('SC_CLK_TCK')
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    boot_time = time.time() - float(read('/proc/uptime').split()[0])
+    memory = meminfo()
+    memory_total = memory.get('MemTotal', 0)
+    memory_available = memory.get('MemAvailable', memory.get('MemFree', 0))
+
+    busy_before, total_before = cpu_busy_jiffies()
+    processes, connection_count = collect_processes(memory_total, boot_time, clock_ticks, page_size)
+    busy_after, total_after = cpu_busy_jiffies()
+    system_files, world_writable = collect_integrity()
+    uname = os.uname()
+
+    document = {
+        'timestamp': time.time(),
+        'system_info': {'hostname': socket.gethostname(), 'system': uname.sysname, 'release': uname.release},
+        'processes': processes,
+        'system_files': system_files,
+        'world_writable': world_writable,
+        'resources': {
+            'cpu_usage': round((busy_after - busy_before) / max(total_after - total_before, 1) * 100, 1),
+            'memory_usage': round((memory_total - memory_available) / memory_total * 100, 1) if memory_total else 0.0,
+            'disk_usage': collect_disks(),
+            'network_connections': connection_count,
+            'load_average': list(os.getloadavg())
+        }
+    }
+    payload = json.dumps(document, separators=(',', ':')).encode('utf-8')
+    sys.stdout.buffer.write(gzip.compress(payload))
+    sys.stdout.buffer.flush()
+
+
+if __name__ == '__main__':
+    main()
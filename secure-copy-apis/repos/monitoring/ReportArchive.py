@@ -0,0 +1,211 @@
+"""
+Append-only archive of security reports
+Gzip-compressed NDJSON segments with a binary time index and retention
+"""
+
+import bisect
+import gzip
+import json
+import logging
+import os
+import struct
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Index entries are (report epoch seconds, byte offset of the report's gzip member)
+INDEX_ENTRY = struct.Struct('<dQ')
+SEGMENT_PREFIX = 'reports-'
+SEGMENT_SUFFIX = '.ndjson.gz'
+INDEX_SUFFIX = '.idx'
+
+
+class ReportArchive:
+    """Stores reports in size/time-rotated segments that can be range-read by seeking"""
+
+    def __init__(self, directory: str = "/tmp/security_reports", max_segment_bytes: int = 16 * 1024 * 1024,
+                 max_segment_seconds: int = 3600, retention_seconds: Optional[int] = 7 * 24 * 3600,
+                 max_total_bytes: Optional[int] = 1024 * 1024 * 1024, compress_level: int = 6):
+        """
+        Initialize the archive
+
+        Args:
+            directory: Directory holding the segment and index files
+            max_segment_bytes: Rotate the active segment once it reaches this size
+            max_segment_seconds: Rotate the active segment once it spans this long
+            retention_seconds: Drop segments whose reports are all older than this
+            max_total_bytes: Drop the oldest segments while the archive is larger than this
+            compress_level: gzip level used for each report
+        """
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_seconds = max_segment_seconds
+        self.retention_seconds = retention_seconds
+        self.max_total_bytes = max_total_bytes
+        self.compress_level = compress_level
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _report_time(report: Dict) -> float:
+        try:
+            return datetime.fromisoformat(report['timestamp']).timestamp()
+        except (KeyError, TypeError, ValueError):
+            return time.time()
+
+    def _segment_path(self, start: float) -> str:
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{int(start * 1000):015d}{SEGMENT_SUFFIX}")
+
+    def list_segments(self) -> List[Tuple[float, str]]:
+        """Return (start epoch seconds, path) of all segments, oldest first"""
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                try:
+                    start = int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]) / 1000
+                except ValueError:
+                    continue
+                segments.append((start, os.path.join(self.directory, name)))
+        segments.sort()
+        return segments
+
+    @staticmethod
+    def _read_index(segment_path: str) -> Tuple[List[float], List[int]]:
+        timestamps, offsets = [], []
+        try:
+            with open(segment_path + INDEX_SUFFIX, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return timestamps, offsets
+        usable = len(data) - len(data) % INDEX_ENTRY.size
+        for timestamp, offset in INDEX_ENTRY.iter_unpack(data[:usable]):
+            timestamps.append(timestamp)
+            offsets.append(offset)
+        return timestamps, offsets
+
+    def append(self, report: Dict) -> str:
+        """
+        Append a report to the active segment, rotating and applying retention as needed
+
+        Returns:
+            Path of the segment the report was written to
+        """
+        timestamp = self._report_time(report)
+        member = gzip.compress(
+            (json.dumps(report, separators=(',', ':'), default=str) + '\n').encode('utf-8'),
+            compresslevel=self.compress_level
+        )
+
+        with self._lock:
+            segments = self.list_segments()
+            path = None
+            if segments:
+                start, last_path = segments[-1]
+                if (os.path.getsize(last_path) < self.max_segment_bytes
+                        and timestamp - start < self.max_segment_seconds
+                        and timestamp >= start):
+                    path = last_path
+            if path is None:
+                path = self._segment_path(timestamp)
+                rotated = True
+            else:
+                rotated = False
+
+            with open(path, 'ab') as f:
+                offset = f.tell()
+                f.write(member)
+            with open(path + INDEX_SUFFIX, 'ab') as f:
+                f.write(INDEX_ENTRY.pack(timestamp, offset))
+
+            if rotated:
+                self._apply_retention()
+        return path
+
+    def _remove_segment(self, path: str):
+        for file_path in (path, path + INDEX_SUFFIX):
+            try:
+                os.unlink(file_path)
+            except FileNotFoundError:
+                pass
+        logger.info(f"Removed report segment {path}")
+
+    def _apply_retention(self):
+        segments = self.list_segments()
+        # Never remove the active (newest) segment
+        removable = segments[:-1]
+
+        if self.retention_seconds is not None:
+            cutoff = time.time() - self.retention_seconds
+            kept = []
+            for i, (start, path) in enumerate(removable):
+                # A segment ends where the next one starts
+                if segments[i + 1][0] < cutoff:
+                    self._remove_segment(path)
+                else:
+                    kept.append((start, path))
+            removable = kept
+
+        if self.max_total_bytes is not None:
+            total = self.disk_usage()
+            for _, path in removable:
+                if total <= self.max_total_bytes:
+                    break
+                total -= self._segment_bytes(path)
+                self._remove_segment(path)
+
+    def apply_retention(self):
+        """Drop segments outside the retention policy"""
+        with self._lock:
+            self._apply_retention()
+
+    def read_range(self, start: Optional[float] = None, end: Optional[float] = None) -> Iterator[Dict]:
+        """
+        Yield reports with start <= timestamp <= end, oldest first
+
+        Only segments overlapping the range are opened, and each is entered
+        at the first matching report using its index.
+        """
+        start = float('-inf') if start is None else start
+        end = float('inf') if end is None else end
+        segments = self.list_segments()
+
+        for i, (segment_start, path) in enumerate(segments):
+            segment_end = segments[i + 1][0] if i + 1 < len(segments) else float('inf')
+            if segment_end < start or segment_start > end:
+                continue
+            timestamps, offsets = self._read_index(path)
+            position = bisect.bisect_left(timestamps, start)
+            if position == len(timestamps):
+                continue
+            remaining = len(timestamps) - position
+            try:
+                with open(path, 'rb') as raw:
+                    raw.seek(offsets[position])
+                    # Each report is its own gzip member, so decoding can resume at any offset
+                    with gzip.GzipFile(fileobj=raw) as f:
+                        for line in f:
+                            if remaining == 0:
+                                break
+                            remaining -= 1
+                            report = json.loads(line)
+                            if self._report_time(report) > end:
+                                return
+                            yield report
+            except (OSError, EOFError) as e:
+                # A crash mid-append can leave a truncated trailing member
+                logger.warning(f"Stopped reading report segment {path}: {e}")
+
+    @staticmethod
+    def _segment_bytes(path: str) -> int:
+        total = 0
+        for file_path in (path, path + INDEX_SUFFIX):
+            if os.path.exists(file_path):
+                total += os.path.getsize(file_path)
+        return total
+
+    def disk_usage(self) -> int:
+        """Return the total bytes used by segments and indexes"""
+        return sum(self._segment_bytes(path) for _, path in self.list_segments())
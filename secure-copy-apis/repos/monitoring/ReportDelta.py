@@ -0,0 +1,221 @@
+"""
+Delta encoding for security reports
+Emits only additions, removals and changed values between scans, with periodic keyframes
+"""
+
+import copy
+import math
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Keyed row lists per report section: list name -> identifying field
+KEYED_LISTS = {
+    'process_scan': {
+        'high_resource_processes': 'pid',
+        'network_processes': 'pid',
+        'suspicious_processes': 'pid',
+    },
+}
+
+# Mappings of name -> attributes per report section
+KEYED_MAPPINGS = {
+    'system_integrity': ['system_files'],
+    'resource_monitoring': ['disk_usage'],
+}
+
+# Plain lists of strings per report section, as (parent key, list key)
+STRING_SETS = {
+    'system_integrity': [('permissions', 'world_writable')],
+}
+
+# Sections that are already incremental and pass through unchanged
+PASSTHROUGH_SECTIONS = ('process_anomalies',)
+
+REPORT_SECTIONS = ('process_anomalies', 'process_scan', 'system_integrity', 'resource_monitoring')
+
+
+def _values_differ(previous: Any, current: Any, rel_tol: float, abs_tol: float) -> bool:
+    if isinstance(previous, (int, float)) and isinstance(current, (int, float)) \
+            and not isinstance(previous, bool) and not isinstance(current, bool):
+        return not math.isclose(previous, current, rel_tol=rel_tol, abs_tol=abs_tol)
+    return previous != current
+
+
+def _row_differs(previous: Dict, current: Dict, rel_tol: float, abs_tol: float) -> bool:
+    if previous.keys() != current.keys():
+        return True
+    return any(_values_differ(previous[k], current[k], rel_tol, abs_tol) for k in current)
+
+
+def diff_rows(previous: List[Dict], current: List[Dict], key: str, rel_tol: float = 0.01,
+              abs_tol: float = 0.5) -> List[Dict]:
+    """
+    Diff two row lists identified by a key field
+
+    Returns:
+        Added and changed rows with their current values, and removed rows
+        with their last known values, each tagged with a 'change' field
+    """
+    previous_by_key = {row.get(key): row for row in previous}
+    current_keys = set()
+    changes = []
+    for row in current:
+        row_key = row.get(key)
+        current_keys.add(row_key)
+        old = previous_by_key.get(row_key)
+        if old is None:
+            changes.append(dict(row, change='added'))
+        elif _row_differs(old, row, rel_tol, abs_tol):
+            changes.append(dict(row, change='changed'))
+    for row_key, old in previous_by_key.items():
+        if row_key not in current_keys:
+            changes.append(dict(old, change='removed'))
+    return changes
+
+
+def diff_mapping(previous: Dict[str, Dict], current: Dict[str, Dict], rel_tol: float = 0.01,
+                 abs_tol: float = 0.5) -> Dict[str, Dict]:
+    """Diff two name -> attributes mappings, tagging entries like diff_rows()"""
+    changes = {}
+    for name, attributes in current.items():
+        old = previous.get(name)
+        if old is None:
+            changes[name] = dict(attributes, change='added')
+        elif _row_differs(old, attributes, rel_tol, abs_tol):
+            changes[name] = dict(attributes, change='changed')
+    for name, old in previous.items():
+        if name not in current:
+            changes[name] = dict(old, change='removed')
+    return changes
+
+
+class ReportDeltaEncoder:
+    """
+    Keeps previous report sections and encodes new ones as deltas
+
+    encode_section() diffs each section against the one before it, for a
+    single consumer such as the database writers. encode() serves many
+    clients: it keeps the last `history` reports by sequence and diffs
+    against whichever one the caller holds, so clients polling at their own
+    pace each get deltas.
+    """
+
+    def __init__(self, keyframe_interval: int = 10, rel_tol: float = 0.01, abs_tol: float = 0.5,
+                 history: int = 32):
+        """
+        Initialize the encoder
+
+        Args:
+            keyframe_interval: Emit a full section every N encodes (1 disables deltas)
+            rel_tol: Relative tolerance under which numeric values count as unchanged
+            abs_tol: Absolute tolerance under which numeric values count as unchanged
+            history: Reports kept for encode(); older base sequences get a keyframe
+        """
+        self.keyframe_interval = max(1, keyframe_interval)
+        self.rel_tol = rel_tol
+        self.abs_tol = abs_tol
+        self.history = max(1, history)
+        self.sequence = 0
+        self._previous: Dict[str, Dict] = {}
+        self._counts: Dict[str, int] = {}
+        # sequence -> (sections, reports since the last keyframe in its chain)
+        self._reports: 'OrderedDict[int, Tuple[Dict[str, Dict], int]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _diff_section(self, section: str, previous: Dict, results: Dict) -> Dict:
+        encoded = dict(results, delta={'mode': 'delta'})
+        for name, key in KEYED_LISTS.get(section, {}).items():
+            encoded[name] = diff_rows(previous.get(name, []), results.get(name, []), key,
+                                      self.rel_tol, self.abs_tol)
+        for name in KEYED_MAPPINGS.get(section, []):
+            encoded[name] = diff_mapping(previous.get(name, {}), results.get(name, {}),
+                                         self.rel_tol, self.abs_tol)
+        for parent, name in STRING_SETS.get(section, []):
+            old = set(previous.get(parent, {}).get(name, []))
+            new = results.get(parent, {}).get(name, [])
+            new_set = set(new)
+            encoded[parent] = dict(
+                encoded[parent],
+                **{name: [item for item in new if item not in old],
+                   f"{name}_removed": sorted(old - new_set)}
+            )
+        return encoded
+
+    def encode_section(self, section: str, results: Any, force_keyframe: bool = False) -> Any:
+        """
+        Encode one report section against the previous one
+
+        Args:
+            section: Report key, e.g. 'process_scan'
+            results: Section results as produced by SystemSecurityMonitor
+            force_keyframe: Emit the full section regardless of the keyframe interval
+
+        Returns:
+            The section in its usual shape; in delta mode keyed lists and
+            mappings only hold changed entries tagged with 'change', string
+            lists hold additions and a '<name>_removed' list holds removals.
+            A 'delta' entry records the mode.
+        """
+        if section in PASSTHROUGH_SECTIONS or not isinstance(results, dict):
+            return results
+
+        with self._lock:
+            count = self._counts.get(section, 0)
+            previous = self._previous.get(section)
+            keyframe = force_keyframe or previous is None or count % self.keyframe_interval == 0
+            self._counts[section] = count + 1
+            self._previous[section] = copy.deepcopy(results)
+            if keyframe:
+                return dict(results, delta={'mode': 'keyframe'})
+            return self._diff_section(section, previous, results)
+
+    def encode(self, report: Dict, base_sequence: Optional[int] = None) -> Dict:
+        """
+        Encode a full report against a report the caller already holds
+
+        Args:
+            report: Report from generate_security_report()
+            base_sequence: Sequence the caller holds (default the latest); one
+                that is no longer kept forces a keyframe
+
+        Returns:
+            The report with every section encoded, plus 'sequence',
+            'base_sequence' and 'mode' ('keyframe' or 'delta')
+        """
+        sections = {section: results for section, results in report.items()
+                    if section in REPORT_SECTIONS and section not in PASSTHROUGH_SECTIONS
+                    and isinstance(results, dict)}
+        # Held for the whole encode, so concurrent callers neither diff against
+        # each other's reports nor report the wrong base
+        with self._lock:
+            if base_sequence is None:
+                base_sequence = self.sequence
+            base = self._reports.get(base_sequence)
+            # A report-level keyframe must cover every section at once
+            keyframe = (base is None or base[1] + 1 >= self.keyframe_interval
+                        or any(section not in base[0] for section in sections))
+            self.sequence += 1
+            sequence = self.sequence
+
+            encoded = dict(report)
+            for section, results in sections.items():
+                if keyframe:
+                    encoded[section] = dict(results, delta={'mode': 'keyframe'})
+                else:
+                    encoded[section] = self._diff_section(section, base[0][section], results)
+            self._reports[sequence] = (copy.deepcopy(sections), 0 if keyframe else base[1] + 1)
+            while len(self._reports) > self.history:
+                self._reports.popitem(last=False)
+
+        encoded['sequence'] = sequence
+        encoded['base_sequence'] = None if keyframe else base_sequence
+        encoded['mode'] = 'keyframe' if keyframe else 'delta'
+        return encoded
+
+    def reset(self):
+        """Forget previous sections and reports so the next encode is a keyframe"""
+        with self._lock:
+            self._previous.clear()
+            self._counts.clear()
+            self._reports.clear()
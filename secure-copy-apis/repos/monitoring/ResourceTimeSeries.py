@@ -0,0 +1,280 @@
+"""
+In-memory time series of system resource samples
+Fixed-size ring buffers with automatic 1s -> 1m -> 1h rollups
+"""
+
+import threading
+import time
+from array import array
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+RESOURCE_METRICS = (
+    'cpu_usage',
+    'memory_usage',
+    'load_1',
+    'load_5',
+    'load_15',
+    'disk_usage',
+    'network_connections',
+)
+
+
+class RingBuffer:
+    """Array-backed ring of (timestamp, row) entries with a fixed row width"""
+
+    def __init__(self, capacity: int, width: int):
+        self.capacity = capacity
+        self.width = width
+        self.timestamps = array('d', bytes(8 * capacity))
+        self.values = array('d', bytes(8 * capacity * width))
+        self.start = 0
+        self.size = 0
+
+    def append(self, timestamp: float, row: Sequence[float]):
+        """Store a row, overwriting the oldest entry once full"""
+        if self.size < self.capacity:
+            slot = (self.start + self.size) % self.capacity
+            self.size += 1
+        else:
+            slot = self.start
+            self.start = (self.start + 1) % self.capacity
+        self.timestamps[slot] = timestamp
+        offset = slot * self.width
+        self.values[offset:offset + self.width] = array('d', row)
+
+    def _slot(self, index: int) -> int:
+        return (self.start + index) % self.capacity
+
+    def _timestamp_at(self, index: int) -> float:
+        return self.timestamps[self._slot(index)]
+
+    def _lower_bound(self, timestamp: float) -> int:
+        # Timestamps are appended in order, so a binary search over logical indexes works
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self._timestamp_at(middle) < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def oldest(self) -> Optional[float]:
+        return self._timestamp_at(0) if self.size else None
+
+    def range(self, start: float, end: float) -> List[Tuple[float, List[float]]]:
+        """Return entries with start <= timestamp <= end"""
+        rows = []
+        index = self._lower_bound(start)
+        while index < self.size:
+            slot = self._slot(index)
+            timestamp = self.timestamps[slot]
+            if timestamp > end:
+                break
+            offset = slot * self.width
+            rows.append((timestamp, self.values[offset:offset + self.width].tolist()))
+            index += 1
+        return rows
+
+
+class _RollupTier:
+    """Aggregates incoming buckets into min/max/avg rows of a coarser resolution"""
+
+    def __init__(self, resolution: int, capacity: int, metric_count: int):
+        self.resolution = resolution
+        self.metric_count = metric_count
+        # Each row holds min, max, avg per metric followed by the sample count
+        self.buffer = RingBuffer(capacity, metric_count * 3 + 1)
+        self.bucket: Optional[float] = None
+        self._reset_accumulators()
+
+    def _reset_accumulators(self):
+        self.mins = [float('inf')] * self.metric_count
+        self.maxs = [float('-inf')] * self.metric_count
+        self.sums = [0.0] * self.metric_count
+        self.count = 0
+
+    def add(self, timestamp: float, mins: Sequence[float], maxs: Sequence[float],
+            avgs: Sequence[float], count: int) -> Optional[Tuple]:
+        """
+        Fold a sample (count=1) or a finer rollup into the current bucket
+
+        Returns:
+            The closed (timestamp, mins, maxs, avgs, count) bucket when the
+            sample starts a new one, otherwise None
+        """
+        bucket = timestamp - (timestamp % self.resolution)
+        closed = None
+        if self.bucket is not None and bucket != self.bucket:
+            closed = self.flush()
+        self.bucket = bucket
+        for i in range(self.metric_count):
+            self.mins[i] = min(self.mins[i], mins[i])
+            self.maxs[i] = max(self.maxs[i], maxs[i])
+            self.sums[i] += avgs[i] * count
+        self.count += count
+        return closed
+
+    def flush(self) -> Optional[Tuple]:
+        """Write the open bucket to the ring and return it"""
+        if self.bucket is None or self.count == 0:
+            return None
+        avgs = [total / self.count for total in self.sums]
+        closed = (self.bucket, list(self.mins), list(self.maxs), avgs, self.count)
+        self.buffer.append(self.bucket, self.mins + self.maxs + avgs + [self.count])
+        self.bucket = None
+        self._reset_accumulators()
+        return closed
+
+    def current(self) -> Optional[Tuple[float, List[float]]]:
+        """Return the still-open bucket in ring row layout"""
+        if self.bucket is None or self.count == 0:
+            return None
+        avgs = [total / self.count for total in self.sums]
+        return self.bucket, self.mins + self.maxs + avgs + [self.count]
+
+
+class ResourceTimeSeries:
+    """Constant-memory store of recent resource samples and their rollups"""
+
+    RESOLUTIONS = ('1s', '1m', '1h')
+
+    def __init__(self, raw_capacity: int = 3600, minute_capacity: int = 1440, hour_capacity: int = 720,
+                 metrics: Sequence[str] = RESOURCE_METRICS):
+        """
+        Initialize the time series
+
+        Args:
+            raw_capacity: Number of 1s samples kept (default one hour)
+            minute_capacity: Number of 1m rollups kept (default one day)
+            hour_capacity: Number of 1h rollups kept (default thirty days)
+            metrics: Names of the stored metrics
+        """
+        self.metrics = tuple(metrics)
+        self.raw = RingBuffer(raw_capacity, len(self.metrics))
+        self.minutes = _RollupTier(60, minute_capacity, len(self.metrics))
+        self.hours = _RollupTier(3600, hour_capacity, len(self.metrics))
+        self._last_timestamp: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def values_from_results(results: Dict) -> Dict[str, float]:
+        """Extract metric values from a monitor_system_resources() result"""
+        load_average = results.get('load_average') or (0.0, 0.0, 0.0)
+        disk_percents = [disk['percent'] for disk in results.get('disk_usage', {}).values()]
+        return {
+            'cpu_usage': results.get('cpu_usage', 0.0),
+            'memory_usage': results.get('memory_usage', 0.0),
+            'load_1': load_average[0],
+            'load_5': load_average[1],
+            'load_15': load_average[2],
+            'disk_usage': max(disk_percents) if disk_percents else 0.0,
+            'network_connections': results.get('network_connections', 0),
+        }
+
+    def add_results(self, results: Dict):
+        """Record a monitor_system_resources() result"""
+        try:
+            timestamp = datetime.fromisoformat(results['timestamp']).timestamp()
+        except (KeyError, TypeError, ValueError):
+            timestamp = time.time()
+        self.record(self.values_from_results(results), timestamp)
+
+    def record(self, values: Dict[str, float], timestamp: Optional[float] = None):
+        """
+        Record one sample at 1s resolution
+
+        Args:
+            values: Metric name to value; missing metrics are stored as 0
+            timestamp: Epoch seconds, defaults to now
+        """
+        timestamp = float(int(time.time() if timestamp is None else timestamp))
+        row = [float(values.get(metric) or 0.0) for metric in self.metrics]
+
+        with self._lock:
+            # Samples must be monotonic for the ring's binary search
+            if self._last_timestamp is not None and timestamp <= self._last_timestamp:
+                return
+            self._last_timestamp = timestamp
+            self.raw.append(timestamp, row)
+
+            closed_minute = self.minutes.add(timestamp, row, row, row, 1)
+            if closed_minute:
+                bucket, mins, maxs, avgs, count = closed_minute
+                self.hours.add(bucket, mins, maxs, avgs, count)
+
+    def _pick_resolution(self, start: float) -> str:
+        for resolution, oldest in (('1s', self.raw.oldest()), ('1m', self.minutes.buffer.oldest())):
+            if oldest is not None and oldest <= start:
+                return resolution
+        return '1h'
+
+    def query(self, start: Optional[float] = None, end: Optional[float] = None,
+              resolution: str = 'auto', metrics: Optional[Sequence[str]] = None) -> Dict:
+        """
+        Return points in a time range from memory
+
+        Args:
+            start: Range start in epoch seconds (default one hour ago)
+            end: Range end in epoch seconds (default now)
+            resolution: '1s', '1m', '1h' or 'auto' for the finest tier covering start
+            metrics: Subset of metric names (default all)
+
+        Returns:
+            Dictionary with the resolution used and a list of points; rollup
+            points carry min/max/avg per metric
+        """
+        end = time.time() if end is None else end
+        start = end - 3600 if start is None else start
+        selected = [metric for metric in (metrics or self.metrics) if metric in self.metrics]
+        if not selected:
+            raise ValueError(f"Unknown metrics, expected any of: {', '.join(self.metrics)}")
+        indexes = [self.metrics.index(metric) for metric in selected]
+        width = len(self.metrics)
+
+        with self._lock:
+            if resolution == 'auto':
+                resolution = self._pick_resolution(start)
+            if resolution == '1s':
+                rows = self.raw.range(start, end)
+            elif resolution in ('1m', '1h'):
+                tier = self.minutes if resolution == '1m' else self.hours
+                rows = tier.buffer.range(start, end)
+                # The open bucket is included; the open hour covers completed minutes only
+                current = tier.current()
+                if current and start <= current[0] <= end:
+                    rows.append(current)
+            else:
+                raise ValueError(f"Unsupported resolution '{resolution}', expected one of: auto, {', '.join(self.RESOLUTIONS)}")
+
+        points = []
+        for timestamp, row in rows:
+            point = {'timestamp': datetime.fromtimestamp(timestamp).isoformat()}
+            for metric, i in zip(selected, indexes):
+                if resolution == '1s':
+                    point[metric] = row[i]
+                else:
+                    point[metric] = {'min': row[i], 'max': row[width + i], 'avg': row[2 * width + i]}
+            if resolution != '1s':
+                point['samples'] = int(row[3 * width])
+            points.append(point)
+
+        return {
+            'resolution': resolution,
+            'start': datetime.fromtimestamp(start).isoformat(),
+            'end': datetime.fromtimestamp(end).isoformat(),
+            'metrics': selected,
+            'points': points,
+        }
+
+    def latest(self) -> Optional[Dict]:
+        """Return the most recent 1s sample"""
+        with self._lock:
+            if not self.raw.size:
+                return None
+            slot = self.raw._slot(self.raw.size - 1)
+            offset = slot * self.raw.width
+            point = {'timestamp': datetime.fromtimestamp(self.raw.timestamps[slot]).isoformat()}
+            point.update(zip(self.metrics, self.raw.values[offset:offset + self.raw.width].tolist()))
+            return point
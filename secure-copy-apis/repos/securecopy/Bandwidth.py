@@ -0,0 +1,208 @@
+"""
+Bandwidth shaping for transfers
+Token buckets per host and per transfer, with headroom held back for interactive operations
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional
+
+
+def check_limit(rate: float, burst: Optional[float] = None, interactive_share: Optional[float] = None):
+    """
+    Reject limits a TokenBucket cannot work with
+
+    Raises:
+        ValueError: rate or burst is not positive, or interactive_share is outside [0, 1)
+    """
+    if not rate > 0:
+        raise ValueError(f"rate must be positive, got {rate}")
+    if burst is not None and not burst > 0:
+        raise ValueError(f"burst must be positive, got {burst}")
+    if interactive_share is not None and not 0 <= interactive_share < 1:
+        raise ValueError(f"interactive_share must be at least 0 and below 1, got {interactive_share}")
+
+
+class TokenBucket:
+    """
+    Reservation-based token bucket
+
+    Callers take tokens immediately and go into debt when the bucket is
+    empty, then sleep off their share of the debt. Waiters are therefore
+    served in arrival order, so transfers sending equal-sized chunks through
+    one bucket share it evenly.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        """
+        Initialize the bucket
+
+        Args:
+            rate: Sustained bytes per second
+            burst: Bytes that may be sent at once after an idle period (default one second's worth)
+        """
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: int, rate: Optional[float] = None) -> float:
+        """Take tokens and return how long the caller must wait before sending"""
+        rate = rate or self.rate
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * rate)
+            self._updated = now
+            self._tokens -= amount
+            return -self._tokens / rate if self._tokens < 0 else 0.0
+
+    def consume(self, amount: int, rate: Optional[float] = None):
+        delay = self.reserve(amount, rate)
+        if delay:
+            time.sleep(delay)
+
+
+class HostLimiter:
+    """Bucket for one host that slows bulk traffic while interactive operations run"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None, interactive_share: float = 0.5):
+        """
+        Initialize the limiter
+
+        Args:
+            rate: Bytes per second allowed to bulk transfers on this host
+            burst: Bucket size in bytes
+            interactive_share: Fraction of the rate withheld from bulk transfers
+                while an interactive operation is in progress
+        """
+        self.bucket = TokenBucket(rate, burst)
+        self.interactive_share = min(max(interactive_share, 0.0), 0.95)
+        self.interactive = 0
+
+    @property
+    def rate(self) -> float:
+        return self.bucket.rate
+
+    def effective_rate(self) -> float:
+        if self.interactive:
+            return self.bucket.rate * (1 - self.interactive_share)
+        return self.bucket.rate
+
+    def reserve(self, amount: int) -> float:
+        return self.bucket.reserve(amount, self.effective_rate())
+
+    def to_dict(self) -> Dict:
+        return {
+            'rate': self.bucket.rate,
+            'burst': self.bucket.burst,
+            'interactive_share': self.interactive_share,
+            'interactive_operations': self.interactive,
+            'effective_rate': self.effective_rate()
+        }
+
+
+class BandwidthManager:
+    """Registry of per-host limits shared by every transfer in the process"""
+
+    def __init__(self):
+        self._hosts: Dict[str, HostLimiter] = {}
+        self._interactive: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # Set in transfer worker processes, where limits live in the API process rather than here
+        self.shaper_factory: Optional[Callable[[List[str], Optional[float]], Optional['TransferShaper']]] = None
+
+    def set_limit(self, host: str, rate: Optional[float], burst: Optional[float] = None,
+                  interactive_share: float = 0.5):
+        """
+        Limit bulk transfers touching a host to rate bytes/s, or remove the limit with rate=None
+
+        Raises:
+            ValueError: See check_limit
+        """
+        if rate is not None:
+            check_limit(rate, burst, interactive_share)
+        with self._lock:
+            if rate is None:
+                self._hosts.pop(host, None)
+                return
+            limiter = HostLimiter(rate, burst, interactive_share)
+            limiter.interactive = self._interactive.get(host, 0)
+            self._hosts[host] = limiter
+
+    def get_limit(self, host: str) -> Optional[HostLimiter]:
+        with self._lock:
+            return self._hosts.get(host)
+
+    def limits(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {host: limiter.to_dict() for host, limiter in self._hosts.items()}
+
+    @contextmanager
+    def interactive(self, *hosts: str):
+        """Mark an interactive operation on hosts so bulk transfers there yield headroom"""
+        with self._lock:
+            for host in hosts:
+                self._interactive[host] = self._interactive.get(host, 0) + 1
+                if host in self._hosts:
+                    self._hosts[host].interactive = self._interactive[host]
+        try:
+            yield
+        finally:
+            with self._lock:
+                for host in hosts:
+                    self._interactive[host] -= 1
+                    if not self._interactive[host]:
+                        del self._interactive[host]
+                    if host in self._hosts:
+                        self._hosts[host].interactive = self._interactive.get(host, 0)
+
+    def shaper(self, hosts: Iterable[str], rate: Optional[float] = None) -> Optional['TransferShaper']:
+        """
+        Build the shaper for one transfer
+
+        Args:
+            hosts: Hosts the bytes cross
+            rate: Optional per-transfer limit in bytes/s
+
+        Returns:
+            A TransferShaper, or None when neither the hosts nor the transfer are limited
+        """
+        if self.shaper_factory is not None:
+            return self.shaper_factory(sorted(set(hosts)), rate)
+        with self._lock:
+            limiters = [self._hosts[host] for host in set(hosts) if host in self._hosts]
+        if not limiters and not rate:
+            return None
+        # A small per-transfer burst keeps short transfers from skipping the limit entirely
+        return TransferShaper(limiters, TokenBucket(rate, min(rate, 256 * 1024)) if rate else None)
+
+
+class TransferShaper:
+    """Throttles one transfer against its hosts' limiters and its own limit"""
+
+    def __init__(self, limiters, bucket: Optional[TokenBucket] = None):
+        self.limiters = limiters
+        self.bucket = bucket
+
+    @property
+    def rate(self) -> Optional[float]:
+        """Tightest configured limit in bytes/s"""
+        rates = [limiter.rate for limiter in self.limiters]
+        if self.bucket is not None:
+            rates.append(self.bucket.rate)
+        return min(rates) if rates else None
+
+    def consume(self, amount: int):
+        """Wait until amount bytes may be sent under every applicable limit"""
+        delays = [limiter.reserve(amount) for limiter in self.limiters]
+        if self.bucket is not None:
+            delays.append(self.bucket.reserve(amount))
+        delay = max(delays, default=0.0)
+        if delay:
+            time.sleep(delay)
+
+
+# Shared by SCPManager and the API so limits apply across concurrent jobs
+host_bandwidth = BandwidthManager()
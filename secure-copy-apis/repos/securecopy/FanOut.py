@@ -0,0 +1,334 @@
+"""
+One-to-many file transfer
+Reads the source once and streams each block to every destination through a bounded shared buffer
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from repos.securecopy.Bandwidth import host_bandwidth
+from repos.securecopy.SecureCopy import (
+    CHECKSUM_COMMANDS, SFTP_REQUEST_SIZE, TRANSFER_CHUNK_SIZE, DeviceConfig, SCPManager, SSHManager, new_checksum
+)
+
+logger = logging.getLogger(__name__)
+
+SLOW_POLICIES = ('throttle', 'detach')
+# Destinations that still need chunks from the reader
+RECEIVING_STATES = ('pending', 'attached', 'detached')
+
+
+class _Destination:
+    """Progress of one destination"""
+
+    def __init__(self, name: str, device: DeviceConfig, path: str):
+        self.name = name
+        self.device = device
+        self.path = path
+        # pending -> attached -> (detached) -> done | failed
+        self.state = 'pending'
+        self.detached = False
+        self.offset = 0
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+
+    @property
+    def active(self) -> bool:
+        return self.state in ('pending', 'attached')
+
+    def to_dict(self, file_size: Optional[int]) -> Dict:
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        return {
+            'host': self.device.host,
+            'path': self.path,
+            'state': self.state,
+            'detached': self.detached,
+            'bytes_done': self.offset,
+            'bytes_total': file_size,
+            'rate': self.offset / elapsed if elapsed else None,
+            'error': self.error
+        }
+
+
+class FanOutTransfer:
+    """
+    Copy one source file to many destinations with a single source read
+
+    A reader thread fills a buffer of at most buffer_chunks chunks, and one
+    writer thread per destination drains it. With the 'throttle' policy the
+    slowest destination paces the group. With 'detach', a destination that
+    holds the reader back for detach_after seconds is moved to a catch-up
+    path: from then on, chunks are also spooled to a local temp file, which
+    detached destinations read at their own pace. The source is still read
+    exactly once.
+    """
+
+    def __init__(self, source_device: DeviceConfig, source_path: str,
+                 destinations: Dict[str, Tuple[DeviceConfig, str]], buffer_chunks: int = 16,
+                 slow_policy: str = 'detach', detach_after: float = 2.0, checksum: Optional[str] = None,
+                 chunk_size: int = TRANSFER_CHUNK_SIZE):
+        """
+        Initialize the transfer
+
+        Args:
+            source_device: Device to read from
+            source_path: File on the source device
+            destinations: name -> (device, destination path)
+            buffer_chunks: Chunks held in memory for attached destinations
+            slow_policy: 'throttle' or 'detach'
+            detach_after: Seconds the reader may be held back before the slowest destination is detached
+            checksum: Optional CHECKSUM_COMMANDS algorithm to verify every copy against
+            chunk_size: Bytes per chunk
+        """
+        if slow_policy not in SLOW_POLICIES:
+            raise ValueError(f"Unsupported slow_policy '{slow_policy}', expected one of: {', '.join(SLOW_POLICIES)}")
+        if checksum is not None and checksum not in CHECKSUM_COMMANDS:
+            raise ValueError(f"Unsupported checksum '{checksum}', expected one of: {', '.join(CHECKSUM_COMMANDS)}")
+        if not destinations:
+            raise ValueError("At least one destination is required")
+        self.source_device = source_device
+        self.source_path = source_path
+        self.destinations = {name: _Destination(name, device, path) for name, (device, path) in destinations.items()}
+        self.buffer_chunks = max(1, buffer_chunks)
+        self.slow_policy = slow_policy
+        self.detach_after = detach_after
+        self.checksum = checksum
+        self.chunk_size = chunk_size
+
+        self.file_size = None
+        self.read_offset = 0
+        self.source_digest = None
+        self.eof = False
+        self.error = None
+        self._chunks: Dict[int, bytes] = {}
+        self._spool = None
+        self._spool_base = 0
+        # Spool bytes are written outside the lock; detached destinations read only below this offset
+        self._spool_end = 0
+        self._stalled_since = None
+        self._condition = threading.Condition()
+
+    def status(self) -> Dict:
+        """Snapshot of source and per-destination progress"""
+        with self._condition:
+            return {
+                'source': {'host': self.source_device.host, 'path': self.source_path,
+                           'bytes_read': self.read_offset, 'bytes_total': self.file_size, 'eof': self.eof},
+                'buffered_chunks': len(self._chunks),
+                'spooling': self._spool is not None,
+                'destinations': {name: d.to_dict(self.file_size) for name, d in self.destinations.items()}
+            }
+
+    def run(self) -> Dict:
+        """Run the transfer to completion and return per-destination results"""
+        started = time.monotonic()
+        writers = [threading.Thread(target=self._write, args=(d,), name=f"fanout-{d.name}", daemon=True)
+                   for d in self.destinations.values()]
+        for writer in writers:
+            writer.start()
+        try:
+            self._read()
+        except Exception as e:
+            logger.error(f"Fan-out source read failed: {e}")
+            with self._condition:
+                self.error = str(e)
+                self._condition.notify_all()
+        for writer in writers:
+            writer.join()
+        if self._spool is not None:
+            self._spool.close()
+
+        duration = time.monotonic() - started
+        results = {name: dict(d.result or {}, **d.to_dict(self.file_size)) for name, d in self.destinations.items()}
+        return {
+            'success': self.error is None and all(d.state == 'done' for d in self.destinations.values()),
+            'source_path': self.source_path,
+            'file_size': self.file_size,
+            'source_bytes_read': self.read_offset,
+            'checksum': {'algorithm': self.checksum, 'source': self.source_digest} if self.checksum else None,
+            'error': self.error,
+            'duration': duration,
+            'destinations': results,
+            'transfer_time': datetime.now().isoformat()
+        }
+
+    def _lagging(self) -> Optional[_Destination]:
+        # Called with the condition held: the active destination furthest behind, if it fills the buffer
+        active = [d for d in self.destinations.values() if d.active]
+        if not active:
+            return None
+        slowest = min(active, key=lambda d: d.offset)
+        if self.read_offset - slowest.offset >= self.buffer_chunks * self.chunk_size:
+            return slowest
+        return None
+
+    def _detach(self, destination: _Destination) -> List[bytes]:
+        # Called with the condition held; returns the buffered chunks the reader must spool first
+        backfill = []
+        if self._spool is None:
+            self._spool = tempfile.TemporaryFile(buffering=0)
+            self._spool_base = self._spool_end = destination.offset
+            backfill = [self._chunks[offset] for offset in sorted(self._chunks) if offset >= self._spool_base]
+        destination.state = 'detached'
+        destination.detached = True
+        logger.info(f"Fan-out destination {destination.name} detached to catch-up path at {destination.offset} bytes")
+        self._trim()
+        return backfill
+
+    def _trim(self):
+        # Called with the condition held: drop chunks every active destination has written
+        active = [d.offset for d in self.destinations.values() if d.active]
+        floor = min(active) if active else self.read_offset
+        for offset in [o for o in self._chunks if o < floor]:
+            del self._chunks[offset]
+
+    def _publish(self, offset: int, data: bytes) -> bool:
+        """Hand a chunk to the destinations; False once none of them can use more"""
+        pending = []
+        with self._condition:
+            waited = False
+            while self.error is None:
+                slowest = self._lagging()
+                if slowest is None:
+                    break
+                # Held back chunk after chunk counts as one stall until the reader runs free again
+                now = time.monotonic()
+                self._stalled_since = self._stalled_since or now
+                waited = True
+                if self.slow_policy == 'detach' and now - self._stalled_since >= self.detach_after:
+                    pending += self._detach(slowest)
+                    self._stalled_since = None
+                    continue
+                self._condition.wait(0.1)
+            if not waited:
+                self._stalled_since = None
+            if self.error is None and not any(d.state in RECEIVING_STATES for d in self.destinations.values()):
+                self.error = "Every destination failed"
+            if self.error is not None:
+                self._condition.notify_all()
+                return False
+            if any(d.active for d in self.destinations.values()):
+                self._chunks[offset] = data
+            self.read_offset = offset + len(data)
+            spool = self._spool
+            self._condition.notify_all()
+
+        if spool is not None:
+            # Disk writes happen outside the lock so destination writers are not held up behind them
+            pending.append(data)
+            for chunk in pending:
+                spool.write(chunk)
+            with self._condition:
+                self._spool_end = self.read_offset
+                self._condition.notify_all()
+        return True
+
+    def _read(self):
+        client = SSHManager.create_ssh_client(self.source_device)
+        try:
+            sftp = client.open_sftp()
+            try:
+                size = sftp.stat(self.source_path).st_size
+                with self._condition:
+                    self.file_size = size
+                    self._condition.notify_all()
+                hasher = new_checksum(self.checksum) if self.checksum else None
+                shaper = host_bandwidth.shaper([self.source_device.host])
+                with sftp.open(self.source_path, 'rb') as f:
+                    offset = 0
+                    while offset < size:
+                        window = min(self.chunk_size, size - offset)
+                        if shaper is not None:
+                            shaper.consume(window)
+                        # Pipelined reads of one chunk keep memory bounded by the shared buffer
+                        requests = [(offset + i, min(SFTP_REQUEST_SIZE, window - i))
+                                    for i in range(0, window, SFTP_REQUEST_SIZE)]
+                        data = b''.join(f.readv(requests))
+                        if hasher:
+                            hasher.update(data)
+                        if not self._publish(offset, data):
+                            logger.error(f"Fan-out stopped reading {self.source_path}: {self.error}")
+                            return
+                        offset += len(data)
+                with self._condition:
+                    self.source_digest = hasher.hexdigest() if hasher else None
+                    self.eof = True
+                    self._condition.notify_all()
+            finally:
+                sftp.close()
+        finally:
+            client.close()
+
+    def _next_chunk(self, destination: _Destination) -> Optional[bytes]:
+        """Wait for the chunk at the destination's offset; None once it has everything"""
+        with self._condition:
+            while True:
+                if self.error is not None:
+                    raise RuntimeError(f"Source read failed: {self.error}")
+                if self.eof and destination.offset >= self.file_size:
+                    return None
+                if destination.detached:
+                    if self._spool_end > destination.offset:
+                        spool_offset = destination.offset - self._spool_base
+                        length = min(self.chunk_size, self._spool_end - destination.offset)
+                        return os.pread(self._spool.fileno(), length, spool_offset)
+                elif destination.offset in self._chunks:
+                    return self._chunks[destination.offset]
+                self._condition.wait(0.5)
+
+    def _write(self, destination: _Destination):
+        destination.started_at = time.monotonic()
+        client = None
+        try:
+            client = SSHManager.create_ssh_client(destination.device)
+            sftp = client.open_sftp()
+            shaper = host_bandwidth.shaper([destination.device.host])
+            with self._condition:
+                if destination.state == 'pending':
+                    destination.state = 'attached'
+            try:
+                with sftp.open(destination.path, 'wb') as f:
+                    f.set_pipelined(True)
+                    while True:
+                        data = self._next_chunk(destination)
+                        if data is None:
+                            break
+                        if shaper is not None:
+                            shaper.consume(len(data))
+                        f.write(data)
+                        with self._condition:
+                            destination.offset += len(data)
+                            if destination.active:
+                                self._trim()
+                            self._condition.notify_all()
+            finally:
+                sftp.close()
+
+            result = {'success': True, 'destination_path': destination.path}
+            if self.checksum:
+                SCPManager._verify_checksum(result, client, self.checksum, self.source_digest)
+            destination.result = result
+            with self._condition:
+                destination.state = 'done' if result['success'] else 'failed'
+                destination.error = result.get('error')
+        except Exception as e:
+            logger.error(f"Fan-out to {destination.name} failed: {e}")
+            with self._condition:
+                destination.state = 'failed'
+                destination.error = str(e)
+                destination.result = {'success': False, 'destination_path': destination.path, 'error': str(e)}
+                self._trim()
+                self._condition.notify_all()
+        finally:
+            destination.finished_at = time.monotonic()
+            if client is not None:
+                client.close()
@@ -0,0 +1,582 @@
+"""
+Persistent per-device index of remote listings
+Incremental refresh from directory mtimes and prefix, substring and glob search without an SSH round trip
+"""
+
+from __future__ import annotations
+
+import bisect
+import fnmatch
+import gzip
+import hashlib
+import itertools
+import json
+import logging
+import os
+import re
+import shlex
+import threading
+import time
+from array import array
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from repos.monitoring.Metrics import metrics
+from repos.securecopy.SecureCopy import DeviceConfig, SSHManager, paramiko
+
+logger = logging.getLogger(__name__)
+
+INDEX_SEARCH_SECONDS = metrics.histogram(
+    'index_search_seconds', 'File index search time by query mode and the plan that answered it', ('mode', 'plan'))
+
+SEARCH_MODES = ('substring', 'prefix', 'glob')
+ENTRY_TYPES = ('f', 'd', 'l')
+# Record fields are type, size, mtime and path, each NUL-terminated so any file name survives
+ENTRY_FORMAT = '%y\\0%s\\0%T@\\0%p\\0'
+# Marks the ends of indexed names so anchored globs like *.c still have a three-character gram
+NAME_BOUNDARY = '\0'
+# Sorts immediately after '/', so [path + '/', path + SUBTREE_END) brackets everything below path
+SUBTREE_END = chr(ord('/') + 1)
+SNAPSHOT_VERSION = 1
+# Stop intersecting posting lists once the next is this many times longer than the candidates left
+INTERSECT_RATIO = 8
+
+
+def _run(client: paramiko.SSHClient, command: str, data: bytes = b'') -> Tuple[bytes, int]:
+    """Run a command with data on stdin and return its stdout and exit code; stderr is discarded remotely"""
+    channel = client.get_transport().open_session()
+    try:
+        channel.exec_command(f"{{ {command}; }} 2>/dev/null")
+        if data:
+            channel.sendall(data)
+        channel.shutdown_write()
+        chunks = []
+        while True:
+            chunk = channel.recv(1024 * 1024)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return b''.join(chunks), channel.recv_exit_status()
+    finally:
+        channel.close()
+
+
+def parse_entries(output: str) -> Iterator[Tuple[str, str, int, float]]:
+    """(path, type, size, mtime) records from ENTRY_FORMAT output"""
+    fields = output.split('\0')
+    for i in range(0, len(fields) - 3, 4):
+        kind = fields[i] if fields[i] in ENTRY_TYPES else 'f'
+        path = fields[i + 3].rstrip('/') or '/'
+        yield path, kind, int(fields[i + 1] or 0), float(fields[i + 2] or 0)
+
+
+def _parent(path: str) -> str:
+    return path.rpartition('/')[0] or '/'
+
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _literal_runs(pattern: str) -> List[str]:
+    """
+    Literal runs of a glob with NAME_BOUNDARY where they are anchored
+
+    The first run is anchored at the start unless the pattern opens with a
+    wildcard, and the last at the end unless it closes with one.
+    """
+    runs, current, i = [], '', 0
+    anchored = True
+    while i < len(pattern):
+        char = pattern[i]
+        if char in '*?[':
+            if char == '[':
+                end = pattern.find(']', i + 2)
+                if end == -1:
+                    # fnmatch treats an unclosed [ as a literal
+                    current += char
+                    i += 1
+                    continue
+                i = end
+            if current:
+                runs.append((NAME_BOUNDARY if anchored else '') + current)
+            current, anchored = '', False
+        else:
+            current += char
+        i += 1
+    if current or not runs:
+        runs.append((NAME_BOUNDARY if anchored else '') + current + NAME_BOUNDARY)
+    return runs
+
+
+class PathIndex:
+    """
+    Immutable searchable snapshot of one device's listing
+
+    Paths are kept in one sorted array with sizes, mtimes and types in
+    parallel arrays, so a prefix is two bisects and any directory's subtree
+    is one contiguous slice. Substring and glob queries go through a trigram
+    index over the distinct lower-cased names: a query without '/' lies
+    within one path component, so the paths containing it are the entries
+    whose name matches plus those entries' subtrees. Postings therefore grow
+    with the number of distinct names rather than total path length.
+    """
+
+    def __init__(self, entries: List[Tuple[str, str, int, float]]):
+        """
+        Build the index
+
+        Args:
+            entries: (path, type, size, mtime) records; where a path repeats, the last record wins
+        """
+        if len({entry[0] for entry in entries}) != len(entries):
+            entries = list({entry[0]: entry for entry in entries}.values())
+        entries = sorted(entries)
+        self.paths = [entry[0] for entry in entries]
+        self.types = ''.join(entry[1] for entry in entries)
+        self.sizes = array('q', (entry[2] for entry in entries))
+        self.mtimes = array('d', (entry[3] for entry in entries))
+
+        # Distinct names, and the entries with each name in one flat array (CSR layout)
+        name_ids: Dict[str, int] = {}
+        entry_names = array('I', (name_ids.setdefault(path.rpartition('/')[2].lower(), len(name_ids))
+                                  for path in self.paths))
+        self.names = list(name_ids)
+        counts = array('I', bytes(4 * (len(self.names) + 1)))
+        for name_id in entry_names:
+            counts[name_id + 1] += 1
+        for i in range(len(self.names)):
+            counts[i + 1] += counts[i]
+        self._name_start = array('I', counts)
+        self._name_entries = array('I', bytes(4 * len(self.paths)))
+        for entry_id, name_id in enumerate(entry_names):
+            self._name_entries[counts[name_id]] = entry_id
+            counts[name_id] += 1
+
+        postings: Dict[str, List[int]] = defaultdict(list)
+        for name_id, name in enumerate(self.names):
+            for gram in _trigrams(NAME_BOUNDARY + name + NAME_BOUNDARY):
+                postings[gram].append(name_id)
+        self._postings = {gram: array('I', ids) for gram, ids in postings.items()}
+
+        # Top-level entries (the listing root) and the text of their parent folders, which no
+        # indexed name covers: '/data/' for a root of /data/root
+        directories = {path for path, kind in zip(self.paths, self.types) if kind == 'd'}
+        self._roots = [(i, path[:len(path) - len(path.rpartition('/')[2])].lower())
+                       for i, path in enumerate(self.paths) if _parent(path) not in directories or path == '/']
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def entry(self, i: int) -> Dict:
+        return {'path': self.paths[i], 'type': self.types[i], 'size': self.sizes[i], 'mtime': self.mtimes[i]}
+
+    def directories(self) -> Dict[str, float]:
+        """Directory path -> mtime"""
+        return {self.paths[i]: self.mtimes[i] for i, kind in enumerate(self.types) if kind == 'd'}
+
+    def records(self) -> Iterator[Tuple[str, str, int, float]]:
+        return zip(self.paths, self.types, self.sizes, self.mtimes)
+
+    def prefix_range(self, prefix: str) -> range:
+        """Indices of every path starting with prefix"""
+        start = bisect.bisect_left(self.paths, prefix)
+        # Everything with the prefix sorts below prefix + the highest code point
+        return range(start, bisect.bisect_left(self.paths, prefix + '\U0010ffff', start))
+
+    def below(self, path: str) -> range:
+        """Indices of the entries below a directory"""
+        if path == '/':
+            return range(bisect.bisect_right(self.paths, '/'), len(self.paths))
+        path = path.rstrip('/')
+        start = bisect.bisect_left(self.paths, path + '/')
+        return range(start, bisect.bisect_left(self.paths, path + SUBTREE_END, start))
+
+    def _names_containing(self, fragment: str) -> Optional[Iterator[int]]:
+        """
+        Ids of the names containing fragment (NAME_BOUNDARY-anchored), in no particular order
+
+        Posting lists are intersected from the shortest up while that is
+        cheaper than checking the remaining candidates directly. Returns None
+        if the fragment has no trigram.
+        """
+        grams = _trigrams(fragment)
+        if not grams:
+            return None
+        lists = sorted((self._postings.get(gram, ()) for gram in grams), key=len)
+        candidates = set(lists[0])
+        for ids in lists[1:]:
+            if len(ids) > INTERSECT_RATIO * len(candidates):
+                break
+            candidates.intersection_update(ids)
+        return (name_id for name_id in candidates
+                if fragment in NAME_BOUNDARY + self.names[name_id] + NAME_BOUNDARY)
+
+    def _estimate(self, fragment: str) -> int:
+        """Upper bound on the names containing fragment, from its rarest trigram"""
+        return min((len(self._postings.get(gram, ())) for gram in _trigrams(fragment)), default=len(self.names))
+
+    def _entries_named(self, name_ids: Iterable[int]) -> Iterator[int]:
+        for name_id in name_ids:
+            yield from self._name_entries[self._name_start[name_id]:self._name_start[name_id + 1]]
+
+    def _with_subtrees(self, entry_ids: Iterable[int]) -> Iterator[int]:
+        """Each entry followed by everything below it, each index once even where subtrees nest"""
+        seen = set()
+        for i in entry_ids:
+            for j in itertools.chain((i,), self.below(self.paths[i]) if self.types[i] == 'd' else ()):
+                if j not in seen:
+                    seen.add(j)
+                    yield j
+
+    def _root_matches(self, needle: str) -> Tuple[List[int], List[Tuple[int, str]]]:
+        """
+        Where needle lies in text above the roots, which no indexed name covers
+
+        Returns the roots whose parent folders contain needle, so everything below
+        them matches, and (root, prefix) pairs where needle starts in that text and
+        runs on into the root's path: the paths below root starting with prefix.
+        """
+        whole, spanning = [], []
+        for i, ancestors in self._roots:
+            if needle in ancestors:
+                whole.append(i)
+                continue
+            spanning.extend((i, ancestors[:k] + needle) for k in range(len(ancestors))
+                            if needle.startswith(ancestors[k:]))
+        return whole, spanning
+
+    def _starting_with(self, root: int, prefix: str) -> Tuple[str, Iterator[int]]:
+        """Paths below root whose lower-case text starts with prefix"""
+        root_path = self.paths[root].lower()
+        if root_path.startswith(prefix):
+            return 'prefix', iter((root,))
+        if not prefix.startswith(root_path + '/'):
+            return 'prefix', iter(())
+        plan, matches = self._substring_in_names(prefix[len(root_path) + 1:])
+        return plan, (i for i in matches if self.paths[i].lower().startswith(prefix))
+
+    def _substring(self, query: str) -> Tuple[str, Iterator[int]]:
+        needle = query.lower()
+        plan, matches = self._substring_in_names(needle)
+        whole, spanning = self._root_matches(needle)
+        if not whole and not spanning:
+            return plan, matches
+        # The name lookup finds needle below the roots; add where it takes in their parent folders
+        found = [iter(whole), matches]
+        for root, prefix in spanning:
+            span_plan, span_matches = self._starting_with(root, prefix)
+            found.append(span_matches)
+            if span_plan == 'scan':
+                plan = 'scan'
+        if plan == 'scan':
+            return plan, (i for i, path in enumerate(self.paths) if needle in path.lower())
+        # A directory that matches takes everything below it with it
+        return plan, self._with_subtrees(itertools.chain.from_iterable(found))
+
+    def _substring_in_names(self, needle: str) -> Tuple[str, Iterator[int]]:
+        pieces = needle.split('/')
+        # Interior pieces are whole components, the first ends one and the last starts one
+        fragments = [(NAME_BOUNDARY if i else '') + piece + (NAME_BOUNDARY if i < len(pieces) - 1 else '')
+                     for i, piece in enumerate(pieces)]
+        name_ids = self._names_containing(max(fragments, key=len))
+        if name_ids is None:
+            return 'scan', (i for i, path in enumerate(self.paths) if needle in path.lower())
+        # Without '/' the query lies inside one component, so the matching name settles it
+        matches = self._with_subtrees(self._entries_named(name_ids))
+        if len(pieces) == 1:
+            return 'trigram', matches
+        return 'trigram', (i for i in matches if needle in self.paths[i].lower())
+
+    def _glob(self, pattern: str) -> Tuple[str, Iterator[int]]:
+        regex = re.compile(fnmatch.translate(pattern))
+        if '/' not in pattern:
+            # Matched against names, as find -name does; the trigram index only narrows the candidates
+            name_ids = self._names_containing(max(_literal_runs(pattern.lower()), key=len))
+            if name_ids is None:
+                return 'scan', (i for i, path in enumerate(self.paths) if regex.match(path.rpartition('/')[2]))
+            return 'trigram', (i for i in self._entries_named(name_ids)
+                               if regex.match(self.paths[i].rpartition('/')[2]))
+
+        # Matched against whole paths; as in fnmatch, * also matches '/'.
+        # A literal tail holds no '/', so it is also the tail of the entry's name
+        literal = re.split(r'[*?[]', pattern, 1)[0]
+        prefix = self.prefix_range(literal) if literal else None
+        tail = _literal_runs(pattern.rpartition('/')[2].lower())[-1]
+        if tail.endswith(NAME_BOUNDARY) and _trigrams(tail) and (prefix is None or self._estimate(tail) < len(prefix)):
+            return 'trigram', (i for i in self._entries_named(self._names_containing(tail))
+                               if regex.match(self.paths[i]))
+        if prefix is not None:
+            return 'prefix', (i for i in prefix if regex.match(self.paths[i]))
+        return 'scan', (i for i, path in enumerate(self.paths) if regex.match(path))
+
+    def search(self, query: str, mode: str = 'substring', kind: Optional[str] = None,
+               limit: int = 1000) -> Dict:
+        """
+        Find entries matching query
+
+        Args:
+            query: Path prefix, case-insensitive substring, or glob. A glob
+                without '/' matches names, one with '/' matches whole paths
+            mode: One of SEARCH_MODES
+            kind: Only return entries of this type ('f', 'd' or 'l')
+            limit: Maximum entries returned, in path order. When there are
+                more matches, trigram plans return whichever limit matches
+                they reach first rather than the first in path order
+
+        Returns:
+            {"entries", "truncated", "plan"}, where plan says whether the
+            prefix array, the trigram index or a full scan answered
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unsupported search mode '{mode}', expected one of: {', '.join(SEARCH_MODES)}")
+        if kind is not None and kind not in ENTRY_TYPES:
+            raise ValueError(f"Unsupported entry type '{kind}', expected one of: {', '.join(ENTRY_TYPES)}")
+        started = time.perf_counter()
+        if mode == 'prefix':
+            plan, matches = 'prefix', iter(self.prefix_range(query))
+        elif mode == 'substring':
+            plan, matches = self._substring(query)
+        else:
+            plan, matches = self._glob(query)
+
+        results, truncated = [], False
+        for i in matches:
+            if kind is not None and self.types[i] != kind:
+                continue
+            if len(results) >= limit:
+                truncated = True
+                break
+            results.append(i)
+        results = [self.entry(i) for i in sorted(results)]
+        INDEX_SEARCH_SECONDS.observe(time.perf_counter() - started, mode=mode, plan=plan)
+        return {'entries': results, 'truncated': truncated, 'plan': plan}
+
+
+class DeviceIndex:
+    """The index of one directory tree on one device, its refresh logic and its snapshot file"""
+
+    def __init__(self, host: str, port: int, root: str, snapshot_path: str):
+        self.host = host
+        self.port = port
+        self.root = root
+        self.snapshot_path = snapshot_path
+        self.index: Optional[PathIndex] = None
+        self.refreshed_at: Optional[float] = None
+        self.last_refresh: Dict = {}
+        self._refresh_lock = threading.Lock()
+
+    @staticmethod
+    def full_command(root: str) -> str:
+        return f"find {shlex.quote(root)} -printf '{ENTRY_FORMAT}'"
+
+    @staticmethod
+    def directories_command(root: str) -> str:
+        return f"find {shlex.quote(root)} -type d -printf '%T@\\0%p\\0'"
+
+    @staticmethod
+    def children_command() -> str:
+        """Lists the immediate children of the NUL-separated directories on stdin, in batches"""
+        script = f'exec find "$@" -mindepth 1 -maxdepth 1 -printf "{ENTRY_FORMAT.replace(chr(92), chr(92) * 2)}"'
+        return f"xargs -0 -r sh -c {shlex.quote(script)} sh"
+
+    def refresh(self, device_config: DeviceConfig, full: bool = False) -> Dict:
+        """
+        Bring the index up to date with the device
+
+        The first refresh, or one with full=True, lists the whole tree with
+        one find. Later ones list only directories with their mtimes, then
+        re-list the children of directories that are new or whose mtime
+        changed and drop directories that are gone. A directory's mtime
+        changes when entries are added, removed or renamed in it, but not
+        when an existing file is rewritten, so sizes and mtimes of files
+        edited in place are only picked up by a full refresh.
+        """
+        with self._refresh_lock:
+            started = time.monotonic()
+            previous = self.index
+            client = SSHManager.create_ssh_client(device_config)
+            try:
+                if previous is None or full:
+                    output, exit_code = _run(client, self.full_command(self.root))
+                    entries = list(parse_entries(output.decode('utf-8', errors='replace')))
+                    stats = {'mode': 'full', 'listed_directories': sum(1 for entry in entries if entry[1] == 'd'),
+                             'listed_bytes': len(output)}
+                else:
+                    entries, stats, exit_code = self._incremental(client, previous)
+            finally:
+                client.close()
+            if not entries and exit_code != 0:
+                raise RuntimeError(f"Listing {self.root} on {self.host} failed (exit code {exit_code})")
+
+            index = PathIndex(entries)
+            self.index = index
+            self.refreshed_at = time.time()
+            self.save()
+            stats.update({
+                'entries': len(index),
+                'partial': exit_code != 0,
+                'duration': time.monotonic() - started,
+                'refreshed_at': datetime.fromtimestamp(self.refreshed_at).isoformat()
+            })
+            self.last_refresh = stats
+            return stats
+
+    def _incremental(self, client: paramiko.SSHClient, previous: PathIndex) -> Tuple[List, Dict, int]:
+        output, exit_code = _run(client, self.directories_command(self.root))
+        listed_bytes = len(output)
+        fields = output.decode('utf-8', errors='replace').split('\0')
+        current = {(fields[i + 1].rstrip('/') or '/'): float(fields[i]) for i in range(0, len(fields) - 1, 2)}
+        known = previous.directories()
+        changed = sorted(path for path, mtime in current.items() if known.get(path) != mtime)
+        removed = sorted(path for path in known if path not in current)
+
+        children: List[Tuple[str, str, int, float]] = []
+        if changed:
+            output, children_exit = _run(client, self.children_command(),
+                                         b''.join(path.encode('utf-8') + b'\0' for path in changed))
+            children = list(parse_entries(output.decode('utf-8', errors='replace')))
+            listed_bytes += len(output)
+            exit_code = exit_code or children_exit
+
+        relisted = set(changed)
+        gone = set(removed)
+        for path in removed:
+            gone.update(previous.paths[i] for i in previous.below(path))
+        # Children of re-listed directories are replaced by the new listing; directories take their new mtime
+        entries = [
+            (path, kind, size, current.get(path, mtime) if kind == 'd' else mtime)
+            for path, kind, size, mtime in previous.records()
+            if path not in gone and _parent(path) not in relisted
+        ]
+        entries.extend(children)
+        stats = {
+            'mode': 'incremental',
+            'directories': len(current),
+            'listed_directories': len(changed),
+            'removed_directories': len(removed),
+            'listed_bytes': listed_bytes
+        }
+        return entries, stats, exit_code
+
+    def save(self):
+        """Write the snapshot atomically; one JSON header line, then NUL-separated records"""
+        directory = os.path.dirname(self.snapshot_path)
+        os.makedirs(directory, exist_ok=True)
+        temporary = self.snapshot_path + '.tmp'
+        header = {'version': SNAPSHOT_VERSION, 'host': self.host, 'port': self.port, 'root': self.root,
+                  'refreshed_at': self.refreshed_at, 'last_refresh': self.last_refresh}
+        with gzip.open(temporary, 'wt', encoding='utf-8', errors='replace', compresslevel=1, newline='') as f:
+            f.write(json.dumps(header) + '\n')
+            records = self.index.records()
+            while True:
+                batch = list(itertools.islice(records, 100000))
+                if not batch:
+                    break
+                f.write(''.join(f"{kind}\0{size}\0{mtime!r}\0{path}\0" for path, kind, size, mtime in batch))
+        os.replace(temporary, self.snapshot_path)
+
+    @classmethod
+    def load(cls, snapshot_path: str) -> 'DeviceIndex':
+        with gzip.open(snapshot_path, 'rt', encoding='utf-8', newline='') as f:
+            header = json.loads(f.readline())
+            body = f.read()
+        if header.get('version') != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported index snapshot version {header.get('version')}")
+        device_index = cls(header['host'], header['port'], header['root'], snapshot_path)
+        device_index.index = PathIndex(list(parse_entries(body)))
+        device_index.refreshed_at = header.get('refreshed_at')
+        device_index.last_refresh = header.get('last_refresh') or {}
+        return device_index
+
+    def to_dict(self) -> Dict:
+        return {
+            'host': self.host,
+            'port': self.port,
+            'root': self.root,
+            'entries': len(self.index) if self.index is not None else 0,
+            'refreshed_at': datetime.fromtimestamp(self.refreshed_at).isoformat() if self.refreshed_at else None,
+            'last_refresh': self.last_refresh
+        }
+
+
+class FileIndexStore:
+    """Indexes by (host, port, root), persisted under directory and loaded back on first use"""
+
+    def __init__(self, directory: str = "/tmp/securecopy_index"):
+        self.directory = directory
+        self._indexes: Dict[Tuple[str, int, str], DeviceIndex] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _snapshot_path(self, host: str, port: int, root: str) -> str:
+        digest = hashlib.sha1(f"{host}:{port}:{root}".encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{digest}.idx.gz")
+
+    def _load_snapshots(self):
+        # Called with the lock held; snapshots from an earlier run are read once
+        if self._loaded:
+            return
+        self._loaded = True
+        if not os.path.isdir(self.directory):
+            return
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith('.idx.gz'):
+                continue
+            try:
+                device_index = DeviceIndex.load(os.path.join(self.directory, name))
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Skipping unreadable index snapshot {name}: {e}")
+                continue
+            self._indexes[(device_index.host, device_index.port, device_index.root)] = device_index
+
+    def refresh(self, device_config: DeviceConfig, root: Optional[str] = None, full: bool = False) -> Dict:
+        """Build or update the index of root (default the device's directory) on a device"""
+        root = (root or device_config.directory or '.').rstrip('/') or '/'
+        key = (device_config.host, device_config.port, root)
+        with self._lock:
+            self._load_snapshots()
+            device_index = self._indexes.get(key)
+            if device_index is None:
+                device_index = self._indexes[key] = DeviceIndex(
+                    device_config.host, device_config.port, root, self._snapshot_path(*key))
+        device_index.refresh(device_config, full=full)
+        return device_index.to_dict()
+
+    def indexes(self, host: Optional[str] = None, port: Optional[int] = None,
+                root: Optional[str] = None) -> List[DeviceIndex]:
+        """Built indexes, optionally narrowed to one host, port and root"""
+        with self._lock:
+            self._load_snapshots()
+            candidates = list(self._indexes.values())
+        return [device_index for device_index in candidates
+                if device_index.index is not None
+                and (host is None or device_index.host == host)
+                and (port is None or device_index.port == port)
+                and (root is None or device_index.root == root.rstrip('/'))]
+
+    def search(self, host: str, query: str, mode: str = 'substring', port: Optional[int] = None,
+               root: Optional[str] = None, kind: Optional[str] = None, limit: int = 1000) -> Dict:
+        """Search every index of a host, or one root on it, without contacting the device"""
+        results, truncated, plans = [], False, set()
+        for device_index in self.indexes(host, port, root):
+            found = device_index.index.search(query, mode, kind, limit - len(results))
+            plans.add(found['plan'])
+            results.extend(dict(entry, root=device_index.root) for entry in found['entries'])
+            truncated = truncated or found['truncated']
+            if len(results) >= limit:
+                break
+        return {'entries': results, 'truncated': truncated, 'plans': sorted(plans)}
+
+    def remove(self, host: str, port: Optional[int] = None, root: Optional[str] = None) -> int:
+        """Forget matching indexes and delete their snapshots; returns how many were removed"""
+        removed = self.indexes(host, port, root)
+        with self._lock:
+            for device_index in removed:
+                self._indexes.pop((device_index.host, device_index.port, device_index.root), None)
+                try:
+                    os.remove(device_index.snapshot_path)
+                except FileNotFoundError:
+                    pass
+        return len(removed)
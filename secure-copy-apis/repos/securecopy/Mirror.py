@@ -0,0 +1,240 @@
+"""
+Directory mirroring between devices
+Diffs one-command manifests of both trees and transfers only new or changed files
+"""
+
+from __future__ import annotations
+
+import logging
+import posixpath
+import shlex
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from repos.securecopy.SecureCopy import CHECKSUM_COMMANDS, DeviceConfig, SCPManager, SSHManager, paramiko
+
+logger = logging.getLogger(__name__)
+
+HASH_MARKER = '\0__MANIFEST_HASHES__\0'
+
+
+def _run_with_input(client: paramiko.SSHClient, command: str, data: bytes) -> Tuple[str, int]:
+    """Run a command with data on its stdin, returning combined output and exit code"""
+    channel = client.get_transport().open_session()
+    try:
+        channel.set_combine_stderr(True)
+        channel.exec_command(command)
+        channel.sendall(data)
+        channel.shutdown_write()
+        chunks = []
+        while True:
+            chunk = channel.recv(32768)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return b''.join(chunks).decode('utf-8', errors='replace').strip(), channel.recv_exit_status()
+    finally:
+        channel.close()
+
+
+class DirectoryMirror:
+    """Makes a destination directory match a source directory"""
+
+    def __init__(self, source_device: DeviceConfig, dest_device: DeviceConfig, source_dir: str, dest_dir: str,
+                 delete: bool = False, hash_algorithm: Optional[str] = None, max_parallel: int = 4,
+                 transfer_options: Optional[Dict] = None):
+        """
+        Initialize the mirror
+
+        Args:
+            source_device: Device holding the reference tree
+            dest_device: Device to update
+            source_dir: Directory on the source device
+            dest_dir: Directory on the destination device, created if missing
+            delete: Remove destination files that do not exist on the source
+            hash_algorithm: CHECKSUM_COMMANDS algorithm to compare content instead
+                of mtime; hashes every file on both sides, so it costs a full read
+            max_parallel: Files transferred concurrently
+            transfer_options: Extra SCPManager.transfer_file keyword arguments
+        """
+        if hash_algorithm is not None and hash_algorithm not in CHECKSUM_COMMANDS:
+            raise ValueError(f"Unsupported hash '{hash_algorithm}', expected one of: {', '.join(CHECKSUM_COMMANDS)}")
+        self.source_device = source_device
+        self.dest_device = dest_device
+        self.source_dir = source_dir.rstrip('/') or '/'
+        self.dest_dir = dest_dir.rstrip('/') or '/'
+        self.delete = delete
+        self.hash_algorithm = hash_algorithm
+        self.max_parallel = max(1, max_parallel)
+        self.transfer_options = dict(transfer_options or {})
+
+    @staticmethod
+    def manifest_command(directory: str, hash_algorithm: Optional[str] = None, missing_ok: bool = False) -> str:
+        """
+        Shell command listing every regular file under directory
+
+        Output is NUL-separated (relative path, size, mtime) triples, followed
+        by HASH_MARKER and checksum tool output when hashing. A missing
+        directory fails the command, or yields an empty manifest with
+        missing_ok. Requires GNU find.
+        """
+        quoted = shlex.quote(directory)
+        command = f"cd -- {quoted} && find . -type f -printf '%P\\0%s\\0%T@\\0'"
+        if hash_algorithm:
+            command += (f" && printf '\\0__MANIFEST_HASHES__\\0'"
+                        f" && find . -type f -print0 | xargs -0 -r {CHECKSUM_COMMANDS[hash_algorithm]}")
+        return f"if [ -d {quoted} ]; then {command}; fi" if missing_ok else command
+
+    @staticmethod
+    def parse_manifest(output: str) -> Dict[str, Dict]:
+        """Turn manifest_command() output into path -> {size, mtime[, hash]}"""
+        listing, _, hashes = output.partition(HASH_MARKER)
+        fields = listing.split('\0')
+        manifest = {}
+        for i in range(0, len(fields) - 2, 3):
+            if fields[i]:
+                manifest[fields[i]] = {'size': int(fields[i + 1]), 'mtime': float(fields[i + 2])}
+        for line in hashes.splitlines():
+            digest, _, path = line.partition('  ')
+            path = path[2:] if path.startswith('./') else path
+            if path in manifest:
+                manifest[path]['hash'] = digest.lower()
+        return manifest
+
+    @staticmethod
+    def build_manifest(client: paramiko.SSHClient, directory: str, hash_algorithm: Optional[str] = None,
+                       missing_ok: bool = False) -> Dict:
+        """Build a manifest with a single remote command"""
+        output = {'stdout': [], 'stderr': []}
+        exit_code = -1
+        command = DirectoryMirror.manifest_command(directory, hash_algorithm, missing_ok)
+        for event in SSHManager.stream_command(client, command):
+            if 'data' in event:
+                output[event['stream']].append(event['data'])
+            else:
+                exit_code = event['exit_code']
+        if exit_code != 0:
+            raise RuntimeError(f"Manifest of {directory} failed ({exit_code}): {''.join(output['stderr']).strip()}")
+        return DirectoryMirror.parse_manifest(''.join(output['stdout']))
+
+    @staticmethod
+    def diff_manifests(source: Dict[str, Dict], dest: Dict[str, Dict], compare_hash: bool = False) -> Dict:
+        """
+        Decide what to copy and what is extra
+
+        Files match when sizes are equal and either hashes or whole-second
+        mtimes are equal. Mirrored files get the source mtime, so an
+        unchanged tree diffs clean on the next run.
+        """
+        copy, unchanged = [], 0
+        for path, entry in source.items():
+            existing = dest.get(path)
+            if existing is not None and existing['size'] == entry['size'] and (
+                    existing.get('hash') == entry.get('hash') if compare_hash
+                    else int(existing['mtime']) == int(entry['mtime'])):
+                unchanged += 1
+            else:
+                copy.append(path)
+        extra = [path for path in dest if path not in source]
+        return {'copy': sorted(copy), 'delete': sorted(extra), 'unchanged': unchanged}
+
+    def _transfer(self, path: str) -> Dict:
+        result = SCPManager.transfer_file(
+            self.source_device, self.dest_device,
+            posixpath.join(self.source_dir, path), posixpath.join(self.dest_dir, path),
+            **self.transfer_options
+        )
+        return dict(result, path=path)
+
+    def run(self, dry_run: bool = False) -> Dict:
+        """
+        Mirror the tree
+
+        Args:
+            dry_run: Only build and return the plan
+
+        Returns:
+            The plan plus per-file failures, counts and timing
+        """
+        started = time.monotonic()
+        source_client = SSHManager.create_ssh_client(self.source_device)
+        dest_client = None
+        try:
+            dest_client = SSHManager.create_ssh_client(self.dest_device)
+            # Both manifests are built at once, one remote command per side. Only the destination may
+            # be missing: an empty source manifest would turn every destination file into a delete
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                source_future = executor.submit(self.build_manifest, source_client, self.source_dir, self.hash_algorithm)
+                dest_future = executor.submit(self.build_manifest, dest_client, self.dest_dir, self.hash_algorithm, True)
+                source_manifest, dest_manifest = source_future.result(), dest_future.result()
+            source_client.close()
+            source_client = None
+
+            plan = self.diff_manifests(source_manifest, dest_manifest, compare_hash=self.hash_algorithm is not None)
+            if not self.delete:
+                plan['delete'] = []
+            result = {
+                'success': True,
+                'source_dir': self.source_dir,
+                'dest_dir': self.dest_dir,
+                'dry_run': dry_run,
+                'files': {'source': len(source_manifest), 'dest': len(dest_manifest)},
+                'plan': plan,
+                'copied': 0,
+                'deleted': 0,
+                'bytes_copied': 0,
+                'failed': []
+            }
+            if dry_run or not (plan['copy'] or plan['delete']):
+                result['duration'] = time.monotonic() - started
+                return result
+
+            if plan['copy']:
+                directories = sorted({posixpath.join(self.dest_dir, posixpath.dirname(p)) for p in plan['copy']})
+                output, exit_code = _run_with_input(dest_client, 'xargs -0 -r mkdir -p --',
+                                                    '\0'.join(directories).encode('utf-8'))
+                if exit_code != 0:
+                    raise RuntimeError(f"Creating destination directories failed: {output}")
+
+            copied = []
+            with ThreadPoolExecutor(max_workers=self.max_parallel) as executor:
+                futures = [executor.submit(self._transfer, path) for path in plan['copy']]
+                for future in as_completed(futures):
+                    outcome = future.result()
+                    if outcome.get('success'):
+                        copied.append(outcome['path'])
+                        result['bytes_copied'] += source_manifest[outcome['path']]['size']
+                    else:
+                        result['failed'].append({'path': outcome['path'], 'error': outcome.get('error')})
+            result['copied'] = len(copied)
+
+            # Carry source mtimes over in one round trip so the next diff sees these files as unchanged
+            if copied:
+                script = ''.join(
+                    f"touch -c -m -d @{source_manifest[path]['mtime']:.9f} -- "
+                    f"{shlex.quote(posixpath.join(self.dest_dir, path))}\n"
+                    for path in copied
+                )
+                output, exit_code = _run_with_input(dest_client, 'sh -s', script.encode('utf-8'))
+                if exit_code != 0:
+                    logger.error(f"Setting mirrored mtimes failed: {output}")
+
+            if plan['delete']:
+                extras = [posixpath.join(self.dest_dir, path) for path in plan['delete']]
+                output, exit_code = _run_with_input(dest_client, 'xargs -0 -r rm -f --',
+                                                    '\0'.join(extras).encode('utf-8'))
+                if exit_code != 0:
+                    result['failed'].append({'path': None, 'error': f"Deleting extra files failed: {output}"})
+                else:
+                    result['deleted'] = len(extras)
+
+            result['success'] = not result['failed']
+            result['duration'] = time.monotonic() - started
+            result['transfer_time'] = datetime.now().isoformat()
+            return result
+        finally:
+            for client in (source_client, dest_client):
+                if client is not None:
+                    client.close()
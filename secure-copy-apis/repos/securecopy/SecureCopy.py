@@ -1,25 +1,206 @@
+from __future__ import annotations
+
 from flask import Flask, request, jsonify
-import paramiko
-import oracledb
 import json
 import datetime
 import os
 import tempfile
+import time
+import select
+import threading
+import codecs
+import shlex
+import socket
+import zlib
+import io
+import uuid
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from functools import wraps
 import logging
-from typing import Dict, List, Tuple, Optional
+from typing import Callable, Dict, Iterator, List, Tuple, Optional
+
+from repos.LazyModule import LazyModule
+from repos.monitoring.Metrics import DB_SECONDS, THROUGHPUT_BUCKETS, metrics
+from repos.securecopy.Bandwidth import TransferShaper, host_bandwidth
+
+# Imported on first use; together they add a quarter of a second to startup
+paramiko = LazyModule("paramiko")
+oracledb = LazyModule("oracledb")
+
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+SSH_CONNECT_SECONDS = metrics.histogram(
+    "ssh_connect_seconds", "SSH connection setup time; phase tcp is the socket connect, handshake is key exchange plus auth",
+    ("phase", "result"))
+SSH_COMMAND_SECONDS = metrics.histogram(
+    "ssh_command_seconds", "Remote command run time by outcome", ("result",))
+TRANSFER_SECONDS = metrics.histogram(
+    "transfer_seconds", "Transfer duration including connection setup", ("kind", "route", "result"))
+TRANSFER_BYTES = metrics.counter(
+    "transfer_bytes_total", "Bytes copied by successful transfers", ("kind", "route"))
+TRANSFER_THROUGHPUT = metrics.histogram(
+    "transfer_throughput_bytes_per_second", "Throughput of successful transfers", ("kind", "route"),
+    buckets=THROUGHPUT_BUCKETS)
+SSH_SESSIONS = metrics.counter(
+    "ssh_sessions_total", "SSH sessions by negotiated cipher and MAC", ("cipher", "mac"))
+
+# Algorithm kinds offered in the SSH handshake, as (paramiko SecurityOptions attribute, Transport default order)
+SSH_ALGORITHM_KINDS = {
+    "ciphers": ("ciphers", "_preferred_ciphers"),
+    "macs": ("digests", "_preferred_macs"),
+    "kex": ("kex", "_preferred_kex"),
+    "host_keys": ("key_types", "_preferred_keys"),
+}
+# AES-GCM authenticates as it encrypts, so bulk data takes one pass instead of cipher plus MAC;
+# CTR with an encrypt-then-MAC SHA-2 is next. Servers without them fall back to the remaining defaults
+THROUGHPUT_SSH_ALGORITHMS = {
+    "ciphers": ["aes128-gcm@openssh.com", "aes256-gcm@openssh.com", "aes128-ctr", "aes256-ctr"],
+    "macs": ["hmac-sha2-256-etm@openssh.com", "hmac-sha2-512-etm@openssh.com", "hmac-sha2-256", "hmac-sha2-512"],
+}
+# Global preferences, overridden per kind by a device's ssh_algorithms
+ssh_algorithms: Dict = dict(THROUGHPUT_SSH_ALGORITHMS)
+
+def supported_ssh_algorithms() -> Dict[str, Tuple[str, ...]]:
+    """Algorithms paramiko implements, per kind, in its default order"""
+    return {kind: tuple(getattr(paramiko.Transport, default)) for kind, (_, default) in SSH_ALGORITHM_KINDS.items()}
+
+def resolve_ssh_algorithms(preferences: Optional[Dict] = None, base: Optional[Dict] = None) -> Dict[str, Tuple[str, ...]]:
+    """
+    Offer order per kind for preferences laid over base, the global preferences by default
+
+    Each kind is a list (or an OpenSSH-style comma-separated string) of
+    algorithms, most preferred first. Unlisted algorithms follow in paramiko's
+    order unless "fallback" is false, in which case only the listed ones are
+    offered. Kinds listed nowhere keep paramiko's order and are left out.
+    """
+    merged = dict(ssh_algorithms if base is None else base)
+    merged.update(preferences or {})
+    unknown_keys = set(merged) - set(SSH_ALGORITHM_KINDS) - {"fallback"}
+    if unknown_keys:
+        raise ValueError(f"Unknown SSH algorithm kinds {', '.join(sorted(unknown_keys))}, "
+                         f"expected any of: {', '.join(SSH_ALGORITHM_KINDS)}, fallback")
+    supported = supported_ssh_algorithms()
+    order = {}
+    for kind in SSH_ALGORITHM_KINDS:
+        listed = merged.get(kind)
+        if not listed:
+            continue
+        if isinstance(listed, str):
+            listed = [name.strip() for name in listed.split(",") if name.strip()]
+        unsupported = [name for name in listed if name not in supported[kind]]
+        if unsupported:
+            raise ValueError(f"Unsupported {kind} {', '.join(unsupported)}, expected any of: {', '.join(supported[kind])}")
+        listed = tuple(dict.fromkeys(listed))
+        remaining = tuple(name for name in supported[kind] if name not in listed)
+        order[kind] = listed + remaining if merged.get("fallback", True) else listed
+    return order
+
+def get_ssh_algorithms() -> Dict:
+    return dict(ssh_algorithms)
+
+def set_ssh_algorithms(preferences: Dict) -> Dict[str, Tuple[str, ...]]:
+    """Validate and replace the global preferences, returning the resulting offer order"""
+    global ssh_algorithms
+    offered = resolve_ssh_algorithms(preferences, base={})
+    ssh_algorithms = dict(preferences)
+    return offered
+
 class DeviceConfig:
     """Configuration class for device connection details"""
-    def __init__(self, username: str, password: str, host: str, directory: str):
+    def __init__(self, username: str, password: str, host: str, directory: str = "", port: int = 22,
+                 ssh_algorithms: Optional[Dict] = None):
         self.username = username
         self.password = password
         self.host = host
         self.directory = directory
+        self.port = port
+        # Per-device SSH algorithm preferences, see resolve_ssh_algorithms; checked now so bad names fail early
+        self.ssh_algorithms = ssh_algorithms
+        if ssh_algorithms:
+            resolve_ssh_algorithms(ssh_algorithms)
+
+# Audit records keep request and response shape but not bulk or secrets
+AUDIT_REDACTED_KEYS = {"password", "passphrase", "secret", "token", "private_key", "api_key", "authorization"}
+AUDIT_MAX_STRING = 1024
+AUDIT_MAX_ITEMS = 100
+AUDIT_PREVIEW_ITEMS = 10
+AUDIT_MAX_DEPTH = 8
+
+def _audit_digest(value) -> Dict:
+    """
+    Stand-in for an oversized value: its size and a hash to match it against the original
+
+    Lists of strings, such as file listings, are hashed newline-joined, which
+    costs a fraction of serializing them first.
+    """
+    if isinstance(value, str):
+        encoded = value.encode("utf-8")
+    elif isinstance(value, (list, tuple)) and all(isinstance(item, str) for item in value):
+        encoded = "\n".join(value).encode("utf-8")
+    else:
+        encoded = json.dumps(value, default=str).encode("utf-8")
+    return {"bytes": len(encoded), "sha256": hashlib.sha256(encoded).hexdigest()}
+
+def compact_audit_payload(value, depth: int = 0):
+    """
+    Bound a request or response for the audit log
+
+    Credentials are redacted, strings over AUDIT_MAX_STRING are cut to a
+    prefix, and lists or dicts over AUDIT_MAX_ITEMS keep a preview of
+    AUDIT_PREVIEW_ITEMS entries. Anything cut is recorded with its length,
+    byte size and SHA-256.
+    """
+    if isinstance(value, str):
+        if len(value) <= AUDIT_MAX_STRING:
+            return value
+        return {"truncated": value[:AUDIT_MAX_STRING // 4], "length": len(value), **_audit_digest(value)}
+    if isinstance(value, (list, tuple)):
+        if depth >= AUDIT_MAX_DEPTH:
+            return {"omitted": "depth", "count": len(value), **_audit_digest(value)}
+        if len(value) <= AUDIT_MAX_ITEMS:
+            return [compact_audit_payload(item, depth + 1) for item in value]
+        return {"preview": [compact_audit_payload(item, depth + 1) for item in value[:AUDIT_PREVIEW_ITEMS]],
+                "count": len(value), **_audit_digest(value)}
+    if isinstance(value, dict):
+        if depth >= AUDIT_MAX_DEPTH:
+            return {"omitted": "depth", "count": len(value), **_audit_digest(value)}
+        compact = {}
+        for i, (key, item) in enumerate(value.items()):
+            if i == AUDIT_MAX_ITEMS:
+                compact["__omitted__"] = {"count": len(value) - AUDIT_MAX_ITEMS, **_audit_digest(value)}
+                break
+            if str(key).lower() in AUDIT_REDACTED_KEYS:
+                compact[key] = "[REDACTED]" if item else item
+            else:
+                compact[key] = compact_audit_payload(item, depth + 1)
+        return compact
+    return value
+
+def encode_audit_record(device_info: Dict, request_data: Dict, response_data: Dict) -> Tuple[bytes, int]:
+    """Compact and zlib-compress one audit record, returning (blob, uncompressed size)"""
+    record = json.dumps({
+        "device_info": device_info,
+        "request": compact_audit_payload(request_data),
+        "response": compact_audit_payload(response_data)
+    }, separators=(",", ":"), default=str).encode("utf-8")
+    return zlib.compress(record, 6), len(record)
+
+def decode_audit_record(blob: bytes) -> Dict:
+    return json.loads(zlib.decompress(blob))
 
 class DatabaseManager:
     """Handles Oracle database operations for logging"""
@@ -27,6 +208,7 @@ class DatabaseManager:
         self.dsn = dsn
         self.username = username
         self.password = password
+        self._audit_table_ready = False
     
     def get_connection(self):
         """Get Oracle database connection"""
@@ -36,44 +218,72 @@ class DatabaseManager:
             logger.error(f"Database connection failed: {e}")
             raise
 
+    def _ensure_audit_table(self, cursor):
+        """Create api_logs, or add the compact record columns to a table from before them, once per process"""
+        if self._audit_table_ready:
+            return
+        try:
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS api_logs (
+                id NUMBER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                operation_type VARCHAR2(50),
+                device1 VARCHAR2(255),
+                device2 VARCHAR2(255),
+                status VARCHAR2(20),
+                payload BLOB,
+                payload_bytes NUMBER
+            )
+            """)
+        except oracledb.DatabaseError as e:
+            logger.warning(f"Creating api_logs failed: {e}")
+        # The old device_info/request_data/response_data CLOB columns are left in place for earlier rows
+        for column in ("device1 VARCHAR2(255)", "device2 VARCHAR2(255)", "payload BLOB", "payload_bytes NUMBER"):
+            try:
+                cursor.execute(f"ALTER TABLE api_logs ADD ({column})")
+            except oracledb.DatabaseError as e:
+                if 'ORA-01430' not in str(e):  # column already exists
+                    raise
+        self._audit_table_ready = True
+
+    def warm_up(self):
+        """Connect once and prepare api_logs, so the first audited request pays for neither"""
+        with DB_SECONDS.time(operation="api_log", phase="connect"):
+            conn = self.get_connection()
+        with conn:
+            with DB_SECONDS.time(operation="api_log", phase="ddl"):
+                self._ensure_audit_table(conn.cursor())
+
     def log_operation(self, operation_type: str, device_info: Dict, request_data: Dict, response_data: Dict, status: str):
-        """Log API operation to database"""
+        """Log API operation to database as a compact, compressed record"""
         try:
-            with self.get_connection() as conn:
+            payload, payload_bytes = encode_audit_record(device_info, request_data, response_data)
+            with DB_SECONDS.time(operation="api_log", phase="connect"):
+                conn = self.get_connection()
+            with conn:
                 cursor = conn.cursor()
 
-                # Create table if not exists (run this separately in production)
-                create_table_sql = """
-                CREATE TABLE IF NOT EXISTS api_logs (
-                    id NUMBER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    operation_type VARCHAR2(50),
-                    device_info CLOB,
-                    request_data CLOB,
-                    response_data CLOB,
-                    status VARCHAR2(20)
-                )
-                """
-
-                try:
-                    cursor.execute(create_table_sql)
-                except:
-                    pass
+                with DB_SECONDS.time(operation="api_log", phase="ddl"):
+                    self._ensure_audit_table(cursor)
 
                 # Insert log entry
                 insert_sql = """
-                INSERT INTO api_logs (operation_type, device_info, request_data, response_data, status) 
-                VALUES (:1, :2, :3, :4, :5)
+                INSERT INTO api_logs (operation_type, device1, device2, status, payload, payload_bytes)
+                VALUES (:1, :2, :3, :4, :5, :6)
                 """
 
-                cursor.execute(insert_sql, (
-                    operation_type, 
-                    json.dumps(device_info),
-                    json.dumps(request_data),
-                    json.dumps(response_data),
-                    status
-                ))
-                conn.commit()
+                with DB_SECONDS.time(operation="api_log", phase="insert"):
+                    cursor.setinputsizes(None, None, None, None, oracledb.DB_TYPE_BLOB, None)
+                    cursor.execute(insert_sql, (
+                        operation_type,
+                        str(device_info.get("device1", ""))[:255],
+                        str(device_info.get("device2", ""))[:255],
+                        status,
+                        payload,
+                        payload_bytes
+                    ))
+                with DB_SECONDS.time(operation="api_log", phase="commit"):
+                    conn.commit()
 
         except Exception as e:
             logger.error(f"Failed to log operation: {e}")
@@ -82,76 +292,720 @@ class SSHManager:
     """Handles SSH connections and operations using paramiko"""
 
     @staticmethod
-    def create_ssh_client(device_config: DeviceConfig) -> paramiko.SSHClient:
-        """Create and configure SSH client"""
+    def create_ssh_client(device_config: DeviceConfig, timeout: float = 30, compress: bool = False) -> paramiko.SSHClient:
+        """Create and configure SSH client, optionally with SSH transport compression"""
         client = paramiko.SSHClient()
         client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        algorithms = resolve_ssh_algorithms(device_config.ssh_algorithms)
 
+        # The socket is opened here so TCP connect and the SSH handshake are timed separately
+        phase = "tcp"
+        started = time.perf_counter()
+        sock = None
         try:
+            sock = socket.create_connection((device_config.host, device_config.port), timeout=timeout)
+            SSH_CONNECT_SECONDS.observe(time.perf_counter() - started, phase="tcp", result="success")
+            phase = "handshake"
+            started = time.perf_counter()
             client.connect(
                 hostname=device_config.host,
+                port=device_config.port,
                 username=device_config.username,
                 password=device_config.password,
-                timeout=30
+                timeout=timeout,
+                compress=compress,
+                sock=sock,
+                transport_factory=SSHManager._transport_factory(algorithms) if algorithms else None
             )
+            SSH_CONNECT_SECONDS.observe(time.perf_counter() - started, phase="handshake", result="success")
+            negotiated = SSHManager.negotiated_algorithms(client)
+            SSH_SESSIONS.inc(cipher=negotiated["cipher"], mac=negotiated["mac"])
 
             return client
         except Exception as e:
+            SSH_CONNECT_SECONDS.observe(time.perf_counter() - started, phase=phase, result="error")
+            client.close()
+            if sock is not None:
+                sock.close()
             logger.error(f"SSH connection failed to {device_config.host}: {e}")
             raise
 
+    @staticmethod
+    def _transport_factory(algorithms: Dict[str, Tuple[str, ...]]) -> Callable:
+        """paramiko transport_factory offering algorithms (a resolve_ssh_algorithms result) in order"""
+        def factory(sock, **kwargs) -> paramiko.Transport:
+            transport = paramiko.Transport(sock, **kwargs)
+            options = transport.get_security_options()
+            for kind, names in algorithms.items():
+                setattr(options, SSH_ALGORITHM_KINDS[kind][0], names)
+            return transport
+        return factory
+
+    @staticmethod
+    def negotiated_algorithms(client: paramiko.SSHClient) -> Dict[str, Optional[str]]:
+        """Cipher, MAC and host key type agreed for a connected client's outgoing traffic"""
+        transport = client.get_transport()
+        # AEAD ciphers carry their own authentication, so any MAC negotiated alongside them goes unused
+        aead = paramiko.Transport._cipher_info.get(transport.local_cipher, {}).get("is_aead", False)
+        return {
+            "cipher": transport.local_cipher,
+            "mac": "aead" if aead else transport.local_mac,
+            "host_key": transport.host_key_type
+        }
+
     @staticmethod
     def execute_command(client: paramiko.SSHClient, command: str) -> Tuple[str, str, int]:
         """Execute command via SSH and return stdout, stderr, exit_code"""
         try:
-            stdin, stdout, stderr = client.exec_command(command)
-            exit_code = stdout.channel.recv_exit_status()
+            # Drain both streams while the command runs so a full channel window cannot stall it
+            output = {"stdout": [], "stderr": []}
+            exit_code = -1
+            for event in SSHManager.stream_command(client, command):
+                if "data" in event:
+                    output[event["stream"]].append(event["data"])
+                else:
+                    exit_code = event["exit_code"]
 
-            stdout_text = stdout.read().decode('utf-8').strip()
-            stderr_text = stderr.read().decode('utf-8').strip()
+            stdout_text = "".join(output["stdout"]).strip()
+            stderr_text = "".join(output["stderr"]).strip()
 
             return stdout_text, stderr_text, exit_code
         except Exception as e:
             logger.error(f"Command execution failed: {e}")
             raise
 
+    @staticmethod
+    def stream_command(client: paramiko.SSHClient, command: str, max_bytes: Optional[int] = None,
+                       timeout: Optional[float] = None, chunk_size: int = 32768) -> Iterator[Dict]:
+        """
+        Execute command via SSH and yield its output as it arrives
+
+        Args:
+            client: Connected SSH client
+            command: Command to run
+            max_bytes: Stop the command once stdout and stderr exceed this many bytes
+            timeout: Stop the command after this many seconds
+            chunk_size: Maximum bytes read from a stream at a time
+
+        Yields:
+            {"stream": "stdout"|"stderr", "data": str} for each chunk, then a final
+            {"exit_code", "bytes", "truncated", "timed_out", "duration"} summary
+        """
+        channel = client.get_transport().open_session()
+        channel.exec_command(command)
+        decoders = {
+            "stdout": codecs.getincrementaldecoder("utf-8")(errors="replace"),
+            "stderr": codecs.getincrementaldecoder("utf-8")(errors="replace")
+        }
+        sent = {"stdout": 0, "stderr": 0}
+        truncated = False
+        timed_out = False
+        started = time.monotonic()
+
+        try:
+            while True:
+                received = False
+                for stream, ready, recv in (("stdout", channel.recv_ready, channel.recv),
+                                            ("stderr", channel.recv_stderr_ready, channel.recv_stderr)):
+                    if not ready():
+                        continue
+                    data = recv(chunk_size)
+                    if not data:
+                        continue
+                    received = True
+                    if max_bytes is not None:
+                        remaining = max_bytes - sent["stdout"] - sent["stderr"]
+                        if len(data) > remaining:
+                            data = data[:max(remaining, 0)]
+                            truncated = True
+                    sent[stream] += len(data)
+                    text = decoders[stream].decode(data)
+                    if text:
+                        yield {"stream": stream, "data": text}
+                    if truncated:
+                        break
+
+                if truncated:
+                    break
+                if timeout is not None and time.monotonic() - started > timeout:
+                    timed_out = True
+                    break
+                if not received:
+                    if channel.exit_status_ready() and not channel.recv_ready() and not channel.recv_stderr_ready():
+                        break
+                    # Wake up as soon as the channel has data, rather than busy-polling
+                    select.select([channel], [], [], 0.1)
+
+            for stream, decoder in decoders.items():
+                tail = decoder.decode(b"", final=True)
+                if tail:
+                    yield {"stream": stream, "data": tail}
+
+            exit_code = None if truncated or timed_out else channel.recv_exit_status()
+            duration = time.monotonic() - started
+            SSH_COMMAND_SECONDS.observe(duration, result="timed_out" if timed_out else "truncated" if truncated
+                                        else "success" if exit_code == 0 else "nonzero")
+            yield {
+                "exit_code": exit_code,
+                "bytes": sent,
+                "truncated": truncated,
+                "timed_out": timed_out,
+                "duration": duration
+            }
+        finally:
+            channel.close()
+
+    @staticmethod
+    def run_on_device(device_config: DeviceConfig, command: str, timeout: float = 60,
+                      max_bytes: Optional[int] = None) -> Dict:
+        """Connect, run a command and collect its output, bounded by one overall timeout"""
+        started = time.monotonic()
+        result = {"host": device_config.host}
+        client = None
+        try:
+            client = SSHManager.create_ssh_client(device_config, timeout=timeout)
+            output = {"stdout": [], "stderr": []}
+            remaining = max(timeout - (time.monotonic() - started), 0)
+            for event in SSHManager.stream_command(client, command, max_bytes=max_bytes, timeout=remaining):
+                if "data" in event:
+                    output[event["stream"]].append(event["data"])
+                else:
+                    result.update(exit_code=event["exit_code"], truncated=event["truncated"],
+                                  timed_out=event["timed_out"])
+            result.update(
+                status="success" if result.get("exit_code") == 0 else "error",
+                stdout="".join(output["stdout"]).strip(),
+                stderr="".join(output["stderr"]).strip()
+            )
+        except Exception as e:
+            result.update(status="failed", message=str(e))
+        finally:
+            if client is not None:
+                client.close()
+        result["duration"] = time.monotonic() - started
+        return result
+
+    @staticmethod
+    def broadcast_command(devices: Dict[str, DeviceConfig], command: str, max_concurrency: int = 16,
+                          timeout: float = 60, max_bytes: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Run a command on many devices in parallel
+
+        Args:
+            devices: Device name to connection details
+            command: Command to run on every device
+            max_concurrency: Maximum devices contacted at once
+            timeout: Per-device limit covering connect and execution
+            max_bytes: Per-device output cap
+
+        Yields:
+            One result per device, in completion order
+        """
+        executor = ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(devices) or 1)))
+        try:
+            futures = {
+                executor.submit(SSHManager.run_on_device, config, command, timeout, max_bytes): name
+                for name, config in devices.items()
+            }
+            for future in as_completed(futures):
+                yield dict(future.result(), device=futures[future])
+        finally:
+            # Stop queued devices if the consumer goes away early
+            executor.shutdown(wait=False, cancel_futures=True)
+
+# Remote (compress, decompress) commands for streamed transfers
+COMPRESSION_CODECS = {
+    "zstd": ("zstd -c -1 -q --", "zstd -d -c -q"),
+    "gzip": ("gzip -c -1 --", "gzip -d -c"),
+}
+TRANSFER_MODES = ("none", "ssh", "auto") + tuple(COMPRESSION_CODECS)
+TRANSFER_ROUTES = ("relay", "direct", "auto")
+# tar flags (create, extract) per codec for tree transfers
+TAR_CODECS = {
+    "none": ("", ""),
+    "gzip": (" -z", " -z"),
+    "zstd": (" -I 'zstd -1 -T0'", " -I 'zstd -d'"),
+}
+TRANSFER_CHUNK_SIZE = 256 * 1024
+# Seconds between checks of a direct copy's destination size, which is also how quickly it can be cancelled
+DIRECT_PROGRESS_INTERVAL = 0.5
+# Largest SFTP read request paramiko issues
+SFTP_REQUEST_SIZE = 32768
+
+# Remote commands printing "<hex digest>  <path>" for each checksum algorithm
+CHECKSUM_COMMANDS = {
+    "sha256": "sha256sum --",
+    "blake3": "b3sum --",
+    "xxh64": "xxhsum -H1 --",
+}
+
+def new_checksum(algorithm: str):
+    """Create a local hasher matching CHECKSUM_COMMANDS[algorithm]"""
+    if algorithm == "sha256":
+        return hashlib.sha256()
+    if algorithm == "blake3":
+        if blake3 is None:
+            raise RuntimeError("blake3 checksums require the 'blake3' package")
+        return blake3.blake3()
+    if algorithm == "xxh64":
+        if xxhash is None:
+            raise RuntimeError("xxh64 checksums require the 'xxhash' package")
+        return xxhash.xxh64()
+    raise ValueError(f"Unsupported checksum '{algorithm}', expected one of: {', '.join(CHECKSUM_COMMANDS)}")
+
+# Called with (bytes_done, bytes_total or None); may raise TransferCancelled to abort
+ProgressCallback = Callable[[int, Optional[int]], None]
+
+class TransferCancelled(Exception):
+    """Raised from a progress callback to abort a transfer"""
+
+def _record_transfer(kind: str, result: Dict, started: float, size_key: str):
+    """Record duration, bytes and throughput of a finished transfer"""
+    duration = time.monotonic() - started
+    route = result.get("route") or "relay"
+    TRANSFER_SECONDS.observe(duration, kind=kind, route=route, result="success" if result.get("success") else "error")
+    size = result.get(size_key)
+    if result.get("success") and size:
+        TRANSFER_BYTES.inc(size, kind=kind, route=route)
+        if duration:
+            TRANSFER_THROUGHPUT.observe(size / duration, kind=kind, route=route)
+
+def _shaped_callback(shaper: Optional[TransferShaper],
+                     callback: Optional[ProgressCallback]) -> Optional[ProgressCallback]:
+    """Wrap a cumulative paramiko callback so each new chunk is throttled before it is reported"""
+    if shaper is None:
+        return callback
+    sent = 0
+
+    def shaped(done: int, total: Optional[int]):
+        nonlocal sent
+        shaper.consume(done - sent)
+        sent = done
+        if callback:
+            callback(done, total)
+    return shaped
+
+class _HashingWriter:
+    """File wrapper that hashes bytes on their way to disk"""
+
+    def __init__(self, fileobj, hasher):
+        self.fileobj = fileobj
+        self.hasher = hasher
+
+    def write(self, data: bytes) -> int:
+        self.hasher.update(data)
+        return self.fileobj.write(data)
+
 class SCPManager:
     """Handles SCP operations between devices"""
 
     @staticmethod
-    def transfer_file(source_device: DeviceConfig, dest_device: DeviceConfig, source_path: str, dest_path: str) -> Dict:
-        """Transfer file between devices using SCP"""
+    def transfer_file(source_device: DeviceConfig, dest_device: DeviceConfig, source_path: str, dest_path: str,
+                      compression: str = "none", route: str = "relay", direct_host: Optional[str] = None,
+                      checksum: Optional[str] = None, progress: Optional[ProgressCallback] = None,
+                      rate_limit: Optional[float] = None) -> Dict:
+        """
+        Transfer file between devices
+
+        Args:
+            compression: "none" relays raw bytes over SFTP, "ssh" does the same with
+                SSH transport compression, "gzip"/"zstd" stream the file through a
+                compressor on the source and a decompressor on the destination, and
+                "auto" samples the file to pick between streaming and raw
+            route: "relay" moves the bytes through this host, "direct" has the source
+                copy straight to the destination, and "auto" tries direct first and
+                falls back to relay
+            direct_host: Destination address as reachable from the source, if it
+                differs from dest_device.host
+            checksum: "sha256", "blake3" or "xxh64" to verify the copy against a hash
+                computed on the destination, None to skip verification
+            progress: Called as bytes move. Relayed transfers count both legs against
+                twice the file size, streamed transfers count compressed bytes with an
+                unknown total, and direct transfers report the destination file's size
+                every DIRECT_PROGRESS_INTERVAL seconds. Raising TransferCancelled from
+                it stops the copy
+            rate_limit: Bytes per second for this transfer, applied on top of any
+                per-host limits in host_bandwidth
+        """
+        if compression not in TRANSFER_MODES:
+            return {
+                "success": False,
+                "error": f"Unsupported compression '{compression}', expected one of: {', '.join(TRANSFER_MODES)}",
+                "source_path": source_path,
+                "destination_path": dest_path
+            }
+        if route not in TRANSFER_ROUTES:
+            return {
+                "success": False,
+                "error": f"Unsupported route '{route}', expected one of: {', '.join(TRANSFER_ROUTES)}",
+                "source_path": source_path,
+                "destination_path": dest_path
+            }
+
+        if checksum is not None and checksum not in CHECKSUM_COMMANDS:
+            return {
+                "success": False,
+                "error": f"Unsupported checksum '{checksum}', expected one of: {', '.join(CHECKSUM_COMMANDS)}",
+                "source_path": source_path,
+                "destination_path": dest_path
+            }
+
+        started = time.monotonic()
+        fallback_reason = None
+        if route in ("direct", "auto"):
+            result = SCPManager._direct_transfer(source_device, dest_device, source_path, dest_path,
+                                                 compress=compression != "none", direct_host=direct_host,
+                                                 checksum=checksum, progress=progress, rate_limit=rate_limit)
+            # A cancelled copy must not start again over the relay
+            if result["success"] or route == "direct" or result.get("cancelled"):
+                _record_transfer("file", result, started, "file_size")
+                return result
+            fallback_reason = result["error"]
+            logger.info(f"Direct transfer unavailable, relaying instead: {fallback_reason}")
+
+        if compression in ("none", "ssh"):
+            result = SCPManager._relay_transfer(source_device, dest_device, source_path, dest_path,
+                                                compress=compression == "ssh", checksum=checksum,
+                                                progress=progress, rate_limit=rate_limit)
+        else:
+            result = SCPManager._streamed_transfer(source_device, dest_device, source_path, dest_path, compression,
+                                                   checksum=checksum, progress=progress, rate_limit=rate_limit)
+        result["route"] = "relay"
+        if fallback_reason:
+            result["fallback_reason"] = fallback_reason
+        _record_transfer("file", result, started, "file_size")
+        return result
+
+    @staticmethod
+    def remote_checksum(client: paramiko.SSHClient, path: str, algorithm: str) -> str:
+        """Hash a remote file with the device's own checksum tool"""
+        output, stderr, exit_code = SSHManager.execute_command(
+            client, f"{CHECKSUM_COMMANDS[algorithm]} {shlex.quote(path)}")
+        if exit_code != 0 or not output:
+            raise RuntimeError(f"Remote {algorithm} checksum failed ({exit_code}): {stderr}")
+        return output.split()[0].lower()
+
+    @staticmethod
+    def _verify_checksum(result: Dict, dest_client: paramiko.SSHClient, algorithm: str,
+                         source_digest: Optional[str], source_error: Optional[str] = None) -> Dict:
+        """
+        Compare the source digest with one computed on the destination
+
+        A mismatch fails the transfer, and so does a digest that cannot be
+        computed on either side: verification was asked for, so an unverified
+        copy is not reported as a success. 'verified' is then None with the
+        reason in 'error'.
+        """
+        info = {"algorithm": algorithm, "source": source_digest, "destination": None, "verified": None}
+        if source_digest is None:
+            info["error"] = source_error
+        else:
+            try:
+                info["destination"] = SCPManager.remote_checksum(dest_client, result["destination_path"], algorithm)
+                info["verified"] = info["destination"] == source_digest
+            except Exception as e:
+                info["error"] = str(e)
+        result["checksum"] = info
+        if info["verified"] is False:
+            logger.error(f"Checksum mismatch for {result['destination_path']}")
+            result.update(success=False, error="Checksum mismatch between source and destination")
+        elif info["verified"] is None:
+            logger.error(f"Could not verify {result['destination_path']}: {info['error']}")
+            result.update(success=False, error=f"Checksum could not be verified: {info['error']}")
+        return result
+
+    @staticmethod
+    def _start_source_checksum(executor: ThreadPoolExecutor, client: paramiko.SSHClient, path: str,
+                               algorithm: Optional[str]):
+        """Hash the source file on its own channel while the copy runs"""
+        if algorithm is None:
+            return None
+        return executor.submit(SCPManager.remote_checksum, client, path, algorithm)
+
+    @staticmethod
+    def _finish_source_checksum(future) -> Tuple[Optional[str], Optional[str]]:
+        try:
+            return future.result(), None
+        except Exception as e:
+            return None, str(e)
+
+    @staticmethod
+    def _direct_transfer(source_device: DeviceConfig, dest_device: DeviceConfig, source_path: str, dest_path: str,
+                         compress: bool = False, direct_host: Optional[str] = None, connect_timeout: int = 10,
+                         checksum: Optional[str] = None, progress: Optional[ProgressCallback] = None,
+                         rate_limit: Optional[float] = None) -> Dict:
+        """
+        Have the source device scp the file straight to the destination,
+        logging in with a _direct_key() key and checking the destination's host key
+        """
+        source_client = dest_client = None
+        started = time.monotonic()
+        executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            source_client = SSHManager.create_ssh_client(source_device)
+            dest_client = SSHManager.create_ssh_client(dest_device)
+            target_host = direct_host or dest_device.host
+            with SCPManager._direct_key(source_client, dest_client, target_host, dest_device.port,
+                                        connect_timeout) as ssh_options:
+                sftp = source_client.open_sftp()
+                try:
+                    file_size = sftp.stat(source_path).st_size
+                finally:
+                    sftp.close()
+
+                target = f"{dest_device.username}@{target_host}:{dest_path}"
+                options = ["-q", "-P", str(dest_device.port)] + ssh_options
+                if compress:
+                    options.append("-C")
+                # scp enforces the tightest static limit itself; it cannot follow interactive headroom
+                shaper = host_bandwidth.shaper([source_device.host, dest_device.host], rate_limit)
+                if shaper is not None:
+                    options += ["-l", str(max(1, int(shaper.rate * 8 / 1000)))]
+                command = "scp " + " ".join(shlex.quote(o) for o in options) + \
+                    f" -- {shlex.quote(source_path)} {shlex.quote(target)}"
+                source_checksum = SCPManager._start_source_checksum(executor, source_client, source_path, checksum)
+                stderr, exit_code = SCPManager._run_direct_copy(source_client, dest_client, command, dest_path,
+                                                                file_size, progress)
+                if exit_code != 0:
+                    raise RuntimeError(f"Direct copy failed ({exit_code}): {stderr}")
+
+                if progress:
+                    progress(file_size, file_size)
+                duration = time.monotonic() - started
+                result = {
+                    "success": True,
+                    "source_path": source_path,
+                    "destination_path": dest_path,
+                    "file_size": file_size,
+                    "route": "direct",
+                    "compression": "ssh" if compress else "none",
+                    "duration": duration,
+                    "throughput": file_size / duration if duration else None,
+                    "transfer_time": datetime.datetime.now().isoformat()
+                }
+                if checksum:
+                    SCPManager._verify_checksum(result, dest_client, checksum,
+                                                *SCPManager._finish_source_checksum(source_checksum))
+                return result
+        except Exception as e:
+            logger.error(f"Direct file transfer failed: {e}")
+            return {
+                "success": False,
+                "error": str(e),
+                "route": "direct",
+                "cancelled": isinstance(e, TransferCancelled),
+                "source_path": source_path,
+                "destination_path": dest_path
+            }
+        finally:
+            executor.shutdown(wait=False)
+            for client in (source_client, dest_client):
+                if client is not None:
+                    client.close()
+
+    @staticmethod
+    def _run_direct_copy(source_client: paramiko.SSHClient, dest_client: paramiko.SSHClient, command: str,
+                         dest_path: str, file_size: int, progress: Optional[ProgressCallback] = None) -> Tuple[str, int]:
+        """
+        Run the source's copy command, reporting the destination file's size as progress
+
+        Raising TransferCancelled from progress kills the command on the
+        source and propagates. Returns (stderr, exit code).
+        """
+        channel = source_client.get_transport().open_session()
+        # exec keeps the shell's pid, which is printed first so a cancel can kill the copy
+        channel.exec_command(f"echo $$; exec {command}")
+        sftp = dest_client.open_sftp() if progress else None
+        stdout, errors = b"", b""
+        pid = None
+        next_check = time.monotonic()
+        try:
+            while True:
+                if channel.recv_ready():
+                    stdout += channel.recv(4096)
+                    if pid is None and b"\n" in stdout:
+                        pid = int(stdout.split(b"\n", 1)[0])
+                if channel.recv_stderr_ready():
+                    errors = (errors + channel.recv_stderr(65536))[-65536:]
+                if channel.exit_status_ready() and not channel.recv_ready() and not channel.recv_stderr_ready():
+                    break
+                if sftp is not None and time.monotonic() >= next_check:
+                    next_check = time.monotonic() + DIRECT_PROGRESS_INTERVAL
+                    try:
+                        done = sftp.stat(dest_path).st_size
+                    except IOError:
+                        done = 0
+                    try:
+                        progress(min(done, file_size), file_size)
+                    except TransferCancelled:
+                        if pid is not None:
+                            SSHManager.execute_command(source_client, f"kill {pid}")
+                        raise
+                select.select([channel], [], [], DIRECT_PROGRESS_INTERVAL)
+            return errors.decode("utf-8", errors="replace").strip(), channel.recv_exit_status()
+        finally:
+            if sftp is not None:
+                sftp.close()
+            channel.close()
+
+    @staticmethod
+    def _authorized_keys_command(edit: str) -> str:
+        """
+        Run a shell edit of ~/.ssh/authorized_keys under an flock on ~/.ssh/.authorized_keys.lock
+
+        Concurrent direct transfers to one account then cannot write back a
+        key another has revoked, or drop one it is still using.
+        """
+        return ("umask 077 && mkdir -p ~/.ssh && cd ~/.ssh && "
+                "( if command -v flock >/dev/null 2>&1; then flock 9 || exit 1; fi; " + edit + " ) "
+                "9> .authorized_keys.lock")
+
+    @staticmethod
+    @contextmanager
+    def _direct_key(source_client: paramiko.SSHClient, dest_client: paramiko.SSHClient, host: str, port: int,
+                    connect_timeout: int = 10) -> Iterator[List[str]]:
+        """
+        Let the source log in to the destination for the duration of the block
+
+        A throwaway key pair is authorized on the destination (tagged and
+        restricted) and its private half written to a temp file on the
+        source. The destination's host key, as seen by dest_client, goes into
+        a temp known_hosts file next to it, so the source only logs in to that
+        host. Yields the ssh/scp options that use both; everything is removed
+        on exit.
+
+        Args:
+            host, port: Destination address as the source reaches it
+        """
+        tag = f"secure-copy-direct-{uuid.uuid4().hex}"
+        key_path = known_hosts_path = None
+        try:
+            key = paramiko.RSAKey.generate(3072)
+            private_key = io.StringIO()
+            key.write_private_key(private_key)
+            public_key = f"restrict {key.get_name()} {key.get_base64()} {tag}"
+
+            # A file without a trailing newline would otherwise get the key appended to its last line,
+            # which revoking by tag would then delete
+            _, stderr, exit_code = SSHManager.execute_command(dest_client, SCPManager._authorized_keys_command(
+                'if [ -s authorized_keys ] && [ -n "$(tail -c 1 authorized_keys)" ]; then '
+                "printf '\\n' >> authorized_keys || exit 1; fi; "
+                f"printf '%s\\n' {shlex.quote(public_key)} >> authorized_keys"
+            ))
+            if exit_code != 0:
+                raise RuntimeError(f"Could not authorize transfer key on destination: {stderr}")
+
+            transport = dest_client.get_transport()
+            host_key = transport.get_remote_server_key()
+            host_pattern = host if port == 22 else f"[{host}]:{port}"
+
+            output, stderr, exit_code = SSHManager.execute_command(source_client, "umask 077 && mktemp && mktemp")
+            paths = output.split()
+            if exit_code != 0 or len(paths) != 2:
+                raise RuntimeError(f"Could not create key files on source: {stderr}")
+            key_path, known_hosts_path = paths
+            sftp = source_client.open_sftp()
+            try:
+                with sftp.open(key_path, "w") as f:
+                    f.write(private_key.getvalue())
+                sftp.chmod(key_path, 0o600)
+                with sftp.open(known_hosts_path, "w") as f:
+                    f.write(f"{host_pattern} {host_key.get_name()} {host_key.get_base64()}\n")
+            finally:
+                sftp.close()
+            yield SCPManager._direct_ssh_options(key_path, known_hosts_path,
+                                                 transport.host_key_type or host_key.get_name(), connect_timeout)
+        finally:
+            # Revoke the throwaway key on both sides
+            if key_path:
+                try:
+                    SSHManager.execute_command(
+                        source_client, f"rm -f {shlex.quote(key_path)} {shlex.quote(known_hosts_path)}")
+                except Exception as e:
+                    logger.error(f"Could not remove transfer key from source: {e}")
+            try:
+                # grep exits 1 when no lines remain; the filtered copy replaces the file in one rename
+                _, stderr, exit_code = SSHManager.execute_command(dest_client, SCPManager._authorized_keys_command(
+                    "[ -f authorized_keys ] || exit 0; "
+                    "tmp=$(mktemp authorized_keys.XXXXXX) || exit 1; "
+                    f"grep -v -F -- {shlex.quote(tag)} authorized_keys > \"$tmp\"; "
+                    '[ $? -le 1 ] && mv -f "$tmp" authorized_keys || { rm -f "$tmp"; exit 1; }'
+                ))
+                if exit_code != 0:
+                    raise RuntimeError(stderr or f"exit code {exit_code}")
+            except Exception as e:
+                logger.error(f"Could not revoke transfer key on destination: {e}")
+
+    @staticmethod
+    def _direct_ssh_options(key_path: str, known_hosts_path: str, host_key_algorithm: str,
+                            connect_timeout: int) -> List[str]:
+        """ssh/scp options for logging in to the destination with a _direct_key() key, checking its host key"""
+        return [
+            "-i", key_path,
+            "-o", "BatchMode=yes",
+            "-o", "StrictHostKeyChecking=yes",
+            "-o", f"UserKnownHostsFile={known_hosts_path}",
+            "-o", "GlobalKnownHostsFile=/dev/null",
+            "-o", f"HostKeyAlgorithms={host_key_algorithm}",
+            "-o", f"ConnectTimeout={connect_timeout}",
+        ]
+
+    @staticmethod
+    def _relay_transfer(source_device: DeviceConfig, dest_device: DeviceConfig, source_path: str, dest_path: str,
+                        compress: bool = False, checksum: Optional[str] = None,
+                        progress: Optional[ProgressCallback] = None, rate_limit: Optional[float] = None) -> Dict:
+        """Transfer file between devices using SCP, hashing the bytes as they pass through when asked"""
         temp_file = None
+        source_client = dest_client = None
+        started = time.monotonic()
         try:
             # Step 1: Download file from source device to local temp
-            source_client = SSHManager.create_ssh_client(source_device)
+            source_client = SSHManager.create_ssh_client(source_device, compress=compress)
             sftp_source = source_client.open_sftp()
 
             temp_file = tempfile.NamedTemporaryFile(delete=False)
-            temp_file.close()
-
-            sftp_source.get(source_path, temp_file.name)
+            hasher = new_checksum(checksum) if checksum else None
             file_stats = sftp_source.stat(source_path)
+            download_progress = upload_progress = None
+            if progress:
+                # Each leg moves the whole file, so each counts for half of the file's bytes
+                download_progress = lambda done, total: progress(done // 2, total)
+                upload_progress = lambda done, total: progress((total + done) // 2, total)
+            download_shaper = host_bandwidth.shaper([source_device.host], rate_limit)
+            with temp_file:
+                writer = _HashingWriter(temp_file, hasher) if hasher else temp_file
+                if download_shaper is None:
+                    sftp_source.getfo(source_path, writer, callback=download_progress)
+                else:
+                    SCPManager._shaped_download(sftp_source, source_path, writer, file_stats.st_size,
+                                                download_shaper, download_progress)
 
             sftp_source.close()
             source_client.close()
+            source_client = None
 
             # Step 2: Upload file from local temp to destination device
-            dest_client = SSHManager.create_ssh_client(dest_device)
+            dest_client = SSHManager.create_ssh_client(dest_device, compress=compress)
             sftp_dest = dest_client.open_sftp()
 
-            sftp_dest.put(temp_file.name, dest_path)
-
+            upload_shaper = host_bandwidth.shaper([dest_device.host], rate_limit)
+            sftp_dest.put(temp_file.name, dest_path, callback=_shaped_callback(upload_shaper, upload_progress))
             sftp_dest.close()
-            dest_client.close()
 
-            return {
+            duration = time.monotonic() - started
+            result = {
                 "success": True,
                 "source_path": source_path,
                 "destination_path": dest_path,
                 "file_size": file_stats.st_size,
+                "compression": "ssh" if compress else "none",
+                "duration": duration,
+                "throughput": file_stats.st_size / duration if duration else None,
                 "transfer_time": datetime.datetime.now().isoformat()
             }
+            if hasher:
+                SCPManager._verify_checksum(result, dest_client, checksum, hasher.hexdigest())
+            return result
         except Exception as e:
             logger.error(f"File transfer failed: {e}")
             return {
@@ -161,5 +1015,351 @@ class SCPManager:
                 "destination_path": dest_path
             }
         finally:
+            # Also reached when progress raises TransferCancelled mid-copy
+            for client in (source_client, dest_client):
+                if client is not None:
+                    client.close()
             if temp_file and os.path.exists(temp_file.name):
-                os.unlink(temp_file.name)
\ No newline at end of file
+                os.unlink(temp_file.name)
+
+    @staticmethod
+    def _shaped_download(sftp: paramiko.SFTPClient, path: str, writer, file_size: int, shaper: TransferShaper,
+                         callback: Optional[ProgressCallback] = None):
+        """
+        Download under a bandwidth limit
+
+        getfo() prefetches the whole file regardless of how fast it is
+        consumed, so reads are instead pipelined one TRANSFER_CHUNK_SIZE
+        window at a time, each admitted by the shaper first.
+        """
+        with sftp.open(path, "rb") as f:
+            offset = 0
+            while offset < file_size:
+                window = min(TRANSFER_CHUNK_SIZE, file_size - offset)
+                shaper.consume(window)
+                requests = [(offset + i, min(SFTP_REQUEST_SIZE, window - i))
+                            for i in range(0, window, SFTP_REQUEST_SIZE)]
+                for data in f.readv(requests):
+                    writer.write(data)
+                offset += window
+                if callback:
+                    callback(offset, file_size)
+
+    @staticmethod
+    def sample_compressibility(sftp: paramiko.SFTPClient, path: str, file_size: int,
+                               sample_size: int = 64 * 1024, samples: int = 3) -> float:
+        """
+        Estimate how well a remote file compresses
+
+        Returns:
+            Compressed/original size ratio of a few spread-out samples (1.0 = incompressible)
+        """
+        if file_size == 0:
+            return 1.0
+        original = compressed = 0
+        with sftp.open(path, "rb") as f:
+            for i in range(samples):
+                f.seek(max(0, (file_size - sample_size) * i // max(samples - 1, 1)))
+                data = f.read(sample_size)
+                if not data:
+                    continue
+                original += len(data)
+                compressed += len(zlib.compress(data, 1))
+        return compressed / original if original else 1.0
+
+    @staticmethod
+    def _has_command(client: paramiko.SSHClient, name: str) -> bool:
+        _, _, exit_code = SSHManager.execute_command(client, f"command -v {name}")
+        return exit_code == 0
+
+    @staticmethod
+    def _choose_codec(source_client: paramiko.SSHClient, dest_client: paramiko.SSHClient, source_path: str,
+                      compression: str, threshold: float = 0.9) -> Tuple[Optional[str], Optional[float]]:
+        """Pick a streaming codec, or None when the file is not worth compressing"""
+        ratio = None
+        if compression == "auto":
+            sftp = source_client.open_sftp()
+            try:
+                ratio = SCPManager.sample_compressibility(sftp, source_path, sftp.stat(source_path).st_size)
+            finally:
+                sftp.close()
+            if ratio > threshold:
+                return None, ratio
+            compression = "zstd"
+        # Fall back to gzip when either side lacks zstd
+        if compression == "zstd" and not (SCPManager._has_command(source_client, "zstd")
+                                          and SCPManager._has_command(dest_client, "zstd")):
+            compression = "gzip"
+        return compression, ratio
+
+    @staticmethod
+    def _pipe_channels(source_client: paramiko.SSHClient, dest_client: paramiko.SSHClient,
+                       source_command: str, dest_command: str,
+                       progress: Optional[ProgressCallback] = None,
+                       shaper: Optional[TransferShaper] = None) -> int:
+        """
+        Relay stdout of a source command into stdin of a destination command, returning bytes relayed
+
+        A helper thread reads both commands' stderr and the destination's
+        stdout as they arrive. A chatty destination (tar -x warning once per
+        file) cannot fill its channel window and block sendall for good, and
+        error messages are not cut to what was buffered at exit.
+        """
+        source_channel = source_client.get_transport().open_session()
+        dest_channel = dest_client.get_transport().open_session()
+        errors = {source_channel: b"", dest_channel: b""}
+        finished = threading.Event()
+
+        def drain():
+            while True:
+                received = False
+                for channel in (source_channel, dest_channel):
+                    if channel.recv_stderr_ready():
+                        errors[channel] = (errors[channel] + channel.recv_stderr(65536))[-65536:]
+                        received = True
+                if dest_channel.recv_ready():
+                    dest_channel.recv(65536)
+                    received = True
+                if not received:
+                    if finished.is_set():
+                        return
+                    # Only the destination is selected on: source stdout is left for the relay loop
+                    select.select([dest_channel], [], [], 0.1)
+
+        drainer = threading.Thread(target=drain, name="pipe-channels-drain", daemon=True)
+        try:
+            source_channel.exec_command(source_command)
+            dest_channel.exec_command(dest_command)
+            drainer.start()
+            relayed = 0
+            while True:
+                data = source_channel.recv(TRANSFER_CHUNK_SIZE)
+                if not data:
+                    break
+                if shaper is not None:
+                    shaper.consume(len(data))
+                dest_channel.sendall(data)
+                relayed += len(data)
+                if progress:
+                    progress(relayed, None)
+            dest_channel.shutdown_write()
+
+            source_status = source_channel.recv_exit_status()
+            dest_status = dest_channel.recv_exit_status()
+            # Output precedes the exit status, so once both are in, the drainer has seen everything
+            finished.set()
+            drainer.join()
+            if source_status != 0:
+                error = errors[source_channel].decode("utf-8", errors="replace").strip()
+                raise RuntimeError(f"Source command failed ({source_status}): {error}")
+            if dest_status != 0:
+                error = errors[dest_channel].decode("utf-8", errors="replace").strip()
+                raise RuntimeError(f"Destination command failed ({dest_status}): {error}")
+            return relayed
+        finally:
+            finished.set()
+            source_channel.close()
+            dest_channel.close()
+            if drainer.is_alive():
+                drainer.join()
+
+    @staticmethod
+    def _streamed_transfer(source_device: DeviceConfig, dest_device: DeviceConfig, source_path: str,
+                           dest_path: str, compression: str, checksum: Optional[str] = None,
+                           progress: Optional[ProgressCallback] = None, rate_limit: Optional[float] = None) -> Dict:
+        """
+        Stream a file through remote compressor/decompressor commands, without a local temp file
+
+        Only compressed bytes pass through this host, so the source digest is
+        computed on the source device on a second channel during the copy.
+        """
+        source_client = dest_client = None
+        started = time.monotonic()
+        executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            source_client = SSHManager.create_ssh_client(source_device)
+            dest_client = SSHManager.create_ssh_client(dest_device)
+            codec, ratio = SCPManager._choose_codec(source_client, dest_client, source_path, compression)
+            if codec is None:
+                source_client.close()
+                dest_client.close()
+                source_client = dest_client = None
+                result = SCPManager._relay_transfer(source_device, dest_device, source_path, dest_path,
+                                                    checksum=checksum, progress=progress, rate_limit=rate_limit)
+                result["sampled_ratio"] = ratio
+                return result
+
+            sftp = source_client.open_sftp()
+            try:
+                file_size = sftp.stat(source_path).st_size
+            finally:
+                sftp.close()
+
+            compress_command, decompress_command = COMPRESSION_CODECS[codec]
+            source_checksum = SCPManager._start_source_checksum(executor, source_client, source_path, checksum)
+            bytes_on_wire = SCPManager._pipe_channels(
+                source_client, dest_client,
+                f"{compress_command} {shlex.quote(source_path)}",
+                f"{decompress_command} > {shlex.quote(dest_path)}",
+                progress=progress,
+                shaper=host_bandwidth.shaper([source_device.host, dest_device.host], rate_limit)
+            )
+
+            duration = time.monotonic() - started
+            result = {
+                "success": True,
+                "source_path": source_path,
+                "destination_path": dest_path,
+                "file_size": file_size,
+                "compression": codec,
+                "bytes_on_wire": bytes_on_wire,
+                "sampled_ratio": ratio,
+                "duration": duration,
+                "throughput": file_size / duration if duration else None,
+                "transfer_time": datetime.datetime.now().isoformat()
+            }
+            if checksum:
+                SCPManager._verify_checksum(result, dest_client, checksum,
+                                            *SCPManager._finish_source_checksum(source_checksum))
+            return result
+        except Exception as e:
+            logger.error(f"File transfer failed: {e}")
+            return {
+                "success": False,
+                "error": str(e),
+                "source_path": source_path,
+                "destination_path": dest_path
+            }
+        finally:
+            executor.shutdown(wait=False)
+            for client in (source_client, dest_client):
+                if client is not None:
+                    client.close()
+
+    @staticmethod
+    def tar_commands(source_dir: str, dest_dir: str, codec: str = "none", include: Optional[List[str]] = None,
+                     exclude: Optional[List[str]] = None) -> Tuple[str, str]:
+        """
+        Build the (create, extract) shell commands for a tree transfer
+
+        Args:
+            include: Glob patterns matched against paths relative to source_dir
+                (e.g. "logs/*.log", "*.conf"); only matching files are sent
+            exclude: Patterns skipped as tar --exclude does
+        """
+        create_flags, extract_flags = TAR_CODECS[codec]
+        exclude = exclude or []
+        if include:
+            match = " -o ".join(f"-path {shlex.quote('./' + pattern)}" for pattern in include)
+            skip = "".join(f" ! -path {shlex.quote('./' + pattern)} ! -name {shlex.quote(pattern)}"
+                           for pattern in exclude)
+            pipeline = (f"cd -- {shlex.quote(source_dir)} && find . ! -type d \\( {match} \\){skip} -print0"
+                        f" | tar{create_flags} --null -T - -cf -")
+            # The relay sees only the last command's status; pipefail keeps find's failures
+            create = f"bash -o pipefail -c {shlex.quote(pipeline)}"
+        else:
+            excludes = "".join(f" --exclude={shlex.quote(pattern)}" for pattern in exclude)
+            create = f"tar{create_flags} -C {shlex.quote(source_dir)}{excludes} -cf - ."
+        extract = f"mkdir -p -- {shlex.quote(dest_dir)} && tar{extract_flags} -C {shlex.quote(dest_dir)} -xf -"
+        return create, extract
+
+    @staticmethod
+    def transfer_tree(source_device: DeviceConfig, dest_device: DeviceConfig, source_dir: str, dest_dir: str,
+                      compression: str = "none", include: Optional[List[str]] = None,
+                      exclude: Optional[List[str]] = None, route: str = "relay", direct_host: Optional[str] = None,
+                      progress: Optional[ProgressCallback] = None, rate_limit: Optional[float] = None) -> Dict:
+        """
+        Copy a directory tree as one tar stream
+
+        Many small files cost one stream instead of several SFTP round trips
+        each. tar keeps file modes and mtimes.
+
+        Args:
+            compression: "none", "gzip", "zstd" or "auto" (zstd, else gzip)
+            include: Only send files matching these relative path globs
+            exclude: Skip files matching these patterns
+            route: "relay" pipes the stream through this host; "direct" has the source
+                pipe it over ssh to the destination; "auto" tries direct, then relay
+            progress: Called with bytes relayed so far (relay route only)
+        """
+        if compression not in ("none", "auto") + tuple(COMPRESSION_CODECS):
+            return {
+                "success": False,
+                "error": f"Unsupported compression '{compression}' for tree transfers",
+                "source_path": source_dir,
+                "destination_path": dest_dir
+            }
+        if route not in TRANSFER_ROUTES:
+            return {
+                "success": False,
+                "error": f"Unsupported route '{route}', expected one of: {', '.join(TRANSFER_ROUTES)}",
+                "source_path": source_dir,
+                "destination_path": dest_dir
+            }
+
+        source_client = dest_client = None
+        started = time.monotonic()
+        result = {
+            "source_path": source_dir,
+            "destination_path": dest_dir,
+            "include": include or [],
+            "exclude": exclude or []
+        }
+        try:
+            source_client = SSHManager.create_ssh_client(source_device)
+            dest_client = SSHManager.create_ssh_client(dest_device)
+            codec = compression
+            if compression != "none":
+                codec, _ = SCPManager._choose_codec(source_client, dest_client, source_dir,
+                                                    "zstd" if compression == "auto" else compression)
+            create, extract = SCPManager.tar_commands(source_dir, dest_dir, codec, include, exclude)
+            shaper = host_bandwidth.shaper([source_device.host, dest_device.host], rate_limit)
+
+            fallback_reason = None
+            if route in ("direct", "auto"):
+                try:
+                    target_host = direct_host or dest_device.host
+                    with SCPManager._direct_key(source_client, dest_client, target_host,
+                                                dest_device.port) as ssh_options:
+                        options = ["-p", str(dest_device.port)] + ssh_options
+                        target = f"{dest_device.username}@{target_host}"
+                        command = f"{create} | ssh " + " ".join(shlex.quote(o) for o in options) + \
+                            f" {shlex.quote(target)} {shlex.quote(extract)}"
+                        # Without pipefail a tar or find failing partway would hide behind ssh's status
+                        _, stderr, exit_code = SSHManager.execute_command(
+                            source_client, f"bash -o pipefail -c {shlex.quote(command)}")
+                        if exit_code != 0:
+                            raise RuntimeError(f"Direct tree copy failed ({exit_code}): {stderr}")
+                    result.update(route="direct", bytes_on_wire=None)
+                except Exception as e:
+                    if route == "direct":
+                        raise
+                    fallback_reason = str(e)
+                    logger.info(f"Direct tree transfer unavailable, relaying instead: {fallback_reason}")
+
+            if "route" not in result:
+                bytes_on_wire = SCPManager._pipe_channels(source_client, dest_client, create, extract,
+                                                          progress=progress, shaper=shaper)
+                result.update(route="relay", bytes_on_wire=bytes_on_wire)
+                if fallback_reason:
+                    result["fallback_reason"] = fallback_reason
+
+            duration = time.monotonic() - started
+            result.update(
+                success=True,
+                compression=codec,
+                duration=duration,
+                throughput=result["bytes_on_wire"] / duration if result["bytes_on_wire"] and duration else None,
+                transfer_time=datetime.datetime.now().isoformat()
+            )
+            _record_transfer("tree", result, started, "bytes_on_wire")
+            return result
+        except Exception as e:
+            logger.error(f"Tree transfer failed: {e}")
+            result = dict(result, success=False, error=str(e))
+            _record_transfer("tree", result, started, "bytes_on_wire")
+            return result
+        finally:
+            for client in (source_client, dest_client):
+                if client is not None:
+                    client.close()
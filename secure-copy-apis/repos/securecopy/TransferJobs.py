@@ -0,0 +1,293 @@
+"""
+Background transfer jobs
+Queues SCPManager transfers on a fixed worker pool with global and per-host concurrency caps
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from repos.securecopy.SecureCopy import DeviceConfig, SCPManager, TransferCancelled
+from repos.securecopy.TransferWorkers import PROCESS_WORKERS_SUPPORTED, WorkerProcess
+
+logger = logging.getLogger(__name__)
+
+JOB_STATES = ('queued', 'running', 'succeeded', 'failed', 'cancelled')
+FINISHED_STATES = ('succeeded', 'failed', 'cancelled')
+
+
+class QueueFullError(Exception):
+    """Raised when a submission would exceed the queue's capacity"""
+
+
+class TransferJob:
+    """One queued transfer and its progress"""
+
+    def __init__(self, source_device: DeviceConfig, dest_device: DeviceConfig, source_path: str, dest_path: str,
+                 options: Optional[Dict] = None, priority: int = 0):
+        """
+        Initialize the job
+
+        Args:
+            source_device: Device to copy from
+            dest_device: Device to copy to
+            source_path: Path on the source device
+            dest_path: Path on the destination device
+            options: Extra SCPManager.transfer_file keyword arguments (compression, route, checksum, ...)
+            priority: Higher values run first; equal priorities run in submission order
+        """
+        self.id = uuid.uuid4().hex
+        self.source_device = source_device
+        self.dest_device = dest_device
+        self.source_path = source_path
+        self.dest_path = dest_path
+        self.options = dict(options or {})
+        self.priority = priority
+        self.state = 'queued'
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.bytes_done = 0
+        self.bytes_total = None
+        self.result = None
+        self.error = None
+        self._cancel = threading.Event()
+
+    @property
+    def hosts(self):
+        return {self.source_device.host, self.dest_device.host}
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def update_progress(self, bytes_done: int, bytes_total: Optional[int]):
+        """Progress callback handed to SCPManager; aborts the copy once cancelled"""
+        if self._cancel.is_set():
+            raise TransferCancelled("Transfer cancelled")
+        self.bytes_done = bytes_done
+        self.bytes_total = bytes_total
+
+    def rate(self) -> Optional[float]:
+        """Average bytes per second since the job started"""
+        if self.started_at is None:
+            return None
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return self.bytes_done / elapsed if elapsed > 0 else None
+
+    def eta(self) -> Optional[float]:
+        """Seconds left at the current rate, None when the total or rate is unknown"""
+        if self.state != 'running' or not self.bytes_total:
+            return None
+        rate = self.rate()
+        return max(self.bytes_total - self.bytes_done, 0) / rate if rate else None
+
+    def to_dict(self) -> Dict:
+        """Status without device credentials"""
+        def timestamp(value):
+            return datetime.fromtimestamp(value).isoformat() if value else None
+
+        return {
+            'id': self.id,
+            'state': self.state,
+            'cancel_requested': self.cancel_requested,
+            'priority': self.priority,
+            'source': {'host': self.source_device.host, 'path': self.source_path},
+            'destination': {'host': self.dest_device.host, 'path': self.dest_path},
+            'options': self.options,
+            'submitted_at': timestamp(self.submitted_at),
+            'started_at': timestamp(self.started_at),
+            'finished_at': timestamp(self.finished_at),
+            'bytes_done': self.bytes_done,
+            'bytes_total': self.bytes_total,
+            'rate': self.rate(),
+            'eta': self.eta(),
+            'result': self.result,
+            'error': self.error
+        }
+
+
+class TransferJobQueue:
+    """Priority queue of transfer jobs served by a fixed pool of worker threads"""
+
+    def __init__(self, max_workers: int = 8, per_host_limit: int = 2, max_queued: int = 10000,
+                 max_finished: int = 1000, worker_processes: bool = False):
+        """
+        Initialize the queue
+
+        Args:
+            max_workers: Global cap on concurrent transfers (one thread each)
+            per_host_limit: Cap on concurrent transfers touching any one host
+            max_queued: Queued jobs accepted before submit() raises QueueFullError
+            max_finished: Finished jobs kept for status queries, oldest dropped first
+            worker_processes: Give each worker thread its own transfer process (see
+                TransferWorkers) so transfers use more than one core; ignored where
+                PROCESS_WORKERS_SUPPORTED is false
+        """
+        self.max_workers = max(1, max_workers)
+        self.worker_processes = worker_processes and PROCESS_WORKERS_SUPPORTED
+        self.per_host_limit = max(1, per_host_limit)
+        self.max_queued = max_queued
+        self.max_finished = max_finished
+        self._heap = []
+        self._sequence = itertools.count()
+        self._jobs: Dict[str, TransferJob] = {}
+        self._finished: 'OrderedDict[str, None]' = OrderedDict()
+        self._host_counts: Dict[str, int] = {}
+        self._queued = 0
+        self._running = 0
+        self._condition = threading.Condition()
+        self._workers: List[threading.Thread] = []
+        self._processes: List[WorkerProcess] = []
+        self._stopping = False
+
+    def _start_workers(self):
+        # Called with the condition held; the pool is created on first use
+        if self._workers:
+            return
+        for i in range(self.max_workers):
+            process = None
+            if self.worker_processes:
+                process = WorkerProcess(name=f"transfer-process-{i}")
+                self._processes.append(process)
+            worker = threading.Thread(target=self._work, args=(process,), name=f"transfer-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, job: TransferJob) -> TransferJob:
+        """Queue a job and return it immediately"""
+        with self._condition:
+            if self._queued >= self.max_queued:
+                raise QueueFullError(f"Transfer queue is full ({self.max_queued} jobs waiting)")
+            self._jobs[job.id] = job
+            heapq.heappush(self._heap, (-job.priority, next(self._sequence), job))
+            self._queued += 1
+            self._start_workers()
+            self._condition.notify()
+        return job
+
+    def get(self, job_id: str) -> Optional[TransferJob]:
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def jobs(self, state: Optional[str] = None) -> List[TransferJob]:
+        """Known jobs in submission order, optionally filtered by state"""
+        with self._condition:
+            jobs = list(self._jobs.values())
+        return [job for job in jobs if state is None or job.state == state]
+
+    def cancel(self, job_id: str) -> Optional[TransferJob]:
+        """
+        Cancel a job
+
+        Queued jobs are removed before they start; running jobs stop at their
+        next progress callback. Finished jobs are left as they are.
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.state in FINISHED_STATES:
+                return job
+            job._cancel.set()
+            if job.state == 'queued':
+                # Left in the heap and skipped when popped
+                self._queued -= 1
+                self._finish(job, 'cancelled')
+        return job
+
+    def stats(self) -> Dict:
+        with self._condition:
+            return {
+                'queued': self._queued,
+                'running': self._running,
+                'workers': len(self._workers),
+                'max_workers': self.max_workers,
+                'worker_processes': [process.pid for process in self._processes if process.pid is not None],
+                'per_host_limit': self.per_host_limit,
+                'busy_hosts': dict(self._host_counts)
+            }
+
+    def shutdown(self):
+        """Stop the workers once their current jobs finish"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+
+    def _finish(self, job: TransferJob, state: str):
+        # Called with the condition held
+        job.state = state
+        job.finished_at = time.time()
+        self._finished[job.id] = None
+        while len(self._finished) > self.max_finished:
+            old_id, _ = self._finished.popitem(last=False)
+            self._jobs.pop(old_id, None)
+
+    def _next_job(self) -> Optional[TransferJob]:
+        """Pop the highest priority job whose hosts have spare capacity"""
+        # Called with the condition held
+        skipped = []
+        found = None
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            job = entry[2]
+            if job.state != 'queued':
+                continue
+            if all(self._host_counts.get(host, 0) < self.per_host_limit for host in job.hosts):
+                found = job
+                break
+            skipped.append(entry)
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+        return found
+
+    def _work(self, process: Optional[WorkerProcess] = None):
+        while True:
+            with self._condition:
+                job = self._next_job()
+                while job is None:
+                    if self._stopping:
+                        if process is not None:
+                            process.close()
+                        return
+                    # Woken by new submissions and by jobs releasing a host
+                    self._condition.wait()
+                    job = self._next_job()
+                self._queued -= 1
+                self._running += 1
+                job.state = 'running'
+                job.started_at = time.time()
+                for host in job.hosts:
+                    self._host_counts[host] = self._host_counts.get(host, 0) + 1
+
+            try:
+                if process is not None:
+                    result = process.run(job.id, job.source_device, job.dest_device, job.source_path,
+                                         job.dest_path, job.options, progress=job.update_progress)
+                else:
+                    result = SCPManager.transfer_file(job.source_device, job.dest_device, job.source_path,
+                                                      job.dest_path, progress=job.update_progress, **job.options)
+            except Exception as e:
+                logger.error(f"Transfer job {job.id} failed: {e}")
+                result = {"success": False, "error": str(e)}
+
+            with self._condition:
+                self._running -= 1
+                for host in job.hosts:
+                    self._host_counts[host] -= 1
+                    if not self._host_counts[host]:
+                        del self._host_counts[host]
+                job.result = result
+                if job.cancel_requested:
+                    job.error = "Transfer cancelled"
+                    self._finish(job, 'cancelled')
+                elif result.get("success"):
+                    self._finish(job, 'succeeded')
+                else:
+                    job.error = result.get("error")
+                    self._finish(job, 'failed')
+                self._condition.notify_all()
@@ -0,0 +1,244 @@
+"""
+Transfer worker processes
+Runs SCPManager transfers in child processes so SSH crypto and SFTP packet handling are not bound by one GIL
+"""
+
+import itertools
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Connection
+from typing import Dict, List, Optional
+
+from repos.monitoring.Metrics import metrics
+from repos.securecopy.Bandwidth import host_bandwidth
+from repos.securecopy.SecureCopy import (DeviceConfig, ProgressCallback, SCPManager, TransferCancelled,
+                                         get_ssh_algorithms, set_ssh_algorithms)
+
+logger = logging.getLogger(__name__)
+
+# Worker processes are started with pass_fds, which needs a POSIX platform
+PROCESS_WORKERS_SUPPORTED = os.name == 'posix'
+# Directory holding the repos package, so `python -m` finds it wherever the API was started from
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Minimum seconds between progress messages; cancellation is checked on every callback regardless
+PROGRESS_INTERVAL = 0.25
+
+
+class WorkerProcess:
+    """
+    API-side handle on one transfer worker process
+
+    The child is started on first use with one end of a socketpair and runs
+    one transfer at a time. Messages are pickled over the pair:
+
+    - to the child: the job, replies to its shaper requests, and cancel
+    - from the child: throttled progress, shaper requests, and the result
+      together with the metrics it recorded
+
+    Bandwidth limits stay in this process. The child asks here for a shaper
+    and for every chunk's tokens, so host limits and interactive headroom
+    are shared with every other transfer as before. Only limited transfers
+    pay that round trip. A child that dies fails its job and is replaced on
+    the next one.
+    """
+
+    def __init__(self, name: str = 'transfer-process'):
+        self.name = name
+        self._process: Optional[subprocess.Popen] = None
+        self._connection: Optional[Connection] = None
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self._process.pid if self._process is not None else None
+
+    def _start(self):
+        parent_socket, child_socket = socket.socketpair()
+        try:
+            self._process = subprocess.Popen(
+                [sys.executable, '-m', 'repos.securecopy.TransferWorkers', str(child_socket.fileno())],
+                cwd=PROJECT_ROOT, pass_fds=(child_socket.fileno(),), stdin=subprocess.DEVNULL)
+        finally:
+            child_socket.close()
+        self._connection = Connection(parent_socket.detach())
+        logger.info(f"Started {self.name} (pid {self._process.pid})")
+
+    def run(self, job_id: str, source_device: DeviceConfig, dest_device: DeviceConfig, source_path: str,
+            dest_path: str, options: Dict, progress: Optional[ProgressCallback] = None) -> Dict:
+        """
+        Run SCPManager.transfer_file in the worker process and wait for its result
+
+        Args:
+            job_id: Tags messages so a late cancel cannot hit the next job
+            options: SCPManager.transfer_file keyword arguments
+            progress: Called here with the child's progress; raising
+                TransferCancelled from it cancels the transfer in the child
+        """
+        if self._process is None or self._process.poll() is not None:
+            self._start()
+        shapers = {}
+        cancel_sent = False
+        try:
+            self._connection.send(('job', job_id, source_device, dest_device, source_path, dest_path, options,
+                                   get_ssh_algorithms()))
+            while True:
+                message = self._connection.recv()
+                kind = message[0]
+                if kind == 'progress':
+                    if progress is None:
+                        continue
+                    try:
+                        progress(message[1], message[2])
+                    except TransferCancelled:
+                        if not cancel_sent:
+                            self._connection.send(('cancel', job_id))
+                            cancel_sent = True
+                elif kind == 'shaper':
+                    _, sequence, hosts, rate = message
+                    shaper = host_bandwidth.shaper(hosts, rate)
+                    if shaper is not None:
+                        shapers[sequence] = shaper
+                    self._connection.send(('reply', sequence, shaper.rate if shaper is not None else None))
+                elif kind == 'consume':
+                    _, sequence, shaper_id, amount = message
+                    shapers[shaper_id].consume(amount)
+                    self._connection.send(('reply', sequence, None))
+                elif kind == 'result':
+                    metrics.merge(message[2])
+                    return message[1]
+        except (EOFError, OSError) as e:
+            code = self._process.wait(timeout=5) if self._process is not None else None
+            logger.error(f"{self.name} exited during job {job_id} (exit code {code}): {e}")
+            self.close()
+            return {"success": False, "error": f"Transfer worker process exited (exit code {code})",
+                    "source_path": source_path, "destination_path": dest_path}
+
+    def close(self):
+        """Stop the child; closing its socket ends its loop"""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+        if self._process is not None:
+            try:
+                self._process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+            self._process = None
+
+
+class _RemoteShaper:
+    """TransferShaper stand-in whose tokens are granted by the API process"""
+
+    def __init__(self, link: '_ParentLink', shaper_id: int, rate: float):
+        self.link = link
+        self.shaper_id = shaper_id
+        self.rate = rate
+
+    def consume(self, amount: int):
+        self.link.request('consume', self.shaper_id, amount)
+
+
+class _ParentLink:
+    """Child side of the socketpair: progress, cancellation and shaper requests for the current job"""
+
+    def __init__(self, connection: Connection):
+        self.connection = connection
+        self.job_id = None
+        self.cancelled = False
+        self._sequence = itertools.count()
+        self._replies = {}
+        self._pending_progress = None
+        self._progress_sent = 0.0
+        # SCPManager may call back from helper threads
+        self._lock = threading.RLock()
+
+    def begin(self, job_id: str):
+        self.job_id = job_id
+        self.cancelled = False
+        self._pending_progress = None
+        self._progress_sent = 0.0
+
+    def _handle(self, message):
+        if message[0] == 'reply':
+            self._replies[message[1]] = message[2]
+        elif message[0] == 'cancel' and message[1] == self.job_id:
+            self.cancelled = True
+
+    def _drain(self):
+        while self.connection.poll():
+            self._handle(self.connection.recv())
+
+    def request(self, kind: str, *args):
+        """Send a request and wait for its (sequence, reply), noting any cancel that arrives meanwhile"""
+        with self._lock:
+            sequence = next(self._sequence)
+            self.connection.send((kind, sequence) + args)
+            while sequence not in self._replies:
+                self._handle(self.connection.recv())
+            reply = self._replies.pop(sequence)
+        if self.cancelled:
+            raise TransferCancelled("Transfer cancelled")
+        return sequence, reply
+
+    def shaper(self, hosts: List[str], rate: Optional[float]) -> Optional[_RemoteShaper]:
+        """BandwidthManager.shaper_factory for this process; the request's sequence number names the shaper"""
+        sequence, shaper_rate = self.request('shaper', hosts, rate)
+        return _RemoteShaper(self, sequence, shaper_rate) if shaper_rate is not None else None
+
+    def progress(self, done: int, total: Optional[int]):
+        with self._lock:
+            self._drain()
+            if self.cancelled:
+                raise TransferCancelled("Transfer cancelled")
+            self._pending_progress = (done, total)
+            now = time.monotonic()
+            if now - self._progress_sent >= PROGRESS_INTERVAL:
+                self.flush_progress()
+                self._progress_sent = now
+
+    def flush_progress(self):
+        with self._lock:
+            if self._pending_progress is not None:
+                self.connection.send(('progress',) + self._pending_progress)
+                self._pending_progress = None
+
+
+def serve(connection: Connection):
+    """Child main loop: run jobs until the API process closes the connection"""
+    link = _ParentLink(connection)
+    host_bandwidth.shaper_factory = link.shaper
+    while True:
+        try:
+            message = connection.recv()
+        except (EOFError, OSError):
+            return
+        if message[0] != 'job':
+            # A cancel for a job that already finished
+            continue
+        _, job_id, source_device, dest_device, source_path, dest_path, options, ssh_algorithms = message
+        link.begin(job_id)
+        try:
+            if ssh_algorithms != get_ssh_algorithms():
+                set_ssh_algorithms(ssh_algorithms)
+            result = SCPManager.transfer_file(source_device, dest_device, source_path, dest_path,
+                                              progress=link.progress, **options)
+        except Exception as e:
+            logger.error(f"Transfer job {job_id} failed: {e}")
+            result = {"success": False, "error": str(e)}
+        try:
+            link.flush_progress()
+            connection.send(('result', result, metrics.drain()))
+        except (EOFError, OSError):
+            return
+
+
+if __name__ == '__main__':
+    # Ctrl-C in the API's terminal reaches the whole process group; the API closing the socket stops us
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    serve(Connection(int(sys.argv[1])))